@@ -0,0 +1,191 @@
+"""
+Admission control for bursts of API traffic.
+
+Requests are sorted into route classes: one per MySQL database they touch
+and one for the bcrypt-bound auth endpoints. Each class admits a fixed number
+of concurrent requests and parks a bounded number of others in a FIFO queue.
+A request that finds the queue full, or waits longer than the queue timeout,
+is answered immediately with 429 (auth) or 503 (database classes) and a
+Retry-After header, instead of piling another connection onto MySQL.
+
+Limits are per worker process. Unclassified routes (static files, health and
+system endpoints, file extraction) are never queued.
+"""
+import asyncio
+import json
+import math
+import os
+import time
+from collections import deque
+
+from config import (
+    ADMISSION_AUTH_CONCURRENCY, ADMISSION_DB_CONCURRENCY, ADMISSION_ENABLED,
+    ADMISSION_QUEUE_FACTOR, ADMISSION_QUEUE_TIMEOUT_SECONDS,
+)
+from database import DB_POOL_SIZE
+
+# (method or None, path prefix, class); first match wins.
+ROUTE_CLASSES = [
+    ("POST", "/users/login", "auth"),
+    ("POST", "/users/signup", "auth"),
+    (None, "/users", "field_data"),
+    (None, "/blocks", "field_data"),
+    (None, "/surveys", "field_data"),
+    (None, "/acquisition", "field_data"),  # also /acquisition-media
+    (None, "/requisitions", "field_data"),
+    (None, "/jobs", "field_data"),
+    (None, "/qc", "field_data"),
+    (None, "/fixity", "field_data"),
+    (None, "/ingest", "field_data"),
+    (None, "/media", "field_data"),  # the identifier index lives in field_data
+    (None, "/processing", "processing_data"),  # also /processing-media
+    (None, "/interpretation", "interpretation_data"),  # also /interpretation-media
+    ("POST", "/sync/push", "field_data"),  # pushes for any database; one class is enough
+]
+
+
+class Limiter:
+    """Concurrency limit with a bounded FIFO wait queue, for one route class."""
+
+    def __init__(self, name, limit, queue_size, queue_timeout, reject_status):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.reject_status = reject_status
+        self.active = 0
+        self._waiters = deque()
+        self.max_queued = 0
+        self.admitted = self.rejected = self.timed_out = 0
+        # Exponentially weighted averages, in seconds.
+        self.avg_wait = 0.0
+        self.avg_service = 0.0
+
+    async def acquire(self):
+        """Returns True once admitted, False if the request must be rejected."""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= self.queue_size:
+            self.rejected += 1
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.max_queued = max(self.max_queued, len(self._waiters))
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted a slot just as the timeout fired; give it back.
+                self.release()
+            else:
+                waiter.cancel()
+            self.timed_out += 1
+            return False
+        except asyncio.CancelledError:
+            # The client went away while queued.
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        self.avg_wait += 0.1 * ((time.monotonic() - started) - self.avg_wait)
+        self.admitted += 1
+        return True
+
+    def release(self, service_time=None):
+        if service_time is not None:
+            self.avg_service += 0.1 * (service_time - self.avg_service)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # Hand the slot straight to the next waiter; `active` is unchanged.
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def retry_after(self):
+        """Seconds until the current queue would likely have drained."""
+        service = self.avg_service or 1.0
+        return max(1, min(60, math.ceil((len(self._waiters) + 1) * service / max(self.limit, 1))))
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "queue_size": self.queue_size,
+            "queue_timeout_seconds": self.queue_timeout,
+            "active": self.active,
+            "queued": len(self._waiters),
+            "max_queued": self.max_queued,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected,
+            "rejected_timeout": self.timed_out,
+            "avg_wait_ms": round(self.avg_wait * 1000, 1),
+            "avg_service_ms": round(self.avg_service * 1000, 1),
+        }
+
+
+def _limiter(name, limit, reject_status):
+    return Limiter(
+        name, limit, limit * ADMISSION_QUEUE_FACTOR, ADMISSION_QUEUE_TIMEOUT_SECONDS, reject_status
+    )
+
+
+db_limit = ADMISSION_DB_CONCURRENCY or DB_POOL_SIZE
+LIMITERS = {
+    "auth": _limiter("auth", ADMISSION_AUTH_CONCURRENCY or os.cpu_count() or 1, 429),
+    "field_data": _limiter("field_data", db_limit, 503),
+    "processing_data": _limiter("processing_data", db_limit, 503),
+    "interpretation_data": _limiter("interpretation_data", db_limit, 503),
+}
+
+
+def route_class(method, path):
+    for route_method, prefix, name in ROUTE_CLASSES:
+        if (route_method is None or route_method == method) and path.startswith(prefix):
+            return name
+    return None
+
+
+def stats():
+    return {"enabled": ADMISSION_ENABLED, "classes": {name: limiter.stats() for name, limiter in LIMITERS.items()}}
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware, so streamed responses hold their slot until done."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMISSION_ENABLED or scope["method"] == "OPTIONS":
+            return await self.app(scope, receive, send)
+        name = route_class(scope["method"], scope["path"])
+        if name is None:
+            return await self.app(scope, receive, send)
+        limiter = LIMITERS[name]
+        if not await limiter.acquire():
+            return await self._reject(limiter, send)
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.monotonic() - started)
+
+    async def _reject(self, limiter, send):
+        body = json.dumps({"detail": f"Server busy ({limiter.name}); retry shortly."}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": limiter.reject_status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(limiter.retry_after()).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
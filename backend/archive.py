@@ -0,0 +1,150 @@
+"""
+Hot/cold storage of requisition forms.
+
+Forms that reached a final status (L3 approval or a decline) and were
+finalised more than ARCHIVE_AFTER_DAYS ago are moved out of requisition_forms
+and its child tables into requisition_forms_archive: one row per form holding
+the columns the list filters need plus the whole form, in API shape, as
+zlib-compressed JSON. The hot tables then only hold forms still in flight and
+recent decisions, which is what the approval screens list.
+
+Archived forms stay readable: GET /requisitions/{id} falls back to the
+archive, and the list endpoint searches it with include_archived=true. The
+archive_requisitions job moves forms in batches (one transaction each) and is
+scheduled every ARCHIVE_INTERVAL_HOURS.
+"""
+import json
+import zlib
+
+from config import ARCHIVE_AFTER_DAYS
+from database import get_field_data_conn
+
+FINAL_STATUSES = ("L3_Approved", "L2_Declined", "L3_Declined")
+BATCH_SIZE = 500
+COMPRESSION_LEVEL = 6
+# The hot table is rebuilt (OPTIMIZE) when a run moved at least this share of it.
+OPTIMIZE_MIN_SHARE = 0.2
+
+ARCHIVE_COLUMNS = (
+    "id", "requester_user_id", "current_approval_status", "l2_approver_id", "l3_approver_id", "created_at",
+)
+
+
+def compress(requisition):
+    return zlib.compress(json.dumps(requisition, default=str).encode(), COMPRESSION_LEVEL)
+
+
+def decompress(payload):
+    return json.loads(zlib.decompress(payload))
+
+
+def _archive_batch(conn, cursor, older_than_days, batch_size):
+    """Moves one batch in a single transaction; returns the number moved."""
+    from routers.requisitions import CHILD_TABLES, _attach_children, _format_requisition
+
+    placeholders = ", ".join(["%s"] * len(FINAL_STATUSES))
+    cursor.execute(
+        f"""
+        SELECT * FROM requisition_forms
+        WHERE current_approval_status IN ({placeholders})
+          AND COALESCE(l3_approval_date, l2_approval_date, created_at) < NOW() - INTERVAL %s DAY
+        ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED
+        """,
+        (*FINAL_STATUSES, older_than_days, batch_size),
+    )
+    rows = cursor.fetchall()
+    if not rows:
+        conn.rollback()
+        return 0
+    finalized = {
+        row["id"]: row["l3_approval_date"] or row["l2_approval_date"] or row["created_at"] for row in rows
+    }
+    keys = [tuple(row[column] for column in ARCHIVE_COLUMNS) for row in rows]
+    _attach_children(cursor, rows)
+    archived = []
+    for key, row in zip(keys, rows):
+        archived.append((*key, finalized[row["id"]], compress(_format_requisition(row))))
+    try:
+        cursor.executemany(
+            f"""
+            INSERT INTO requisition_forms_archive ({', '.join(ARCHIVE_COLUMNS)}, finalized_at, payload)
+            VALUES ({', '.join(['%s'] * (len(ARCHIVE_COLUMNS) + 2))})
+            """,
+            archived,
+        )
+        ids = [row["id"] for row in rows]
+        id_placeholders = ", ".join(["%s"] * len(ids))
+        for _, table, _ in CHILD_TABLES:
+            cursor.execute(f"DELETE FROM {table} WHERE requisition_id IN ({id_placeholders})", ids)
+        cursor.execute(f"DELETE FROM requisition_forms WHERE id IN ({id_placeholders})", ids)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(rows)
+
+
+def archive_requisitions(older_than_days=None, batch_size=BATCH_SIZE, progress=None):
+    """Moves every eligible form to the archive. Returns counts."""
+    older_than_days = ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    conn = get_field_data_conn()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT COUNT(*) AS hot FROM requisition_forms")
+        hot_before = cursor.fetchone()["hot"]
+        moved = 0
+        while True:
+            count = _archive_batch(conn, cursor, older_than_days, batch_size)
+            if not count:
+                break
+            moved += count
+            if progress:
+                progress(min(moved / max(hot_before, 1), 0.99), f"{moved} forms archived")
+        optimized = bool(moved) and moved >= OPTIMIZE_MIN_SHARE * hot_before
+        if optimized:
+            # Rebuilds the table and its indexes online so the space freed by
+            # the moved rows no longer sits in the buffer pool's working set.
+            for table in ("requisition_forms", "requisition_data_types", "requisition_sl_no_data"):
+                cursor.execute(f"OPTIMIZE TABLE {table}")
+                cursor.fetchall()
+        return {"archived": moved, "hot_rows_before": hot_before, "optimized": optimized}
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def load(cursor, requisition_id):
+    """An archived form in API shape, or None. `cursor` must be a dictionary cursor."""
+    cursor.execute("SELECT payload FROM requisition_forms_archive WHERE id = %s", (requisition_id,))
+    row = cursor.fetchone()
+    return decompress(row["payload"]) if row else None
+
+
+def search(cursor, condition, params):
+    """Archived forms matching `condition` on ARCHIVE_COLUMNS, newest first."""
+    cursor.execute(
+        f"SELECT payload FROM requisition_forms_archive WHERE {condition} ORDER BY created_at DESC", params
+    )
+    return [decompress(row["payload"]) for row in cursor.fetchall()]
+
+
+def stats():
+    conn = get_field_data_conn()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            "SELECT COUNT(*) AS forms, COALESCE(SUM(LENGTH(payload)), 0) AS payload_bytes, "
+            "MAX(archived_at) AS last_archived_at FROM requisition_forms_archive"
+        )
+        archived = cursor.fetchone()
+        cursor.execute("SELECT COUNT(*) AS forms FROM requisition_forms")
+        return {
+            "hot_forms": cursor.fetchone()["forms"],
+            "archived_forms": archived["forms"],
+            "archive_payload_bytes": int(archived["payload_bytes"]),
+            "last_archived_at": archived["last_archived_at"],
+            "archive_after_days": ARCHIVE_AFTER_DAYS,
+        }
+    finally:
+        cursor.close()
+        conn.close()
@@ -0,0 +1,162 @@
+"""
+Batched reads: many GET requests in one round trip.
+
+Screens such as the dashboard open with a handful of independent reads
+(counts, id lists). POST /batch takes them as a list of sub-requests and runs
+them concurrently inside the worker, each dispatched through the full ASGI
+app: admission control, request logging and single-flight coalescing apply
+to every sub-request as if it had arrived on its own, and they draw on the
+same connection pools. The reply carries one status and body per
+sub-request, in request order; one failing sub-request does not fail the batch.
+
+Limits: at most BATCH_MAX_REQUESTS sub-requests, BATCH_CONCURRENCY of them
+in flight at once, BATCH_TIMEOUT_SECONDS for the whole batch (sub-requests
+still running then are answered 504), and BATCH_MAX_RESPONSE_MB per
+sub-request body. Only GET routes of the API can be batched.
+"""
+import asyncio
+import json
+from urllib.parse import urlencode, urlsplit
+
+from fastapi.routing import APIRoute
+from starlette.routing import Match
+
+from config import BATCH_CONCURRENCY, BATCH_MAX_RESPONSE_MB, BATCH_TIMEOUT_SECONDS
+
+BATCH_PATH = "/batch"
+
+# Headers of the batch request not passed on to its sub-requests.
+DROPPED_HEADERS = {b"content-length", b"content-type", b"content-encoding", b"x-request-id", b"x-profile"}
+
+
+class ResponseTooLarge(Exception):
+    pass
+
+
+def _result(status, body):
+    return {"status": status, "body": body}
+
+
+def sub_scope(scope, path, params, request_id):
+    """The ASGI scope of one GET sub-request of the batch request `scope`."""
+    url = urlsplit(path)
+    query = url.query
+    if params:
+        query = "&".join(filter(None, [query, urlencode(params, doseq=True)]))
+    headers = [(key, value) for key, value in scope["headers"] if key not in DROPPED_HEADERS]
+    headers.append((b"x-request-id", request_id.encode()))
+    sub = {
+        "type": "http",
+        "asgi": scope.get("asgi", {"version": "3.0"}),
+        "http_version": scope.get("http_version", "1.1"),
+        "scheme": scope.get("scheme", "http"),
+        "server": scope.get("server"),
+        "client": scope.get("client"),
+        "root_path": scope.get("root_path", ""),
+        "method": "GET",
+        "path": url.path,
+        "raw_path": url.path.encode(),
+        "query_string": query.encode(),
+        "headers": headers,
+    }
+    if "state" in scope:
+        sub["state"] = scope["state"]
+    return sub
+
+
+def check_route(app, scope):
+    """None if `scope` is a batchable API read, else the (status, body) refusing it."""
+    if scope["path"] == BATCH_PATH:
+        return _result(400, {"detail": "Batches cannot be nested."})
+    # As Starlette routes: a path match with another method only counts if no
+    # later route matches the path and method both.
+    partial = False
+    for route in app.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            if isinstance(route, APIRoute) and route.include_in_schema:
+                return None
+            break
+        if match == Match.PARTIAL and isinstance(route, APIRoute):
+            partial = True
+    if partial:
+        return _result(405, {"detail": "Only GET routes can be batched."})
+    return _result(404, {"detail": "Not an API route."})
+
+
+async def dispatch(app, scope):
+    """Runs one sub-request through `app`; returns its status and decoded body."""
+    limit = int(BATCH_MAX_RESPONSE_MB * 1024 * 1024)
+    status, content_type, chunks, size = 500, "", [], 0
+    finished = asyncio.Event()
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Streaming responses listen for a disconnect; there is none to report.
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status, content_type, size
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            for key, value in message.get("headers", []):
+                if key.lower() == b"content-type":
+                    content_type = value.decode("latin-1")
+        elif message["type"] == "http.response.body":
+            body = message.get("body", b"")
+            size += len(body)
+            if size > limit:
+                raise ResponseTooLarge()
+            chunks.append(body)
+
+    try:
+        await app(scope, receive, send)
+    except ResponseTooLarge:
+        return _result(413, {"detail": f"Response exceeds {BATCH_MAX_RESPONSE_MB} MB; request it on its own."})
+    finally:
+        finished.set()
+
+    body = b"".join(chunks)
+    if content_type.startswith("application/json"):
+        try:
+            return _result(status, json.loads(body) if body else None)
+        except ValueError:
+            pass
+    return _result(status, body.decode("utf-8", errors="replace"))
+
+
+async def run(app, scope, items, parent_id):
+    """
+    Runs the sub-requests `items` ((id, path, params) each) of the batch
+    request `scope` concurrently; returns one result per item, in order.
+    """
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+    results = [None] * len(items)
+
+    async def run_one(index, path, params):
+        sub = sub_scope(scope, path, params, f"{parent_id}-{index}")
+        refused = check_route(app, sub)
+        if refused is not None:
+            results[index] = refused
+            return
+        async with slots:
+            results[index] = await dispatch(app, sub)
+
+    tasks = [asyncio.ensure_future(run_one(index, path, params)) for index, (_, path, params) in enumerate(items)]
+    _, pending = await asyncio.wait(tasks, timeout=BATCH_TIMEOUT_SECONDS)
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    for index, task in enumerate(tasks):
+        if results[index] is None:
+            if task in pending:
+                results[index] = _result(504, {"detail": f"Batch time limit of {BATCH_TIMEOUT_SECONDS} s reached."})
+            else:
+                results[index] = _result(500, {"detail": f"Internal server error: {task.exception()}"})
+    return [{"id": item_id, **result} for (item_id, _, _), result in zip(items, results)]
@@ -0,0 +1,274 @@
+"""
+Benchmark: survey-scoped media queries on a flat vs KEY-partitioned tables.
+
+Builds three synthetic copies of a media catalog table in a scratch schema,
+identical but for their partitioning:
+
+- flat: unpartitioned, indexed on acquisition_id and survey_id,
+- by parent: KEY(acquisition_id), the layout of migration 0007,
+- by survey: KEY(survey_id), the layout of migration 0012 (see partitions.py),
+
+then times the queries the media routers and QC issue against each layout:
+
+- count of a survey's media (survey_id equality; for the by-parent table the
+  survey's acquisition ids as an IN list, as 0007's scope filter did),
+- the same count written as a join on the parent table (not prunable),
+- one page of a single acquisition's media (by survey: with the
+  acquisition's survey, as scope_filter() adds it).
+
+Each query runs against random surveys/acquisitions; medians are reported
+with the number of partitions EXPLAIN says were read. Loading 50M rows takes a
+while and needs ~10 GB of disk; re-runs reuse loaded tables unless --reload.
+
+Usage (from backend/):
+    python -m benchmarks.media_partitioning --rows 50000000 [--partitions 32]
+        [--schema media_bench] [--runs 20] [--no-flat-index] [--reload] [--drop]
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+import mysql.connector
+
+from database import DB_CONFIG
+from partitions import MEDIA_PARTITIONS, parent_filter
+
+TABLES = ("bench_media_flat", "bench_media_by_parent", "bench_media_by_survey")
+
+SEQ_SIZE = 10000
+LOAD_CHUNK_ROWS = 1_000_000
+
+MEDIA_COLUMNS = """
+    id BIGINT UNSIGNED NOT NULL,
+    acquisition_id VARCHAR(32) NOT NULL,
+    survey_id VARCHAR(32) NOT NULL,
+    acquisition_media_id VARCHAR(40) NOT NULL,
+    cart_number VARCHAR(32) NULL,
+    line_name VARCHAR(64) NULL,
+    rack VARCHAR(16) NULL,
+    shelf VARCHAR(16) NULL,
+    box VARCHAR(16) NULL,
+    date_cat DATE NULL,
+    status VARCHAR(32) NULL
+"""
+
+
+def _connect():
+    conn = mysql.connector.connect(**DB_CONFIG)
+    conn.autocommit = True
+    return conn
+
+
+def _scalar(cursor, sql, params=()):
+    cursor.execute(sql, params)
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _create(cursor, partitions, flat_index):
+    cursor.execute("SET SESSION cte_max_recursion_depth = %s", (SEQ_SIZE,))
+    cursor.execute("CREATE TABLE IF NOT EXISTS bench_seq (n INT NOT NULL PRIMARY KEY)")
+    if not _scalar(cursor, "SELECT COUNT(*) FROM bench_seq"):
+        cursor.execute(
+            "INSERT INTO bench_seq WITH RECURSIVE s(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM s WHERE n < %s) "
+            "SELECT n FROM s",
+            (SEQ_SIZE - 1,),
+        )
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS bench_acquisitions ("
+        "acquisition_id VARCHAR(32) NOT NULL PRIMARY KEY, survey_id VARCHAR(32) NOT NULL, INDEX (survey_id))"
+    )
+    flat_indexes = ", INDEX idx_flat_acquisition (acquisition_id), INDEX idx_flat_survey (survey_id, acquisition_id)"
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS bench_media_flat ({MEDIA_COLUMNS}, PRIMARY KEY (id)"
+        f"{flat_indexes if flat_index else ''})"
+    )
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS bench_media_by_parent ({MEDIA_COLUMNS}, PRIMARY KEY (id, acquisition_id), "
+        f"INDEX idx_by_parent_acquisition (acquisition_id)) "
+        f"PARTITION BY KEY (acquisition_id) PARTITIONS {partitions}"
+    )
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS bench_media_by_survey ({MEDIA_COLUMNS}, PRIMARY KEY (id, survey_id), "
+        f"INDEX idx_by_survey_survey (survey_id, acquisition_id)) "
+        f"PARTITION BY KEY (survey_id) PARTITIONS {partitions}"
+    )
+
+
+def _load(cursor, rows, acquisitions, surveys):
+    """Fills the tables with the same rows; acquisitions are spread evenly over surveys."""
+    if _scalar(cursor, "SELECT COUNT(*) FROM bench_acquisitions") != acquisitions:
+        cursor.execute("TRUNCATE bench_acquisitions")
+        for start in range(0, acquisitions, LOAD_CHUNK_ROWS):
+            stop = min(start + LOAD_CHUNK_ROWS, acquisitions)
+            cursor.execute(
+                "INSERT INTO bench_acquisitions SELECT CONCAT('ACQ', n), CONCAT('SRV', MOD(n, %s)) FROM ("
+                "SELECT a.n * %s + b.n AS n FROM bench_seq a JOIN bench_seq b WHERE a.n >= %s AND a.n < %s"
+                ") x WHERE n >= %s AND n < %s",
+                (surveys, SEQ_SIZE, start // SEQ_SIZE, stop // SEQ_SIZE + 1, start, stop),
+            )
+    for table in TABLES:
+        loaded = _scalar(cursor, f"SELECT COALESCE(MAX(id) + 1, 0) FROM {table}")
+        started = time.perf_counter()
+        for start in range(loaded, rows, LOAD_CHUNK_ROWS):
+            stop = min(start + LOAD_CHUNK_ROWS, rows)
+            # Multiplicative hashing scatters each acquisition's media over the
+            # id range, as interleaved cataloguing does in the real table.
+            cursor.execute(
+                f"""
+                INSERT INTO {table}
+                SELECT n, CONCAT('ACQ', MOD(n * 2654435761, %s)), CONCAT('SRV', MOD(MOD(n * 2654435761, %s), %s)),
+                    CONCAT('M', n), CONCAT('C', MOD(n, 100000)),
+                    CONCAT('LINE-', MOD(n, 5000)), CONCAT('R', MOD(n, 50)), CONCAT('S', MOD(n, 20)),
+                    CONCAT('B', MOD(n, 400)), DATE_ADD('1990-01-01', INTERVAL MOD(n, 12000) DAY),
+                    IF(MOD(n, 7) = 0, 'QC Flagged', 'QC Passed')
+                FROM (SELECT a.n * %s + b.n AS n FROM bench_seq a JOIN bench_seq b
+                      WHERE a.n >= %s AND a.n < %s) x
+                WHERE n >= %s AND n < %s
+                """,
+                (acquisitions, acquisitions, surveys, SEQ_SIZE, start // SEQ_SIZE, stop // SEQ_SIZE + 1, start, stop),
+            )
+            print(f"{table}: {stop:,} / {rows:,} rows ({time.perf_counter() - started:.0f}s)", flush=True)
+        cursor.execute(f"ANALYZE TABLE {table}")
+        cursor.fetchall()
+
+
+def _survey_ids(cursor, survey_id):
+    cursor.execute("SELECT acquisition_id FROM bench_acquisitions WHERE survey_id = %s", (survey_id,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _queries(table, surveys):
+    """name -> function(cursor, survey_id, acquisition_id) returning the (sql, params) it ran, for EXPLAIN."""
+    def survey_count(cursor, survey_id, acquisition_id):
+        if table == "bench_media_by_parent":
+            condition, params = parent_filter("acquisition_id", _survey_ids(cursor, survey_id))
+        else:
+            condition, params = "survey_id = %s", [survey_id]
+        sql = f"SELECT COUNT(*) FROM {table} WHERE {condition}"
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        return sql, params
+
+    def survey_count_join(cursor, survey_id, acquisition_id):
+        sql = (
+            f"SELECT COUNT(*) FROM {table} m JOIN bench_acquisitions a ON a.acquisition_id = m.acquisition_id "
+            "WHERE a.survey_id = %s"
+        )
+        cursor.execute(sql, (survey_id,))
+        cursor.fetchall()
+        return sql, [survey_id]
+
+    def acquisition_page(cursor, survey_id, acquisition_id):
+        condition, params = "acquisition_id = %s", [acquisition_id]
+        if table == "bench_media_by_survey":
+            # bench_acquisitions puts ACQ<n> in survey SRV<n mod surveys>.
+            condition, params = "survey_id = %s AND " + condition, [f"SRV{int(acquisition_id[3:]) % surveys}", *params]
+        sql = f"SELECT * FROM {table} WHERE {condition} ORDER BY acquisition_id, acquisition_media_id LIMIT 1000"
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        return sql, params
+
+    return {
+        "survey_count": survey_count,
+        "survey_count (join)": survey_count_join,
+        "acquisition_page": acquisition_page,
+    }
+
+
+def _partitions_read(cursor, sql, params):
+    cursor.execute("EXPLAIN " + sql, params)
+    columns = [description[0] for description in cursor.description]
+    read = set()
+    for row in cursor.fetchall():
+        partitions = dict(zip(columns, row)).get("partitions")
+        if partitions:
+            read.update(partitions.split(","))
+    return len(read) or None
+
+
+def run(args):
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{args.schema}`")
+    cursor.execute(f"USE `{args.schema}`")
+    if args.reload:
+        for table in (*TABLES, "bench_acquisitions"):
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    _create(cursor, args.partitions, args.flat_index)
+    _load(cursor, args.rows, args.acquisitions, args.surveys)
+
+    rng = random.Random(args.seed)
+    samples = [
+        (f"SRV{rng.randrange(args.surveys)}", f"ACQ{rng.randrange(args.acquisitions)}") for _ in range(args.runs)
+    ]
+    results = {}
+    for table in TABLES:
+        for name, query in _queries(table, args.surveys).items():
+            timings = []
+            for survey_id, acquisition_id in samples:
+                started = time.perf_counter()
+                sql, params = query(cursor, survey_id, acquisition_id)
+                timings.append((time.perf_counter() - started) * 1000)
+            results.setdefault(name, {})[table] = {
+                "median_ms": round(statistics.median(timings), 2),
+                "p95_ms": round(sorted(timings)[int(0.95 * (len(timings) - 1))], 2),
+                "partitions_read": _partitions_read(cursor, sql, params),
+            }
+
+    if args.drop:
+        cursor.execute(f"DROP DATABASE `{args.schema}`")
+    cursor.close()
+    conn.close()
+    return {
+        "rows": args.rows, "acquisitions": args.acquisitions, "surveys": args.surveys,
+        "partitions": args.partitions, "flat_index": args.flat_index, "runs": args.runs, "results": results,
+    }
+
+
+def _print(report):
+    print(
+        f"\n{report['rows']:,} media rows, {report['acquisitions']:,} acquisitions, {report['surveys']:,} surveys, "
+        f"{report['partitions']} partitions, {report['runs']} runs per query"
+    )
+    print(
+        f"{'query':<20} {'flat ms':>9} {'by parent ms':>13} {'by survey ms':>13} {'speed-up':>9} "
+        f"{'parts (parent)':>15} {'parts (survey)':>15}"
+    )
+    for name, tables in report["results"].items():
+        flat, by_parent, by_survey = (tables[table] for table in TABLES)
+        speedup = flat["median_ms"] / by_survey["median_ms"] if by_survey["median_ms"] else float("inf")
+        print(
+            f"{name:<20} {flat['median_ms']:>9.2f} {by_parent['median_ms']:>13.2f} {by_survey['median_ms']:>13.2f} "
+            f"{speedup:>8.1f}x {by_parent['partitions_read'] or '-':>15} {by_survey['partitions_read'] or '-':>15}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=50_000_000)
+    parser.add_argument("--acquisitions", type=int, default=200_000)
+    parser.add_argument("--surveys", type=int, default=2_000)
+    parser.add_argument("--partitions", type=int, default=MEDIA_PARTITIONS)
+    parser.add_argument("--schema", default="media_bench")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-flat-index", dest="flat_index", action="store_false",
+                        help="Leave the flat table without acquisition_id/survey_id indexes, as an unindexed catalog is")
+    parser.add_argument("--reload", action="store_true", help="Drop and rebuild the benchmark tables")
+    parser.add_argument("--drop", action="store_true", help="Drop the benchmark schema afterwards")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+    if args.rows > SEQ_SIZE * SEQ_SIZE or args.acquisitions > SEQ_SIZE * SEQ_SIZE:
+        parser.error(f"at most {SEQ_SIZE * SEQ_SIZE:,} rows and acquisitions")
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print(report)
+
+
+if __name__ == "__main__":
+    main()
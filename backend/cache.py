@@ -0,0 +1,113 @@
+"""
+In-process read-through caches for single-record lookups.
+
+Each cache is a bounded LRU whose entries also expire after a TTL. Write
+handlers invalidate the exact keys they change, so a worker never serves its
+own stale writes; the TTL bounds staleness for writes made by other worker
+processes or outside the API. Cached values are shared between requests and
+must be treated as read-only.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from config import CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS
+
+CACHES = {}
+
+
+class TTLCache:
+    def __init__(self, name, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; a load that raced with one is not stored.
+        self._generation = 0
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+        CACHES[name] = self
+
+    def get(self, key, loader):
+        """
+        Returns the cached value for `key`, calling `loader()` on a miss.
+        A loader returning None (not found) is not cached.
+        """
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return loader()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            generation = self._generation
+        value = loader()
+        if value is not None:
+            with self._lock:
+                if generation == self._generation:
+                    self._entries[key] = (time.monotonic() + self.ttl, value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+        return value
+
+    def preload(self, items):
+        """Stores (key, value) pairs read ahead of any request, e.g. at start-up; at most max_entries."""
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return 0
+        expires_at = time.monotonic() + self.ttl
+        stored = 0
+        with self._lock:
+            for key, value in items:
+                if stored >= self.max_entries:
+                    break
+                if value is not None:
+                    self._entries[key] = (expires_at, value)
+                    self._entries.move_to_end(key)
+                    stored += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return stored
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+requisitions = TTLCache("requisitions")
+blocks = TTLCache("blocks")
+surveys = TTLCache("surveys")
+
+
+def stats():
+    return {name: cache.stats() for name, cache in CACHES.items()}
@@ -0,0 +1,143 @@
+import os
+
+# Root of the backend package; paths below are resolved relative to it so the
+# app behaves the same no matter which directory uvicorn is started from.
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _first_existing(*paths):
+    for path in paths:
+        if os.path.isdir(path):
+            return path
+    return paths[0]
+
+
+# ===== Frontend build =====
+# Render deploys copy the React build next to the backend; local checkouts
+# serve straight from frontend/build.
+FRONTEND_BUILD_DIR = os.environ.get("FRONTEND_BUILD_DIR") or _first_existing(
+    os.path.join(BACKEND_DIR, "build"),
+    os.path.join(BACKEND_DIR, os.pardir, "frontend", "build"),
+)
+
+# ===== Local storage =====
+# Scratch space owned by the backend (job results, indexes, caches).
+VAR_DIR = os.environ.get("BACKEND_VAR_DIR") or os.path.join(BACKEND_DIR, "var")
+# Root under which catalogued seismic files are stored; file names recorded
+# in the catalog tables are relative to it.
+SEISMIC_DATA_ROOT = os.environ.get("SEISMIC_DATA_ROOT") or os.path.join(VAR_DIR, "data")
+
+# ===== Background jobs =====
+# Worker processes started inside the API process; 0 leaves job execution to
+# a separate `python jobs.py` runner.
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "0"))
+JOB_RESULTS_DIR = os.environ.get("JOB_RESULTS_DIR") or os.path.join(VAR_DIR, "jobs")
+
+# ===== Schema migrations =====
+# /readyz answers 503 while any migration (migrations.py) is pending. The
+# deploy runs `python migrations.py` before or alongside the new workers,
+# which wait for it; some migrations rebuild large tables, which no API
+# worker should do while starting. MIGRATE_ON_STARTUP=1 lets workers apply
+# them during warm-up instead (one at a time, under a MySQL named lock),
+# for small installs.
+MIGRATE_ON_STARTUP = os.environ.get("MIGRATE_ON_STARTUP", "0") == "1"
+MIGRATION_LOCK_TIMEOUT_SECONDS = int(os.environ.get("MIGRATION_LOCK_TIMEOUT_SECONDS", "3600"))
+
+# ===== Fixity audits =====
+# Files hashed concurrently and the combined read rate cap (MB/s, 0 = none) so
+# audits do not starve the archive's other users.
+FIXITY_WORKERS = int(os.environ.get("FIXITY_WORKERS", "4"))
+FIXITY_MAX_MB_PER_SECOND = float(os.environ.get("FIXITY_MAX_MB_PER_SECOND", "0"))
+# Scheduled audit interval; 0 disables the schedule.
+FIXITY_INTERVAL_HOURS = float(os.environ.get("FIXITY_INTERVAL_HOURS", "24"))
+# Unchanged files (same size and mtime) are re-hashed once this old.
+FIXITY_REVERIFY_DAYS = float(os.environ.get("FIXITY_REVERIFY_DAYS", "90"))
+
+# ===== Read-through caches =====
+# Per-process LRU caches for single-record lookups; TTL bounds how long another
+# worker's writes can go unseen. A TTL of 0 disables caching.
+CACHE_TTL_SECONDS = float(os.environ.get("CACHE_TTL_SECONDS", "60"))
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "1024"))
+
+# ===== Admission control =====
+# Concurrent requests admitted per database route class (0 = DB_POOL_SIZE) and
+# for the bcrypt-bound auth endpoints (0 = CPU count). Each class queues up to
+# QUEUE_FACTOR x its limit for at most QUEUE_TIMEOUT seconds before shedding.
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "1") != "0"
+ADMISSION_DB_CONCURRENCY = int(os.environ.get("ADMISSION_DB_CONCURRENCY", "0"))
+ADMISSION_AUTH_CONCURRENCY = int(os.environ.get("ADMISSION_AUTH_CONCURRENCY", "0"))
+ADMISSION_QUEUE_FACTOR = int(os.environ.get("ADMISSION_QUEUE_FACTOR", "4"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT_SECONDS", "5"))
+
+# ===== Logging =====
+# JSON records go through a queue to a writer thread. Fast successful requests
+# are access-logged at SUCCESS_SAMPLE_RATE (0..1); errors, client errors and
+# requests slower than SLOW_REQUEST_MS are always logged.
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_SUCCESS_SAMPLE_RATE = float(os.environ.get("LOG_SUCCESS_SAMPLE_RATE", "0.1"))
+LOG_SLOW_REQUEST_MS = float(os.environ.get("LOG_SLOW_REQUEST_MS", "1000"))
+
+# ===== Request profiling =====
+# Requests sent with `X-Profile: <PROFILING_TOKEN>` are profiled; an empty
+# token disables profiling. Reports go to PROFILES_DIR, newest PROFILE_KEEP kept.
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN", "")
+PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get("PROFILE_SAMPLE_INTERVAL_MS", "1"))
+PROFILES_DIR = os.environ.get("PROFILES_DIR") or os.path.join(VAR_DIR, "profiles")
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "200"))
+
+# ===== Requisition archive =====
+# Finalised requisitions (L3 approved or declined) older than this move to the
+# compressed archive table; the job runs every ARCHIVE_INTERVAL_HOURS (0 = never).
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_INTERVAL_HOURS = float(os.environ.get("ARCHIVE_INTERVAL_HOURS", "24"))
+
+# ===== Requisition PDFs =====
+# Forms are rendered by PDF_RENDER_WORKERS spawned processes and cached under
+# PDF_CACHE_DIR (oldest pruned beyond PDF_CACHE_MAX_MB). A daily batch holds at
+# most PDF_MAX_BATCH_FORMS forms.
+PDF_RENDER_WORKERS = int(os.environ.get("PDF_RENDER_WORKERS", "2"))
+PDF_RENDER_TIMEOUT_SECONDS = float(os.environ.get("PDF_RENDER_TIMEOUT_SECONDS", "60"))
+PDF_CACHE_DIR = os.environ.get("PDF_CACHE_DIR") or os.path.join(VAR_DIR, "pdf")
+PDF_CACHE_MAX_MB = float(os.environ.get("PDF_CACHE_MAX_MB", "200"))
+PDF_MAX_BATCH_FORMS = int(os.environ.get("PDF_MAX_BATCH_FORMS", "500"))
+
+# ===== Media dedup index =====
+# The identifier index is rebuilt from the three media tables every
+# DEDUP_INDEX_INTERVAL_HOURS (0 = only on request).
+DEDUP_INDEX_INTERVAL_HOURS = float(os.environ.get("DEDUP_INDEX_INTERVAL_HOURS", "24"))
+
+# ===== Latest versions =====
+# The latest-version summaries are recomputed from the records every
+# LATEST_VERSIONS_INTERVAL_HOURS (0 = only on request).
+LATEST_VERSIONS_INTERVAL_HOURS = float(os.environ.get("LATEST_VERSIONS_INTERVAL_HOURS", "24"))
+
+# ===== Referential integrity =====
+# Incremental integrity check of the cross-database links every
+# INTEGRITY_INTERVAL_HOURS (0 = only on request).
+INTEGRITY_INTERVAL_HOURS = float(os.environ.get("INTEGRITY_INTERVAL_HOURS", "24"))
+
+# ===== Batch requests =====
+# POST /batch runs up to MAX_REQUESTS GET sub-requests, CONCURRENCY at a time,
+# within TIMEOUT seconds overall; each sub-response body is capped at MAX_RESPONSE_MB.
+BATCH_MAX_REQUESTS = int(os.environ.get("BATCH_MAX_REQUESTS", "20"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "8"))
+BATCH_TIMEOUT_SECONDS = float(os.environ.get("BATCH_TIMEOUT_SECONDS", "10"))
+BATCH_MAX_RESPONSE_MB = float(os.environ.get("BATCH_MAX_RESPONSE_MB", "5"))
+
+# ===== Embedded SQLite mode =====
+# DB_BACKEND=sqlite runs field installs on local SQLite files (one per MySQL
+# database) created from the schema snapshot; local inserts are queued and
+# pushed to SYNC_SERVER_URL every SYNC_INTERVAL_SECONDS (0 = only via
+# `python sync.py`). The central server accepts pushes carrying SYNC_TOKEN;
+# an empty token disables its /sync endpoint.
+DB_BACKEND = os.environ.get("DB_BACKEND", "mysql")
+SQLITE_DIR = os.environ.get("SQLITE_DIR") or os.path.join(VAR_DIR, "sqlite")
+SQLITE_SCHEMA_PATH = os.environ.get("SQLITE_SCHEMA_PATH") or os.path.join(SQLITE_DIR, "schema.json")
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SITE_ID = os.environ.get("SITE_ID", "")
+SYNC_SERVER_URL = os.environ.get("SYNC_SERVER_URL", "").rstrip("/")
+SYNC_TOKEN = os.environ.get("SYNC_TOKEN", "")
+SYNC_BATCH_ROWS = int(os.environ.get("SYNC_BATCH_ROWS", "2000"))
+SYNC_INTERVAL_SECONDS = float(os.environ.get("SYNC_INTERVAL_SECONDS", "60"))
+SYNC_TIMEOUT_SECONDS = float(os.environ.get("SYNC_TIMEOUT_SECONDS", "60"))
+SYNC_MAX_BODY_MB = float(os.environ.get("SYNC_MAX_BODY_MB", "64"))
@@ -1,25 +1,107 @@
+import logging
+import os
+import threading
+import time
+
 import mysql.connector
+from mysql.connector import errors, pooling
+
+import logs
+import profiling
+import sqlite_backend
+from config import DB_BACKEND
+
+DB_CONFIG = {
+    "host": "localhost",
+    "user": "root",
+    "password": "bitchImbacK@69",
+}
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+DATABASES = ("field_data", "processing_data", "interpretation_data")
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(database):
+    pool = _pools.get(database)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(database)
+            if pool is None:
+                # Sessions are not reset on return so server-side prepared
+                # statements (see write_engine) survive between requests.
+                pool = pooling.MySQLConnectionPool(
+                    pool_name=database,
+                    pool_size=DB_POOL_SIZE,
+                    pool_reset_session=False,
+                    database=database,
+                    **DB_CONFIG,
+                )
+                _pools[database] = pool
+    return pool
+
+
+def _mysql_connection(database):
+    try:
+        return _get_pool(database).get_connection()
+    except errors.PoolError:
+        # Pool exhausted under a burst: fall back to a dedicated connection
+        # rather than failing the request.
+        logger.warning("Connection pool for %s exhausted; opening a dedicated connection", database)
+        return mysql.connector.connect(database=database, **DB_CONFIG)
+
+
+# Storage backends: database name -> connection speaking the mysql.connector
+# API. SQLite serves field installs that catalogue offline (sqlite_backend).
+BACKENDS = {
+    "mysql": _mysql_connection,
+    "sqlite": sqlite_backend.connect,
+}
+if DB_BACKEND not in BACKENDS:
+    raise RuntimeError(f"Unknown DB_BACKEND {DB_BACKEND!r}; expected one of {', '.join(BACKENDS)}")
+
+
+def _connect(database):
+    started = time.perf_counter()
+    try:
+        conn = BACKENDS[DB_BACKEND](database)
+    except mysql.connector.Error as err:
+        logger.error("Cannot connect to %s: %s", database, err)
+        raise
+    finally:
+        waited = time.perf_counter() - started
+        logs.note_database(database, waited)
+        profiling.record("db wait", waited)
+    # Sessions are reused, so never hand out one with a transaction left
+    # open by a handler that failed before commit/rollback.
+    if conn.in_transaction:
+        conn.rollback()
+    return conn
+
 
 def get_field_data_conn():
-    return mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="bitchImbacK@69",
-        database="field_data"
-    )
+    return _connect("field_data")
 
 def get_processing_data_conn():
-    return mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="bitchImbacK@69",
-        database="processing_data"
-    )
+    return _connect("processing_data")
 
 def get_interpretation_data_conn():
-    return mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="bitchImbacK@69",
-        database="interpretation_data"
-    )
+    return _connect("interpretation_data")
+
+
+def ping(database):
+    """Round-trips a trivial query through the pool; raises on failure."""
+    conn = _connect(database)
+    try:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+        finally:
+            cursor.close()
+    finally:
+        conn.close()
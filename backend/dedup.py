@@ -0,0 +1,264 @@
+"""
+Duplicate and cross-reference detection for physical media.
+
+The same cartridge is often catalogued more than once: as acquisition and as
+processing media, or under its original cart number in one table and its
+archival id or barcode in another, in three databases. Every identifier
+column of the three media tables is normalised (upper case, punctuation and
+spaces dropped, leading zeros of digit runs removed, placeholders such as
+"NA" ignored) and hashed to 63 bits. media_identifier_index in field_data
+holds one row per (hash, media row, column), keyed by the hash, so:
+
+- "is this cartridge already catalogued?" is a primary-key point lookup per
+  identifier, cheap enough to run on every media insert,
+- the duplicate report reads the index once in key order and emits each
+  group of rows sharing a normalised identifier as it passes, without
+  joining across databases or holding the catalog in memory.
+
+The media POST endpoints and sync pushes register new rows in the index. The
+rebuild_media_index job re-reads the three tables into a fresh copy of the
+index and swaps it in; it is scheduled every DEDUP_INDEX_INTERVAL_HOURS and
+catches rows written outside the API (rows inserted while a rebuild runs
+are picked up by the next one).
+"""
+import hashlib
+import logging
+import re
+
+import mysql.connector
+
+from database import get_field_data_conn, get_interpretation_data_conn, get_processing_data_conn
+
+logger = logging.getLogger(__name__)
+
+INDEX_TABLE = "media_identifier_index"
+FETCH_ROWS = 5000
+INSERT_BATCH_ROWS = 1000
+MAX_VALUE_LENGTH = 255
+
+# source -> (connection getter, media table, media id column, parent column, identifier columns)
+SOURCES = {
+    "acquisition": (
+        get_field_data_conn, "acquisition_media_data", "acquisition_media_id", "acquisition_id",
+        ("cart_number", "org_cart_number", "archival_media_id"),
+    ),
+    "processing": (
+        get_processing_data_conn, "processing_media_data", "processing_media_id", "processing_id",
+        ("cart_number", "org_cart_number", "archival_media_id"),
+    ),
+    "interpretation": (
+        get_interpretation_data_conn, "interpretation_media_data", "integ_media_id", "survey_id",
+        ("BarCode", "org_cart_number", "archival_media_id"),
+    ),
+}
+
+SOURCE_BY_TABLE = {table: source for source, (_, table, *_) in SOURCES.items()}
+
+# Values the forms use for "no identifier"; they would match each other.
+PLACEHOLDERS = {"", "0", "NA", "NIL", "NONE", "NULL", "NOTAPPLICABLE", "UNKNOWN", "X"}
+
+_NOT_ALNUM = re.compile(r"[^0-9A-Z]")
+_DIGITS = re.compile(r"\d+")
+
+_INDEX_COLUMNS = ("key_hash", "normalized", "source", "media_id", "parent_id", "id_column", "raw_value")
+_INSERT_SQL = (
+    f"INSERT IGNORE INTO {{table}} ({', '.join(_INDEX_COLUMNS)}) VALUES ({', '.join(['%s'] * len(_INDEX_COLUMNS))})"
+)
+
+
+def normalize(value):
+    """The comparable form of an identifier, or None if it identifies nothing."""
+    if value is None:
+        return None
+    normalized = _NOT_ALNUM.sub("", str(value).upper())
+    normalized = _DIGITS.sub(lambda digits: digits.group().lstrip("0") or "0", normalized)
+    return None if normalized in PLACEHOLDERS else normalized
+
+
+def key_hash(normalized):
+    # 63 bits, so the key also fits SQLite's signed integers (embedded mode).
+    return int.from_bytes(hashlib.blake2b(normalized.encode(), digest_size=8).digest(), "big") >> 1
+
+
+def entries(source, row):
+    """Index rows for one media row given as {column: value}."""
+    _, _, media_column, parent_column, id_columns = SOURCES[source]
+    media_id = row.get(media_column)
+    if media_id is None:
+        return []
+    # Media ids repeat across parents: a row is (source, parent_id, media_id).
+    parent_id = row.get(parent_column)
+    parent_id = "" if parent_id is None else str(parent_id)
+    found = []
+    for column in id_columns:
+        normalized = normalize(row.get(column))
+        if normalized:
+            found.append((
+                key_hash(normalized), normalized, source, str(media_id), parent_id,
+                column, str(row[column])[:MAX_VALUE_LENGTH],
+            ))
+    return found
+
+
+def _match(row):
+    match = dict(zip(("source", "media_id", "parent_id", "id_column", "value", "identifier"), row))
+    match["parent_id"] = match["parent_id"] or None
+    return match
+
+
+def lookup(identifiers, exclude=None):
+    """
+    Catalogued media rows carrying any of `identifiers` (raw values, any
+    spelling), optionally excluding one (source, media_id, parent_id).
+    """
+    keys = {key_hash(normalized): normalized for normalized in filter(None, map(normalize, identifiers))}
+    if not keys:
+        return []
+    conn = get_field_data_conn()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"SELECT source, media_id, parent_id, id_column, raw_value, normalized FROM {INDEX_TABLE} "
+            f"WHERE key_hash IN ({', '.join(['%s'] * len(keys))})",
+            list(keys),
+        )
+        # The hash narrows to one index page; the normalised value rules out collisions.
+        return [
+            _match(row) for row in cursor.fetchall()
+            if row[5] in keys.values() and (row[0], row[1], row[2] or "") != exclude
+        ]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def check(source, data):
+    """
+    Media rows already catalogued under any identifier of the new row `data`
+    (payload as POSTed). Advisory: returns [] if the index is unavailable.
+    """
+    _, _, media_column, parent_column, id_columns = SOURCES[source]
+    parent_id = data.get(parent_column)
+    exclude = (source, str(data.get(media_column)), "" if parent_id is None else str(parent_id))
+    try:
+        return lookup([data.get(column) for column in id_columns], exclude=exclude)
+    except mysql.connector.Error as err:
+        logger.warning("Duplicate check skipped: %s", err)
+        return []
+
+
+def register(source, rows):
+    """Adds newly inserted media rows ({column: value}) to the index; failures only log (the rebuild job heals them)."""
+    rows = [entry for row in rows for entry in entries(source, row)]
+    if not rows:
+        return
+    try:
+        conn = get_field_data_conn()
+    except mysql.connector.Error as err:
+        logger.warning("Could not index media identifiers: %s", err)
+        return
+    cursor = conn.cursor()
+    try:
+        cursor.executemany(_INSERT_SQL.format(table=INDEX_TABLE), rows)
+        conn.commit()
+    except mysql.connector.Error as err:
+        conn.rollback()
+        logger.warning("Could not index media identifiers: %s", err)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _stream_source(source):
+    """Yields index rows for every media row of one source, reading it with an unbuffered cursor."""
+    connect, table, media_column, parent_column, id_columns = SOURCES[source]
+    columns = [media_column, parent_column, *id_columns]
+    conn = connect()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(f"SELECT {', '.join(columns)} FROM {table}")
+        while True:
+            rows = cursor.fetchmany(FETCH_ROWS)
+            if not rows:
+                break
+            for row in rows:
+                yield from entries(source, row)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def rebuild_index(progress=None):
+    """Rebuilds the whole index into a new table and swaps it in. Returns counts per source."""
+    building = f"{INDEX_TABLE}_rebuild"
+    conn = get_field_data_conn()
+    cursor = conn.cursor()
+    counts = {}
+    try:
+        cursor.execute(f"DROP TABLE IF EXISTS {building}")
+        cursor.execute(f"CREATE TABLE {building} LIKE {INDEX_TABLE}")
+        insert_sql = _INSERT_SQL.format(table=building)
+        for done, source in enumerate(SOURCES):
+            if progress:
+                progress(done / len(SOURCES), f"Indexing {source} media", force=True)
+            counts[source] = 0
+            batch = []
+            for entry in _stream_source(source):
+                batch.append(entry)
+                if len(batch) >= INSERT_BATCH_ROWS:
+                    cursor.executemany(insert_sql, batch)
+                    conn.commit()
+                    counts[source] += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(insert_sql, batch)
+                conn.commit()
+                counts[source] += len(batch)
+        # Atomic swap: lookups see the old index until the new one is complete.
+        cursor.execute(
+            f"RENAME TABLE {INDEX_TABLE} TO {INDEX_TABLE}_old, {building} TO {INDEX_TABLE}"
+        )
+        cursor.execute(f"DROP TABLE {INDEX_TABLE}_old")
+        return {"identifiers": counts}
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def duplicate_report(cross_catalog_only=False):
+    """
+    Yields one group per normalised identifier carried by more than one
+    media row, in a single pass over the index in key order.
+    """
+    conn = get_field_data_conn()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"SELECT key_hash, normalized, source, media_id, parent_id, id_column, raw_value "
+            f"FROM {INDEX_TABLE} ORDER BY key_hash"
+        )
+        current_hash, group = None, []
+        while True:
+            rows = cursor.fetchmany(FETCH_ROWS)
+            for row in rows:
+                if row[0] != current_hash:
+                    yield from _duplicate_groups(group, cross_catalog_only)
+                    current_hash, group = row[0], []
+                group.append(row)
+            if not rows:
+                yield from _duplicate_groups(group, cross_catalog_only)
+                return
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _duplicate_groups(rows, cross_catalog_only):
+    by_identifier = {}
+    for _, normalized, *match in rows:
+        by_identifier.setdefault(normalized, []).append(_match([*match, normalized]))
+    for normalized, matches in by_identifier.items():
+        media = {(match["source"], match["parent_id"], match["media_id"]) for match in matches}
+        sources = sorted({source for source, _, _ in media})
+        if len(media) > 1 and (len(sources) > 1 or not cross_catalog_only):
+            yield {"identifier": normalized, "media_rows": len(media), "sources": sources, "matches": matches}
@@ -0,0 +1,250 @@
+"""
+Fixity audits for the files referenced by the three catalogs.
+
+Every file named in acquisition_data.file_name, processing_data.file_name or
+interpretation_data.file is hashed once to establish a baseline checksum in
+the field_data `file_fixity` table. Later audits are incremental:
+
+  * a file whose size and mtime are unchanged and whose checksum was verified
+    within FIXITY_REVERIFY_DAYS is skipped without being read;
+  * any other file is re-hashed and compared against its baseline. A mismatch
+    with unchanged size/mtime is silent corruption ("corrupted"); a mismatch
+    after the file was rewritten is reported as "modified" (until it is
+    rebaselined, the size/mtime kept are those of the baseline).
+
+Hashing streams the file through large buffers on a thread pool (hashlib
+releases the GIL), with all reads going through a shared byte-rate throttle.
+"""
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import storage
+from config import FIXITY_MAX_MB_PER_SECOND, FIXITY_REVERIFY_DAYS, FIXITY_WORKERS
+from database import get_field_data_conn, get_processing_data_conn, get_interpretation_data_conn
+
+ALGORITHM = "sha256"
+READ_BUFFER_SIZE = 8 * 1024 * 1024
+WRITE_BATCH_SIZE = 200
+PROBLEM_STATUSES = ("corrupted", "modified", "missing", "unreadable")
+
+# source table -> (connection getter, key column, file column)
+SOURCES = {
+    "acquisition_data": (get_field_data_conn, "acquisition_id", "file_name"),
+    "processing_data": (get_processing_data_conn, "processing_id", "file_name"),
+    "interpretation_data": (get_interpretation_data_conn, "myindex", "file"),
+}
+
+
+class Throttle:
+    """Token bucket shared by the hashing threads; `rate` is bytes/second."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._next_free = time.monotonic()
+
+    def consume(self, nbytes):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_free)
+            self._next_free = start + nbytes / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+
+def file_checksum(path, throttle=None, algorithm=ALGORITHM):
+    digest = hashlib.new(algorithm)
+    buffer = bytearray(READ_BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            if throttle:
+                throttle.consume(n)
+            digest.update(view[:n])
+    return digest.hexdigest()
+
+
+def catalog_files():
+    """(path, source table, record id) for every file the catalogs reference."""
+    files = {}
+    for source, (connect, key, column) in SOURCES.items():
+        conn = connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT {key}, {column} FROM {source} WHERE {column} IS NOT NULL AND {column} <> ''")
+            for record_id, path in cursor.fetchall():
+                files.setdefault(str(path).strip(), (source, str(record_id)))
+        finally:
+            cursor.close()
+            conn.close()
+    return [(path, source, record_id) for path, (source, record_id) in files.items()]
+
+
+def _known_files():
+    conn = get_field_data_conn()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT path, size, mtime, checksum, status, last_verified_at FROM file_fixity")
+        return {row["path"]: row for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _check(path, source, record_id, known, throttle, reverify_before):
+    """Checks one file; returns the file_fixity row to store, or None when skipped."""
+    row = {
+        "path": path, "source": source, "record_id": record_id, "size": None, "mtime": None,
+        "checksum": known["checksum"] if known else None, "status": "ok", "error": None,
+        "verified": False,
+    }
+    try:
+        st = os.stat(storage.resolve(path))
+    except storage.StoragePathError as e:
+        return dict(row, status="unreadable", error=str(e))
+    except OSError:
+        return dict(row, status="missing")
+    row["size"], row["mtime"] = st.st_size, int(st.st_mtime)
+
+    unchanged = known is not None and known["size"] == row["size"] and known["mtime"] == row["mtime"]
+    if (
+        unchanged and known["checksum"] and known["status"] == "ok"
+        and known["last_verified_at"] and known["last_verified_at"] >= reverify_before
+    ):
+        return None
+    try:
+        checksum = file_checksum(storage.resolve(path), throttle)
+    except OSError as e:
+        return dict(row, status="unreadable", error=str(e))
+
+    row["verified"] = True
+    if known is None or not known["checksum"]:
+        row["checksum"] = checksum
+    elif checksum != known["checksum"]:
+        row["status"] = "corrupted" if unchanged else "modified"
+        row["error"] = f"expected {known['checksum']}, got {checksum}"
+        # The stored size and mtime stay those of the baseline checksum, so
+        # a modified file keeps reading as modified rather than, once its
+        # new size and mtime were stored, as corrupted.
+        row["size"], row["mtime"] = known["size"], known["mtime"]
+    return row
+
+
+def _store(rows):
+    conn = get_field_data_conn()
+    cursor = conn.cursor()
+    try:
+        cursor.executemany(
+            """
+            INSERT INTO file_fixity (path, source, record_id, size, mtime, algorithm, checksum, status, error,
+                                     last_checked_at, last_verified_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), IF(%s, NOW(), NULL))
+            ON DUPLICATE KEY UPDATE
+                source = VALUES(source), record_id = VALUES(record_id),
+                size = COALESCE(VALUES(size), size), mtime = COALESCE(VALUES(mtime), mtime),
+                checksum = VALUES(checksum), status = VALUES(status), error = VALUES(error),
+                last_checked_at = NOW(), last_verified_at = COALESCE(VALUES(last_verified_at), last_verified_at)
+            """,
+            [
+                (
+                    row["path"], row["source"], row["record_id"], row["size"], row["mtime"], ALGORITHM,
+                    row["checksum"], row["status"], (row["error"] or "")[:1000] or None, row["verified"],
+                )
+                for row in rows
+            ],
+        )
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def run_audit(full=False, workers=None, max_mb_per_second=None, progress=None):
+    """
+    Audits every catalogued file. `full` re-hashes unchanged files too.
+    `progress(fraction, message)` is called as files complete.
+    """
+    files = catalog_files()
+    known = _known_files()
+    reverify_before = datetime.max if full else datetime.now() - timedelta(days=FIXITY_REVERIFY_DAYS)
+    rate = FIXITY_MAX_MB_PER_SECOND if max_mb_per_second is None else max_mb_per_second
+    throttle = Throttle(rate * 1024 * 1024)
+
+    counts = {"files": len(files), "skipped": 0, "hashed": 0}
+    counts.update({status: 0 for status in ("ok",) + PROBLEM_STATUSES})
+    pending = []
+    with ThreadPoolExecutor(workers or FIXITY_WORKERS) as pool:
+        futures = [
+            pool.submit(_check, path, source, record_id, known.get(path), throttle, reverify_before)
+            for path, source, record_id in files
+        ]
+        for done, future in enumerate(as_completed(futures), start=1):
+            row = future.result()
+            if row is None:
+                counts["skipped"] += 1
+            else:
+                counts["hashed"] += row["verified"]
+                counts[row["status"]] += 1
+                pending.append(row)
+            if len(pending) >= WRITE_BATCH_SIZE:
+                _store(pending)
+                pending = []
+            if progress:
+                progress(done / len(files), f"{done} of {len(files)} files checked")
+    if pending:
+        _store(pending)
+    return counts
+
+
+def status_report(limit=500):
+    """Per-status counts plus the files currently failing their fixity check."""
+    conn = get_field_data_conn()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT status, COUNT(*) AS files, MAX(last_checked_at) AS last_checked_at FROM file_fixity GROUP BY status")
+        summary = {row["status"]: row for row in cursor.fetchall()}
+        cursor.execute(
+            "SELECT path, source, record_id, status, error, size, checksum, last_checked_at, last_verified_at "
+            "FROM file_fixity WHERE status IN (%s) ORDER BY status, path LIMIT %%s" % ", ".join(["%s"] * len(PROBLEM_STATUSES)),
+            (*PROBLEM_STATUSES, limit),
+        )
+        problems = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+    return {
+        "counts": {status: summary[status]["files"] for status in summary},
+        "last_checked_at": max((row["last_checked_at"] for row in summary.values()), default=None),
+        "problems": problems,
+    }
+
+
+def rebaseline(paths):
+    """
+    Accepts the current content of `paths` as correct (e.g. after a deliberate
+    re-transcription); their checksums are re-established on the next audit.
+    """
+    if not paths:
+        return 0
+    conn = get_field_data_conn()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "UPDATE file_fixity SET checksum = NULL, status = 'ok', error = NULL WHERE path IN (%s)"
+            % ", ".join(["%s"] * len(paths)),
+            list(paths),
+        )
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        cursor.close()
+        conn.close()
@@ -0,0 +1,225 @@
+"""
+Spatial footprints of surveys and processing volumes.
+
+A footprint is the convex hull of the coordinates in a set of SEG-Y files'
+trace headers (CDP X/Y when present, otherwise source and receiver
+positions). Footprints are stored in the field_data `survey_footprints`
+table, whose POLYGON column carries a SPATIAL (R-tree) index, so bounding-box
+intersection queries stay index lookups however many surveys are catalogued.
+"""
+import json
+
+import numpy as np
+
+import qc
+import segy
+import storage
+from database import get_field_data_conn
+
+KINDS = ("survey", "processing")
+
+
+def trace_points(path):
+    """Unique, scaled (x, y) positions from a file's trace headers, as an (n, 2) array."""
+    with segy.SegyFile(path) as f:
+        scalco = np.array(f.header("scalco"))
+        pairs = [("cdpx", "cdpy")]
+        if not (np.any(f.header("cdpx")) or np.any(f.header("cdpy"))):
+            pairs = [("sx", "sy"), ("gx", "gy")]
+        points = np.concatenate([np.empty((0, 2))] + [
+            np.column_stack((
+                segy.apply_scalar(np.array(f.header(x)), scalco),
+                segy.apply_scalar(np.array(f.header(y)), scalco),
+            ))
+            for x, y in pairs
+        ])
+    # Unset coordinates are written as zeros.
+    points = points[(points[:, 0] != 0) | (points[:, 1] != 0)]
+    return np.unique(points, axis=0)
+
+
+def _discard_interior(points):
+    """
+    Akl-Toussaint pre-filter: drops the points strictly inside the polygon
+    spanned by the extremes in eight directions, which for gridded surveys
+    leaves little more than the outline for the hull pass.
+    """
+    directions = np.array([(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)], dtype=np.float64)
+    extremes = points[np.unique(np.argmax(points @ directions.T, axis=0))]
+    if len(extremes) < 3:
+        return points
+    centre = extremes.mean(axis=0)
+    order = np.argsort(np.arctan2(extremes[:, 1] - centre[1], extremes[:, 0] - centre[0]))
+    polygon = extremes[order]
+    inside = np.ones(len(points), dtype=bool)
+    for a, b in zip(polygon, np.roll(polygon, -1, axis=0)):
+        cross = (b[0] - a[0]) * (points[:, 1] - a[1]) - (b[1] - a[1]) * (points[:, 0] - a[0])
+        inside &= cross > 0
+    return points[~inside]
+
+
+def _cross(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+def convex_hull(points):
+    """Counter-clockwise hull vertices of an (n, 2) array (monotone chain)."""
+    points = np.unique(np.asarray(points, dtype=np.float64), axis=0)
+    if len(points) > 8:
+        points = _discard_interior(points)
+    points = [tuple(p) for p in points.tolist()]  # np.unique leaves them sorted by x, then y
+    if len(points) < 3:
+        return points
+    lower, upper = [], []
+    for p in points:
+        while len(lower) >= 2 and _cross(lower[-2], lower[-1], p) <= 0:
+            lower.pop()
+        lower.append(p)
+    for p in reversed(points):
+        while len(upper) >= 2 and _cross(upper[-2], upper[-1], p) <= 0:
+            upper.pop()
+        upper.append(p)
+    return lower[:-1] + upper[:-1]
+
+
+def polygon_wkt(hull):
+    """
+    WKT for a hull. Degenerate hulls (a single 2D line or point) are widened
+    into a thin rectangle so they can still be stored and indexed.
+    """
+    hull = np.asarray(hull, dtype=np.float64)
+    if len(hull) < 3:
+        (min_x, min_y), (max_x, max_y) = hull.min(axis=0), hull.max(axis=0)
+        pad = max(max_x - min_x, max_y - min_y, 1.0) * 1e-6
+        hull = np.array([
+            (min_x - pad, min_y - pad), (max_x + pad, min_y - pad),
+            (max_x + pad, max_y + pad), (min_x - pad, max_y + pad),
+        ])
+    ring = hull.tolist() + [hull[0].tolist()]
+    return "POLYGON((%s))" % ", ".join(f"{x!r} {y!r}" for x, y in ring)
+
+
+def bbox_wkt(min_x, min_y, max_x, max_y):
+    return polygon_wkt([(min_x, min_y), (max_x, min_y), (max_x, max_y), (min_x, max_y)])
+
+
+def files_footprint(paths):
+    """Hull and statistics for the combined coverage of several files."""
+    hulls = []
+    point_count = 0
+    for path in paths:
+        points = trace_points(path)
+        point_count += len(points)
+        if len(points):
+            hulls.append(np.asarray(convex_hull(points)))
+    if not hulls:
+        return None
+    hull = convex_hull(np.concatenate(hulls))
+    (min_x, min_y), (max_x, max_y) = np.min(hull, axis=0), np.max(hull, axis=0)
+    return {
+        "hull": [[float(x), float(y)] for x, y in hull],
+        "bbox": [float(min_x), float(min_y), float(max_x), float(max_y)],
+        "point_count": point_count,
+        "file_count": len(paths),
+    }
+
+
+def _media_paths(target, survey_id):
+    """{parent id: [absolute paths]} of the stored SEG-Y media of a survey."""
+    groups = {}
+    for media_id, parent_id, _, _ in qc.survey_media(target, survey_id):
+        relative_path = storage.media_file(parent_id, media_id)
+        if relative_path:
+            groups.setdefault(str(parent_id), []).append(storage.resolve(relative_path))
+    return groups
+
+
+def _store(kind, ref_id, survey_id, footprint):
+    conn = get_field_data_conn()
+    cursor = conn.cursor()
+    try:
+        if footprint is None:
+            cursor.execute("DELETE FROM survey_footprints WHERE kind = %s AND ref_id = %s", (kind, ref_id))
+        else:
+            cursor.execute(
+                """
+                INSERT INTO survey_footprints (kind, ref_id, survey_id, min_x, min_y, max_x, max_y,
+                                               point_count, file_count, hull_json, footprint)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, ST_GeomFromText(%s, 0))
+                ON DUPLICATE KEY UPDATE survey_id = VALUES(survey_id),
+                    min_x = VALUES(min_x), min_y = VALUES(min_y), max_x = VALUES(max_x), max_y = VALUES(max_y),
+                    point_count = VALUES(point_count), file_count = VALUES(file_count),
+                    hull_json = VALUES(hull_json), footprint = VALUES(footprint), updated_at = CURRENT_TIMESTAMP
+                """,
+                (
+                    kind, ref_id, survey_id, *footprint["bbox"], footprint["point_count"],
+                    footprint["file_count"], json.dumps(footprint["hull"]), polygon_wkt(footprint["hull"]),
+                ),
+            )
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def build_survey_footprints(survey_id):
+    """
+    Recomputes the footprint of a survey (from its acquisition media) and of
+    each of its processing volumes. Returns {kind: [ref ids stored]}.
+    """
+    built = {"survey": [], "processing": []}
+    acquisition = _media_paths("acquisition", survey_id)
+    footprint = files_footprint([path for paths in acquisition.values() for path in paths])
+    _store("survey", str(survey_id), survey_id, footprint)
+    if footprint:
+        built["survey"].append(str(survey_id))
+    for processing_id, paths in _media_paths("processing", survey_id).items():
+        footprint = files_footprint(paths)
+        _store("processing", processing_id, survey_id, footprint)
+        if footprint:
+            built["processing"].append(processing_id)
+    return built
+
+
+def survey_ids():
+    conn = get_field_data_conn()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT survey_id FROM survey_data ORDER BY survey_id")
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def intersecting(min_x, min_y, max_x, max_y, kind=None, include_hull=False, limit=1000):
+    """
+    Footprints intersecting a bounding box. MBRIntersects narrows candidates
+    through the spatial index; ST_Intersects then tests the actual hull.
+    """
+    window = bbox_wkt(min_x, min_y, max_x, max_y)
+    query = (
+        "SELECT kind, ref_id, survey_id, min_x, min_y, max_x, max_y, point_count, file_count, updated_at"
+        + (", hull_json" if include_hull else "")
+        + " FROM survey_footprints"
+        " WHERE MBRIntersects(footprint, ST_GeomFromText(%s, 0)) AND ST_Intersects(footprint, ST_GeomFromText(%s, 0))"
+    )
+    params = [window, window]
+    if kind:
+        query += " AND kind = %s"
+        params.append(kind)
+    query += " ORDER BY kind, ref_id LIMIT %s"
+    params.append(limit)
+    conn = get_field_data_conn()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+    for row in rows:
+        row["bbox"] = [row.pop("min_x"), row.pop("min_y"), row.pop("max_x"), row.pop("max_y")]
+        if include_hull:
+            row["hull"] = json.loads(row.pop("hull_json"))
+    return rows
@@ -0,0 +1,283 @@
+"""
+Referential-integrity checks across the three catalog databases.
+
+The catalog's parent links (survey -> block, acquisition -> survey, processing
+-> survey, ...) cross MySQL databases, so no foreign key enforces them. For
+each link in RELATIONS the checker streams two key sets, each sorted by its
+binary form so that MySQL's order is Python's byte order:
+
+- the reference column of the child table (with the child's own id), and
+- the distinct keys of the parent table,
+
+and merge-joins them. Both reads use unbuffered server-side cursors fetched
+in pages, so memory stays constant however large the tables are. Per link the
+report counts:
+
+- orphan rows: child rows whose reference names no parent row,
+- dangling keys: the distinct missing parent keys those rows point at,
+- unlinked rows: child rows with no reference at all,
+
+with up to MAX_EXAMPLES dangling keys and a few child ids for each.
+
+Runs are incremental: every child table carries row_modified_at (set on
+insert and update, added by migration 0011), and a link's watermark in
+integrity_watermarks records when it was last checked, so a nightly run only
+reads child rows written since (minus WATERMARK_OVERLAP_SECONDS, for
+transactions that committed late). A parent deleted after its children were
+checked is only noticed by a full run (`full=True`).
+
+Usage: python integrity.py [--full]
+"""
+import argparse
+import json
+from datetime import timedelta
+
+from database import get_field_data_conn, get_interpretation_data_conn, get_processing_data_conn
+
+FETCH_ROWS = 5000
+MAX_EXAMPLES = 100
+MAX_EXAMPLE_ROWS = 5
+WATERMARK_OVERLAP_SECONDS = 300
+MODIFIED_COLUMN = "row_modified_at"
+
+CONNECTORS = {
+    "field_data": get_field_data_conn,
+    "processing_data": get_processing_data_conn,
+    "interpretation_data": get_interpretation_data_conn,
+}
+
+# link -> (child database, child table, reference column, child id column,
+#          parent database, parent table, parent key column)
+RELATIONS = {
+    "survey_data.block_id": (
+        "field_data", "survey_data", "block_id", "survey_id", "field_data", "block_data", "block_id",
+    ),
+    "acquisition_data.survey_id": (
+        "field_data", "acquisition_data", "survey_id", "acquisition_id", "field_data", "survey_data", "survey_id",
+    ),
+    "acquisition_media_data.acquisition_id": (
+        "field_data", "acquisition_media_data", "acquisition_id", "acquisition_media_id",
+        "field_data", "acquisition_data", "acquisition_id",
+    ),
+    "processing_data.survey_id": (
+        "processing_data", "processing_data", "survey_id", "processing_id", "field_data", "survey_data", "survey_id",
+    ),
+    "processing_media_data.processing_id": (
+        "processing_data", "processing_media_data", "processing_id", "processing_media_id",
+        "processing_data", "processing_data", "processing_id",
+    ),
+    "interpretation_data.survey_id": (
+        "interpretation_data", "interpretation_data", "survey_id", "myindex", "field_data", "survey_data", "survey_id",
+    ),
+}
+
+
+def child_tables(database):
+    """The child tables of RELATIONS stored in `database`."""
+    return sorted({table for child_db, table, *_ in RELATIONS.values() if child_db == database})
+
+
+def add_modified_columns(database):
+    """A migration `run` callable adding row_modified_at to the child tables of `database`."""
+    def run(conn):
+        cursor = conn.cursor()
+        try:
+            for table in child_tables(database):
+                cursor.execute(
+                    "SELECT COUNT(*) FROM information_schema.COLUMNS "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+                    (table, MODIFIED_COLUMN),
+                )
+                if cursor.fetchone()[0]:
+                    continue
+                cursor.execute(
+                    f"ALTER TABLE {table} "
+                    f"ADD COLUMN {MODIFIED_COLUMN} TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP "
+                    f"ON UPDATE CURRENT_TIMESTAMP, "
+                    f"ADD INDEX idx_{table}_modified ({MODIFIED_COLUMN})"
+                )
+        finally:
+            cursor.close()
+    return run
+
+
+def _decode(value):
+    return None if value is None else bytes(value).decode("utf-8", errors="replace")
+
+
+def _stream(database, sql, params=()):
+    """Yields the rows of `sql` from an unbuffered cursor, a page at a time."""
+    conn = CONNECTORS[database]()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(FETCH_ROWS)
+            if not rows:
+                return
+            yield from rows
+    finally:
+        # Stopped early (the merge ran out of children): discard the rest
+        # so the pooled session is clean.
+        if getattr(conn, "unread_result", False):
+            conn.consume_results()
+        cursor.close()
+        conn.close()
+
+
+def _server_now(database):
+    conn = CONNECTORS[database]()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT NOW()")
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _watermarks():
+    conn = get_field_data_conn()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT relation, watermark FROM integrity_watermarks")
+        return dict(cursor.fetchall())
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _save(relation, watermark, report):
+    conn = get_field_data_conn()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "INSERT INTO integrity_watermarks "
+            "(relation, watermark, checked_at, incremental, checked_rows, orphan_rows, dangling_keys, unlinked_rows) "
+            "VALUES (%s, %s, NOW(), %s, %s, %s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE watermark = VALUES(watermark), checked_at = VALUES(checked_at), "
+            "incremental = VALUES(incremental), checked_rows = VALUES(checked_rows), "
+            "orphan_rows = VALUES(orphan_rows), dangling_keys = VALUES(dangling_keys), "
+            "unlinked_rows = VALUES(unlinked_rows)",
+            (
+                relation, watermark, report["incremental"], report["checked_rows"],
+                report["orphan_rows"], report["dangling_keys"], report["unlinked_rows"],
+            ),
+        )
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def merge_join(children, parent_keys):
+    """
+    Merge-joins child (reference, child id) rows with distinct parent keys,
+    both ascending in byte order; yields (reference, [child ids]) per
+    reference that has no parent, and (None, [child ids]) for unlinked rows.
+    """
+    parent_keys = iter(parent_keys)
+    parent, parent_read = None, False
+    missing, missing_ids = None, []
+    for reference, child_id in children:
+        if reference is None or reference == b"":
+            yield None, [child_id]
+            continue
+        if reference == missing:
+            missing_ids.append(child_id)
+            continue
+        if missing is not None:
+            yield missing, missing_ids
+            missing, missing_ids = None, []
+        if not parent_read:
+            parent, parent_read = next(parent_keys, None), True
+        while parent is not None and parent < reference:
+            parent = next(parent_keys, None)
+        if parent != reference:
+            missing, missing_ids = reference, [child_id]
+    if missing is not None:
+        yield missing, missing_ids
+
+
+def check_relation(relation, since=None):
+    """The integrity report of one link, over child rows modified since `since` (all if None)."""
+    child_db, child_table, reference, child_id, parent_db, parent_table, parent_key = RELATIONS[relation]
+    condition, params = "", ()
+    if since is not None:
+        condition, params = f"WHERE {MODIFIED_COLUMN} >= %s", (since,)
+    children = _stream(
+        child_db,
+        f"SELECT CAST({reference} AS BINARY) AS ref, {child_id} FROM {child_table} {condition} ORDER BY ref",
+        params,
+    )
+    # Only read once a linked child row arrives: an incremental run with
+    # nothing new never touches the parent table.
+    parents = _stream(
+        parent_db,
+        f"SELECT DISTINCT CAST({parent_key} AS BINARY) AS k FROM {parent_table} "
+        f"WHERE {parent_key} IS NOT NULL ORDER BY k",
+    )
+
+    checked = orphan_rows = dangling_keys = unlinked_rows = 0
+    examples = []
+
+    def counted(rows):
+        nonlocal checked
+        for ref, own_id in rows:
+            checked += 1
+            yield (None if ref is None else bytes(ref)), own_id
+
+    try:
+        for ref, ids in merge_join(counted(children), (bytes(row[0]) for row in parents)):
+            if ref is None:
+                unlinked_rows += len(ids)
+                continue
+            orphan_rows += len(ids)
+            dangling_keys += 1
+            if len(examples) < MAX_EXAMPLES:
+                examples.append({"key": _decode(ref), "rows": len(ids), "child_ids": ids[:MAX_EXAMPLE_ROWS]})
+    finally:
+        children.close()
+        parents.close()
+    return {
+        "relation": f"{child_table}.{reference} -> {parent_table}.{parent_key}",
+        "incremental": since is not None,
+        "checked_rows": checked,
+        "orphan_rows": orphan_rows,
+        "dangling_keys": dangling_keys,
+        "unlinked_rows": unlinked_rows,
+        "examples": examples,
+    }
+
+
+def run_checks(full=False, relations=None, progress=None):
+    """
+    Checks each link (default: all) from its watermark, or completely with
+    `full`, and advances the watermarks. Returns the reports by link.
+    """
+    relations = relations or list(RELATIONS)
+    watermarks = {} if full else _watermarks()
+    reports = {}
+    for done, relation in enumerate(relations):
+        if progress:
+            progress(done / len(relations), f"Checking {relation}", force=True)
+        # Taken before reading, on the child's server, so rows written
+        # during the check are read again next time rather than missed.
+        started = _server_now(RELATIONS[relation][0])
+        since = watermarks.get(relation)
+        if since is not None:
+            since -= timedelta(seconds=WATERMARK_OVERLAP_SECONDS)
+        reports[relation] = check_relation(relation, since)
+        _save(relation, started, reports[relation])
+    return {
+        "full": full,
+        "orphan_rows": sum(report["orphan_rows"] for report in reports.values()),
+        "relations": reports,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the catalog's cross-database links.")
+    parser.add_argument("--full", action="store_true", help="check every row, not just those since the watermark")
+    args = parser.parse_args()
+    print(json.dumps(run_checks(full=args.full), indent=2, default=str))
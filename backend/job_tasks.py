@@ -0,0 +1,199 @@
+"""
+Built-in background tasks. Each runs in a job worker process, receives the
+JobContext first and returns a JSON-serialisable summary.
+"""
+import csv
+import hashlib
+
+import archive
+import dedup
+import fixity
+import footprints
+import integrity
+import qc
+import segy
+import segy_index
+import storage
+import versions
+import write_engine
+# Importing the routers registers their table descriptors with write_engine.
+from routers import blocks, surveys, acquisition, acquisition_media  # noqa: F401
+from routers import processing, processing_media  # noqa: F401
+from routers import interpretation, interpretation_media  # noqa: F401
+
+HASH_BUFFER_SIZE = 8 * 1024 * 1024
+FETCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+
+def _descriptor(table):
+    try:
+        return write_engine.DESCRIPTORS[table]
+    except KeyError:
+        raise ValueError(f"Unknown catalog table: {table}")
+
+
+def _count(conn, table):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+
+
+def export_table(ctx, table):
+    """Streams a catalog table to a CSV file without buffering it in memory."""
+    descriptor = _descriptor(table)
+    conn = descriptor.connect()
+    cursor = None
+    try:
+        total = _count(conn, table) or 1
+        # Unbuffered cursor: rows are streamed from the server as we write.
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(f"SELECT * FROM {table}")
+        path = ctx.result_path(f"{table}.csv")
+        written = 0
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(cursor.column_names)
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                writer.writerows(rows)
+                written += len(rows)
+                ctx.progress(written / total, f"{written} rows exported")
+        return {"table": table, "rows": written}
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+def hash_files(ctx, paths, algorithm="sha256"):
+    """Computes checksums for files under the data root."""
+    digests = {}
+    missing = []
+    for index, relative_path in enumerate(paths):
+        try:
+            path = storage.resolve(relative_path)
+            digest = hashlib.new(algorithm)
+            with open(path, "rb") as f:
+                while True:
+                    chunk = f.read(HASH_BUFFER_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    ctx.progress(index / len(paths), f"Hashing {relative_path}")
+            digests[relative_path] = digest.hexdigest()
+        except (OSError, storage.StoragePathError):
+            missing.append(relative_path)
+        ctx.progress((index + 1) / len(paths), f"{index + 1} of {len(paths)} files hashed")
+    return {"algorithm": algorithm, "digests": digests, "missing": missing}
+
+
+def validate_media(ctx, table):
+    """
+    Re-validates every stored row of a catalog table against its compiled
+    insert model and reports the rows that would be rejected today.
+    """
+    descriptor = _descriptor(table)
+    conn = descriptor.connect()
+    cursor = None
+    try:
+        descriptor.introspect(conn)
+        total = _count(conn, table) or 1
+        cursor = conn.cursor(buffered=False)
+        cursor.execute("SELECT %s FROM %s" % (", ".join(descriptor.columns), table))
+        checked = 0
+        invalid = 0
+        errors = []
+        path = ctx.result_path(f"{table}_invalid.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["row", "field", "message"])
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    try:
+                        descriptor.validate(dict(zip(descriptor.fields, row)))
+                    except write_engine.PayloadError as err:
+                        invalid += 1
+                        for error in err.errors:
+                            writer.writerow([checked, error["field"], error["message"]])
+                            if len(errors) < MAX_REPORTED_ERRORS:
+                                errors.append(dict(error, row=checked))
+                    checked += 1
+                ctx.progress(checked / total, f"{checked} rows checked")
+        return {"table": table, "checked": checked, "invalid": invalid, "errors": errors}
+    finally:
+        if cursor:
+            cursor.close()
+        conn.close()
+
+
+def build_segy_index(ctx, file, kind="inline_xline"):
+    """Indexes a stored SEG-Y file ahead of extraction requests."""
+    ctx.progress(0, f"Indexing {file}", force=True)
+    index = segy_index.build_index(storage.resolve(file), kind)
+    return {"file": file, "kind": kind, **segy_index.index_stats(index)}
+
+
+def survey_qc(ctx, survey_id, target="acquisition", qc_by="auto-qc", workers=None):
+    """QCs every stored SEG-Y file of a survey and fills in the media QC fields."""
+    if target not in qc.TARGETS:
+        raise ValueError(f"Unknown QC target: {target}")
+    ctx.progress(0, f"Listing {target} media of survey {survey_id}", force=True)
+    return qc.run_survey_qc(survey_id, target, qc_by, workers, progress=ctx.progress)
+
+
+def fixity_audit(ctx, full=False, max_mb_per_second=None):
+    """Verifies the checksums of every catalogued file (see fixity.py)."""
+    ctx.progress(0, "Listing catalogued files", force=True)
+    return fixity.run_audit(full=full, max_mb_per_second=max_mb_per_second, progress=ctx.progress)
+
+
+def build_footprints(ctx, survey_ids=None):
+    """Recomputes the spatial footprints of the given surveys (default: all)."""
+    survey_ids = survey_ids or footprints.survey_ids()
+    built = {"survey": 0, "processing": 0}
+    failed = {}
+    for index, survey_id in enumerate(survey_ids):
+        ctx.progress(index / max(len(survey_ids), 1), f"Footprint of survey {survey_id}")
+        try:
+            for kind, ids in footprints.build_survey_footprints(survey_id).items():
+                built[kind] += len(ids)
+        except (OSError, segy.SegyError) as e:
+            failed[str(survey_id)] = str(e)
+    return {"surveys": len(survey_ids), "built": built, "failed": failed}
+
+
+def archive_requisitions(ctx, older_than_days=None):
+    """Moves finalised requisitions to the compressed archive (see archive.py)."""
+    ctx.progress(0, "Archiving finalised requisitions", force=True)
+    return archive.archive_requisitions(older_than_days, progress=ctx.progress)
+
+
+def rebuild_media_index(ctx):
+    """Rebuilds the cross-catalog media identifier index (see dedup.py)."""
+    ctx.progress(0, "Rebuilding the media identifier index", force=True)
+    return dedup.rebuild_index(progress=ctx.progress)
+
+
+def rebuild_latest_versions(ctx, target=None):
+    """Recomputes the latest-version summaries (see versions.py) of one target or all."""
+    targets = [target] if target else list(versions.TARGETS)
+    groups = {}
+    for index, name in enumerate(targets):
+        ctx.progress(index / len(targets), f"Rebuilding latest {name} versions", force=True)
+        groups[name] = versions.rebuild(name)
+    return {"groups": groups}
+
+
+def integrity_check(ctx, full=False, relations=None):
+    """Reports orphaned references across the three databases (see integrity.py)."""
+    ctx.progress(0, "Checking cross-database links", force=True)
+    return integrity.run_checks(full=full, relations=relations, progress=ctx.progress)
@@ -0,0 +1,455 @@
+"""
+Durable background jobs for work too slow for a request handler.
+
+Jobs live in the field_data `jobs` table. The API only inserts rows and reads
+them back; a JobRunner claims queued rows and executes them in a local process
+pool, so exports, hashing or report rebuilds never occupy an API worker.
+Tasks report progress and honour cancellation through the JobContext they
+receive as their first argument.
+
+A running job whose runner stops heartbeating is requeued (or, if its
+cancellation was requested, finished as cancelled). Every claim increments
+the job's attempt number, and progress, heartbeats and outcomes only apply
+to the current attempt, so a runner that was merely slow cannot overwrite
+the rerun's state; its task stops at the next progress check.
+
+Usage: python jobs.py [WORKERS]   run a standalone runner
+"""
+import importlib
+import inspect
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+import logs
+from config import (
+    ARCHIVE_INTERVAL_HOURS, DEDUP_INDEX_INTERVAL_HOURS, FIXITY_INTERVAL_HOURS, INTEGRITY_INTERVAL_HOURS, JOB_RESULTS_DIR,
+    LATEST_VERSIONS_INTERVAL_HOURS,
+)
+from database import get_field_data_conn
+
+logger = logging.getLogger(__name__)
+
+# kind -> "module:function". Task functions take (ctx, **params) and return a
+# JSON-serialisable result.
+TASKS = {
+    "export_table": "job_tasks:export_table",
+    "hash_files": "job_tasks:hash_files",
+    "validate_media": "job_tasks:validate_media",
+    "build_segy_index": "job_tasks:build_segy_index",
+    "survey_qc": "job_tasks:survey_qc",
+    "fixity_audit": "job_tasks:fixity_audit",
+    "build_footprints": "job_tasks:build_footprints",
+    "archive_requisitions": "job_tasks:archive_requisitions",
+    "rebuild_media_index": "job_tasks:rebuild_media_index",
+    "rebuild_latest_versions": "job_tasks:rebuild_latest_versions",
+    "integrity_check": "job_tasks:integrity_check",
+}
+
+# Recurring jobs as (kind, params, interval seconds). A runner queues one when
+# no job of that kind is pending or was created within the interval.
+SCHEDULES = [
+    (kind, params, interval)
+    for kind, params, interval in [
+        ("fixity_audit", {}, FIXITY_INTERVAL_HOURS * 3600),
+        ("archive_requisitions", {}, ARCHIVE_INTERVAL_HOURS * 3600),
+        ("rebuild_media_index", {}, DEDUP_INDEX_INTERVAL_HOURS * 3600),
+        ("rebuild_latest_versions", {}, LATEST_VERSIONS_INTERVAL_HOURS * 3600),
+        ("integrity_check", {}, INTEGRITY_INTERVAL_HOURS * 3600),
+    ]
+    if interval > 0
+]
+SCHEDULE_CHECK_SECONDS = 60
+
+FINAL_STATUSES = ("succeeded", "failed", "cancelled")
+# A running job whose runner has not heartbeated for this long is requeued.
+STALE_AFTER_SECONDS = 300
+# Minimum interval between progress writes from a task.
+PROGRESS_INTERVAL_SECONDS = 1.0
+
+_JOB_COLUMNS = (
+    "id, kind, params_json, status, progress, progress_message, result_json, result_path, "
+    "error, cancel_requested, submitted_by, worker, created_at, started_at, finished_at"
+)
+
+
+class JobCancelled(Exception):
+    """Raised inside a task when cancellation has been requested."""
+
+
+class JobSuperseded(JobCancelled):
+    """Raised inside a task whose job was requeued and claimed again."""
+
+
+def task_function(kind):
+    module_name, func_name = TASKS[kind].split(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def validate_params(kind, params):
+    """
+    Raises KeyError for an unknown kind and TypeError when `params` do not
+    fit the task's signature, so bad submissions fail before queueing.
+    """
+    if kind not in TASKS:
+        raise KeyError(kind)
+    inspect.signature(task_function(kind)).bind(None, **params)
+
+
+def _row_to_job(row):
+    job = dict(row)
+    job["params"] = json.loads(job.pop("params_json") or "{}")
+    result_json = job.pop("result_json")
+    job["result"] = json.loads(result_json) if result_json else None
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    return job
+
+
+def submit(kind, params, submitted_by=None):
+    conn = get_field_data_conn()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "INSERT INTO jobs (kind, params_json, submitted_by) VALUES (%s, %s, %s)",
+            (kind, json.dumps(params), submitted_by),
+        )
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def get_job(job_id):
+    conn = get_field_data_conn()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id = %s", (job_id,))
+        row = cursor.fetchone()
+        return _row_to_job(row) if row else None
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def list_jobs(status=None, kind=None, limit=50):
+    query = f"SELECT {_JOB_COLUMNS} FROM jobs WHERE 1=1"
+    params = []
+    if status:
+        query += " AND status = %s"
+        params.append(status)
+    if kind:
+        query += " AND kind = %s"
+        params.append(kind)
+    query += " ORDER BY id DESC LIMIT %s"
+    params.append(limit)
+    conn = get_field_data_conn()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(query, params)
+        return [_row_to_job(row) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def request_cancel(job_id):
+    """
+    Cancels a queued job outright and flags a running one; the task stops at
+    its next progress/cancellation check.
+    """
+    conn = get_field_data_conn()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "UPDATE jobs SET status = 'cancelled', cancel_requested = 1, finished_at = NOW() "
+            "WHERE id = %s AND status = 'queued'",
+            (job_id,),
+        )
+        cursor.execute(
+            "UPDATE jobs SET cancel_requested = 1 WHERE id = %s AND status = 'running'",
+            (job_id,),
+        )
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+    return get_job(job_id)
+
+
+class JobContext:
+    """Handed to every task; runs inside the worker process."""
+
+    def __init__(self, job_id, attempt):
+        self.job_id = job_id
+        self.attempt = attempt
+        self.result_file = None
+        self._last_write = 0.0
+
+    @property
+    def result_dir(self):
+        path = os.path.join(JOB_RESULTS_DIR, str(self.job_id))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def result_path(self, filename):
+        """Reserves the job's downloadable result file and returns its path."""
+        self.result_file = os.path.join(self.result_dir, filename)
+        return self.result_file
+
+    def progress(self, fraction, message=None, force=False):
+        """
+        Records progress (0..1) at most once per PROGRESS_INTERVAL_SECONDS and
+        raises JobCancelled if the job has been cancelled meanwhile
+        (JobSuperseded if it has been requeued and claimed again).
+        """
+        now = datetime.now().timestamp()
+        if not force and now - self._last_write < PROGRESS_INTERVAL_SECONDS:
+            return
+        self._last_write = now
+        conn = get_field_data_conn()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "UPDATE jobs SET progress = %s, progress_message = %s WHERE id = %s AND attempt = %s",
+                (max(0.0, min(1.0, float(fraction))), (message or "")[:255] or None, self.job_id, self.attempt),
+            )
+            cursor.execute("SELECT cancel_requested, attempt FROM jobs WHERE id = %s", (self.job_id,))
+            row = cursor.fetchone()
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+        if row and row[1] != self.attempt:
+            raise JobSuperseded()
+        if row and row[0]:
+            raise JobCancelled()
+
+
+def _finish(job_id, attempt, status, result=None, result_path=None, error=None):
+    conn = get_field_data_conn()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "UPDATE jobs SET status = %s, result_json = %s, result_path = %s, error = %s, "
+            "progress = IF(%s = 'succeeded', 1, progress), finished_at = NOW() "
+            "WHERE id = %s AND attempt = %s AND status = 'running'",
+            (
+                status,
+                json.dumps(result, default=str) if result is not None else None,
+                result_path,
+                error,
+                status,
+                job_id,
+                attempt,
+            ),
+        )
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def run_job(job_id, attempt, kind, params):
+    """Worker-process entry point: runs one attempt of a task and records its outcome."""
+    ctx = JobContext(job_id, attempt)
+    with logs.context(job_id=job_id, job_kind=kind):
+        try:
+            result = task_function(kind)(ctx, **params)
+        except JobSuperseded:
+            logger.warning("Job was requeued and claimed again; abandoning attempt %s", attempt)
+        except JobCancelled:
+            logger.info("Job cancelled")
+            _finish(job_id, attempt, "cancelled")
+        except Exception:
+            logger.exception("Job failed")
+            _finish(job_id, attempt, "failed", error=traceback.format_exc()[-8000:])
+        else:
+            _finish(job_id, attempt, "succeeded", result=result, result_path=ctx.result_file)
+
+
+class JobRunner:
+    """
+    Claims queued jobs and runs them on a process pool. Several runners (on
+    one or more hosts) can share the table: claims use SKIP LOCKED, and the
+    runner heartbeats its jobs so a crashed runner's work is requeued.
+    """
+
+    def __init__(self, workers=None, poll_interval=2.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.poll_interval = poll_interval
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self._executor = None
+        self._running = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_schedule_check = 0.0
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="job-runner", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _new_executor(self):
+        # spawn, not fork: the API process is multi-threaded.
+        return ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=logs.setup
+        )
+
+    def run(self):
+        self._executor = self._new_executor()
+        while not self._stop.is_set():
+            try:
+                self._tick()
+            except Exception:
+                logger.exception("Job runner tick failed")
+            self._stop.wait(self.poll_interval)
+
+    def _tick(self):
+        self._reap()
+        conn = get_field_data_conn()
+        try:
+            self._heartbeat(conn)
+            self._requeue_stale(conn)
+            self._queue_scheduled(conn)
+            while len(self._running) < self.workers and not self._stop.is_set():
+                claimed = self._claim(conn)
+                if claimed is None:
+                    break
+                job_id, attempt, kind, params = claimed
+                try:
+                    future = self._executor.submit(run_job, job_id, attempt, kind, params)
+                except BrokenProcessPool:
+                    self._executor = self._new_executor()
+                    future = self._executor.submit(run_job, job_id, attempt, kind, params)
+                self._running[job_id] = (attempt, future)
+        finally:
+            conn.close()
+
+    def _reap(self):
+        for job_id, (attempt, future) in list(self._running.items()):
+            if not future.done():
+                continue
+            del self._running[job_id]
+            error = future.exception()
+            if error is not None:
+                # The worker died before it could record an outcome.
+                _finish(job_id, attempt, "failed", error=f"Worker process failed: {error!r}")
+                if isinstance(error, BrokenProcessPool):
+                    self._executor = self._new_executor()
+
+    def _heartbeat(self, conn):
+        if not self._running:
+            return
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "UPDATE jobs SET heartbeat_at = NOW() WHERE (id, attempt) IN (%s)"
+                % ", ".join(["(%s, %s)"] * len(self._running)),
+                [value for job_id, (attempt, _) in self._running.items() for value in (job_id, attempt)],
+            )
+            conn.commit()
+        finally:
+            cursor.close()
+
+    def _requeue_stale(self, conn):
+        cursor = conn.cursor()
+        try:
+            # A stale job whose cancellation was requested is not run again.
+            cursor.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = NOW(), "
+                "error = 'Runner stopped heartbeating after cancellation was requested' "
+                "WHERE status = 'running' AND cancel_requested = 1 "
+                "AND heartbeat_at < NOW() - INTERVAL %s SECOND",
+                (STALE_AFTER_SECONDS,),
+            )
+            cursor.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL "
+                "WHERE status = 'running' AND heartbeat_at < NOW() - INTERVAL %s SECOND",
+                (STALE_AFTER_SECONDS,),
+            )
+            conn.commit()
+        finally:
+            cursor.close()
+
+    def _queue_scheduled(self, conn):
+        now = datetime.now().timestamp()
+        if not SCHEDULES or now - self._last_schedule_check < SCHEDULE_CHECK_SECONDS:
+            return
+        self._last_schedule_check = now
+        cursor = conn.cursor()
+        try:
+            # Only one runner evaluates the schedule at a time.
+            cursor.execute("SELECT GET_LOCK('jobs_schedule', 0)")
+            if not cursor.fetchone()[0]:
+                return
+            try:
+                for kind, params, interval in SCHEDULES:
+                    cursor.execute(
+                        "SELECT COUNT(*) FROM jobs WHERE kind = %s AND "
+                        "(status IN ('queued', 'running') OR created_at > NOW() - INTERVAL %s SECOND)",
+                        (kind, int(interval)),
+                    )
+                    if cursor.fetchone()[0] == 0:
+                        cursor.execute(
+                            "INSERT INTO jobs (kind, params_json, submitted_by) VALUES (%s, %s, 'scheduler')",
+                            (kind, json.dumps(params)),
+                        )
+                        logger.info("Queued scheduled %s job", kind)
+                conn.commit()
+            finally:
+                cursor.execute("DO RELEASE_LOCK('jobs_schedule')")
+        finally:
+            cursor.close()
+
+    def _claim(self, conn):
+        cursor = conn.cursor()
+        try:
+            conn.start_transaction()
+            cursor.execute(
+                "SELECT id, kind, params_json FROM jobs WHERE status = 'queued' "
+                "ORDER BY id LIMIT 1 FOR UPDATE SKIP LOCKED"
+            )
+            row = cursor.fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+            cursor.execute(
+                "UPDATE jobs SET status = 'running', worker = %s, started_at = NOW(), "
+                "heartbeat_at = NOW(), attempt = attempt + 1 WHERE id = %s",
+                (self.name, row[0]),
+            )
+            cursor.execute("SELECT attempt FROM jobs WHERE id = %s", (row[0],))
+            attempt = cursor.fetchone()[0]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        job_id, kind, params_json = row
+        return job_id, attempt, kind, json.loads(params_json or "{}")
+
+
+if __name__ == "__main__":
+    logs.setup()
+    runner = JobRunner(int(sys.argv[1]) if len(sys.argv) > 1 else None)
+    logger.info("Job runner %s started with %d workers", runner.name, runner.workers)
+    try:
+        runner.run()
+    except KeyboardInterrupt:
+        runner.stop()
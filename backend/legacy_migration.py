@@ -0,0 +1,361 @@
+"""
+Bulk loader for legacy catalogs (spreadsheets, CSV/JSON-lines dumps).
+
+A plan file lists the sources to load, in dependency order:
+
+    {
+      "name": "legacy-2025",
+      "sources": [
+        {"file": "blocks.xlsx", "table": "block_data", "sheet": "Blocks",
+         "columns": {"Block No": "block_id", "Block Name": "block_name"}},
+        {"file": "surveys.csv", "table": "survey_data", "on_duplicate": "ignore",
+         "defaults": {"company": "ONGC"}}
+      ]
+    }
+
+`columns` maps legacy column names to the target table's payload keys
+(omitted: the legacy headers already match). Rows are streamed, validated
+with the table's write_engine model and inserted with multi-row prepared
+statements in large transactions. Each transaction also advances the
+source's row in legacy_migration_checkpoints, so after a crash the same
+command resumes after the last committed row. Each target database is
+loaded by its own process; sources sharing a database load in plan order.
+
+Loaded rows are added to the media identifier index (dedup.py) and the
+latest-version summaries (versions.py) after each transaction. A
+transaction in which duplicates were skipped is left to the scheduled
+rebuild jobs, since INSERT IGNORE does not say which of its rows it kept.
+
+Rejected rows go to <report-dir>/<run>/<source>.rejects.csv and a
+reconciliation report (source rows vs loaded/duplicate/rejected, and the
+target table's row count delta) to <report-dir>/<run>/reconciliation.json.
+
+Usage: python legacy_migration.py PLAN.json [--report-dir DIR]
+                                  [--transaction-rows N] [--restart]
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import dedup
+import versions
+import write_engine
+from config import VAR_DIR
+# Importing the routers registers their table descriptors with write_engine.
+from routers import blocks, surveys, acquisition, acquisition_media  # noqa: F401
+from routers import processing, processing_media  # noqa: F401
+from routers import interpretation, interpretation_media  # noqa: F401
+
+DEFAULT_TRANSACTION_ROWS = 20000
+DEFAULT_REPORT_DIR = os.path.join(VAR_DIR, "legacy_migration")
+READ_BUFFER_SIZE = 1024 * 1024
+
+
+class PlanError(ValueError):
+    """Raised for plan files that cannot be executed."""
+
+
+# ===== Readers =====
+# Each yields one dict per legacy row, keyed by the source's column headers.
+
+def _read_csv(source):
+    with open(source["file"], newline="", encoding=source.get("encoding", "utf-8-sig"),
+              buffering=READ_BUFFER_SIZE) as f:
+        yield from csv.DictReader(f, delimiter=source.get("delimiter", ","))
+
+
+def _read_jsonl(source):
+    with open(source["file"], encoding=source.get("encoding", "utf-8"), buffering=READ_BUFFER_SIZE) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _read_xlsx(source):
+    import openpyxl
+
+    # read_only streams rows from the sheet XML instead of building the workbook.
+    workbook = openpyxl.load_workbook(source["file"], read_only=True, data_only=True)
+    try:
+        sheet = workbook[source["sheet"]] if source.get("sheet") else workbook.active
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(name).strip() if name is not None else "" for name in next(rows, ())]
+        for row in rows:
+            if any(value is not None for value in row):
+                yield dict(zip(header, row))
+    finally:
+        workbook.close()
+
+
+READERS = {".csv": _read_csv, ".txt": _read_csv, ".jsonl": _read_jsonl, ".xlsx": _read_xlsx}
+
+
+def _reader(source):
+    extension = source.get("format") or os.path.splitext(source["file"])[1].lower()
+    if not extension.startswith("."):
+        extension = "." + extension
+    try:
+        return READERS[extension]
+    except KeyError:
+        raise PlanError(f"Unsupported legacy format {extension!r} for {source['file']}")
+
+
+# ===== Plan =====
+
+def load_plan(path):
+    with open(path, encoding="utf-8") as f:
+        plan = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    if not plan.get("name") or not plan.get("sources"):
+        raise PlanError("A plan needs a name and at least one source")
+    for source in plan["sources"]:
+        if source.get("table") not in write_engine.DESCRIPTORS:
+            raise PlanError(
+                f"Unknown target table {source.get('table')!r}. "
+                f"Allowed tables: {', '.join(sorted(write_engine.DESCRIPTORS))}"
+            )
+        if source.get("on_duplicate", "error") not in ("error", "ignore"):
+            raise PlanError("on_duplicate must be 'error' or 'ignore'")
+        source["file"] = os.path.join(base, source["file"])
+        _reader(source)
+        # Checkpoints and reports are keyed by this name; sources loading the
+        # same file into two tables stay distinct.
+        source.setdefault("key", f"{os.path.basename(source['file'])}:{source['table']}")
+    return plan
+
+
+def _mapper(source):
+    columns = source.get("columns")
+    defaults = source.get("defaults", {})
+    if columns is None:
+        return lambda row: {**defaults, **row}
+    pairs = list(columns.items())
+    return lambda row: {**defaults, **{field: row.get(legacy) for legacy, field in pairs}}
+
+
+# ===== Checkpoints =====
+
+def _checkpoint(cursor, run_name, source, target_rows_before):
+    cursor.execute(
+        "INSERT IGNORE INTO legacy_migration_checkpoints (run_name, source, target_table, target_rows_before) "
+        "VALUES (%s, %s, %s, %s)",
+        (run_name, source["key"], source["table"], target_rows_before),
+    )
+    cursor.execute(
+        "SELECT rows_read, rows_loaded, rows_duplicate, rows_rejected, completed, target_rows_before "
+        "FROM legacy_migration_checkpoints WHERE run_name = %s AND source = %s",
+        (run_name, source["key"]),
+    )
+    return dict(zip(
+        ("rows_read", "rows_loaded", "rows_duplicate", "rows_rejected", "completed", "target_rows_before"),
+        cursor.fetchone(),
+    ))
+
+
+def _count(cursor, table):
+    cursor.execute(f"SELECT COUNT(*) FROM {table}")
+    return cursor.fetchone()[0]
+
+
+def _safe_name(key):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", key)
+
+
+# ===== Loading =====
+
+def _note_loaded(descriptor, values):
+    """Adds committed rows to the dedup index and latest-version summaries, as the API does."""
+    rows = [dict(zip(descriptor.columns, row)) for row in values]
+    if descriptor.table in dedup.SOURCE_BY_TABLE:
+        dedup.register(dedup.SOURCE_BY_TABLE[descriptor.table], rows)
+    if descriptor.table in versions.TARGET_BY_TABLE:
+        versions.note_inserted(versions.TARGET_BY_TABLE[descriptor.table], rows)
+
+
+def load_source(run_name, source, report_dir, transaction_rows):
+    """Loads (or resumes) one source. Returns its reconciliation entry."""
+    descriptor = write_engine.DESCRIPTORS[source["table"]]
+    ignore = source.get("on_duplicate") == "ignore"
+    conn = descriptor.connect()
+    cursor = conn.cursor()
+    try:
+        write_engine._ensure_introspected(descriptor, conn)
+        state = _checkpoint(cursor, run_name, source, _count(cursor, source["table"]))
+        conn.commit()
+        started = time.monotonic()
+        resumed_from = state["rows_read"]
+        if not state["completed"]:
+            to_payload = _mapper(source)
+            rejects_path = os.path.join(report_dir, _safe_name(source["key"]) + ".rejects.csv")
+            rows = _reader(source)(source)
+            # Rows up to the checkpoint were committed by an earlier attempt.
+            for _ in range(resumed_from):
+                if next(rows, None) is None:
+                    break
+            values, rejects = [], []
+            row_number = resumed_from
+            exhausted = False
+            while not exhausted:
+                for row in rows:
+                    row_number += 1
+                    try:
+                        values.append(descriptor.validate(to_payload(row)))
+                    except write_engine.PayloadError as err:
+                        rejects.append((row_number, err.errors, row))
+                    if len(values) + len(rejects) >= transaction_rows:
+                        break
+                else:
+                    exhausted = True
+                loaded = write_engine.execute_batches(
+                    descriptor, conn, values, descriptor.max_batch_rows, ignore_duplicates=ignore
+                )
+                cursor.execute(
+                    "UPDATE legacy_migration_checkpoints SET rows_read = %s, rows_loaded = rows_loaded + %s, "
+                    "rows_duplicate = rows_duplicate + %s, rows_rejected = rows_rejected + %s, completed = %s "
+                    "WHERE run_name = %s AND source = %s",
+                    (row_number, loaded, len(values) - loaded, len(rejects), exhausted, run_name, source["key"]),
+                )
+                conn.commit()
+                if values and loaded == len(values):
+                    _note_loaded(descriptor, values)
+                # Written only after the commit so a resumed run never repeats them.
+                if rejects:
+                    _append_rejects(rejects_path, rejects)
+                print(f"[{source['key']}] {row_number} rows read", flush=True)
+                values, rejects = [], []
+            state = _checkpoint(cursor, run_name, source, None)
+        target_rows_after = _count(cursor, source["table"])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+    accounted = state["rows_loaded"] + state["rows_duplicate"] + state["rows_rejected"]
+    return {
+        "source": source["key"],
+        "file": source["file"],
+        "table": source["table"],
+        "rows_read": state["rows_read"],
+        "rows_loaded": state["rows_loaded"],
+        "rows_duplicate": state["rows_duplicate"],
+        "rows_rejected": state["rows_rejected"],
+        "source_balanced": accounted == state["rows_read"],
+        "target_rows_before": state["target_rows_before"],
+        "target_rows_after": target_rows_after,
+        # Differs from rows_loaded if something else wrote to the table meanwhile.
+        "target_delta": target_rows_after - (state["target_rows_before"] or 0),
+        "resumed_from_row": resumed_from,
+        "seconds_this_attempt": round(time.monotonic() - started, 1),
+    }
+
+
+def _append_rejects(path, rejects):
+    new_file = not os.path.exists(path)
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(["row", "field", "message", "legacy_row"])
+        for row_number, errors, row in rejects:
+            for error in errors:
+                writer.writerow([row_number, error["field"], error["message"], json.dumps(row, default=str)])
+
+
+def load_database(run_name, sources, report_dir, transaction_rows):
+    """Worker-process entry point: loads one database's sources in order."""
+    return [load_source(run_name, source, report_dir, transaction_rows) for source in sources]
+
+
+def reset_run(run_name, sources):
+    by_connect = {}
+    for source in sources:
+        by_connect.setdefault(write_engine.DESCRIPTORS[source["table"]].connect, []).append(source["key"])
+    for connect, keys in by_connect.items():
+        conn = connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "DELETE FROM legacy_migration_checkpoints WHERE run_name = %%s AND source IN (%s)"
+                % ", ".join(["%s"] * len(keys)),
+                (run_name, *keys),
+            )
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+
+
+def run(plan, report_dir=DEFAULT_REPORT_DIR, transaction_rows=DEFAULT_TRANSACTION_ROWS, restart=False):
+    run_name = plan["name"]
+    report_dir = os.path.join(report_dir, _safe_name(run_name))
+    os.makedirs(report_dir, exist_ok=True)
+    if restart:
+        reset_run(run_name, plan["sources"])
+        for name in os.listdir(report_dir):
+            if name.endswith(".rejects.csv"):
+                os.remove(os.path.join(report_dir, name))
+
+    groups = {}
+    for source in plan["sources"]:
+        groups.setdefault(write_engine.DESCRIPTORS[source["table"]].connect.__name__, []).append(source)
+    started = time.monotonic()
+    with ProcessPoolExecutor(len(groups), mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {
+            database: pool.submit(load_database, run_name, sources, report_dir, transaction_rows)
+            for database, sources in groups.items()
+        }
+        results, failures = [], {}
+        for database, future in futures.items():
+            try:
+                results.extend(future.result())
+            except Exception as e:
+                failures[database] = repr(e)
+
+    report = {
+        "run": run_name,
+        "seconds": round(time.monotonic() - started, 1),
+        "sources": results,
+        "failed_databases": failures,
+        "balanced": not failures and all(entry["source_balanced"] for entry in results),
+    }
+    with open(os.path.join(report_dir, "reconciliation.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str)
+    return report
+
+
+def _print_report(report):
+    print(f"{'source':<40} {'read':>10} {'loaded':>10} {'dup':>8} {'rejected':>9} {'table +':>10}")
+    for entry in report["sources"]:
+        print(
+            f"{entry['source']:<40} {entry['rows_read']:>10} {entry['rows_loaded']:>10} "
+            f"{entry['rows_duplicate']:>8} {entry['rows_rejected']:>9} {entry['target_delta']:>10}"
+        )
+    for database, error in report["failed_databases"].items():
+        print(f"FAILED {database}: {error} (re-run the same command to resume)")
+    print("Reconciled." if report["balanced"] else "NOT reconciled; see the report and rejects files.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load legacy catalogs into the archive databases.")
+    parser.add_argument("plan", help="JSON plan file")
+    parser.add_argument("--report-dir", default=DEFAULT_REPORT_DIR)
+    parser.add_argument("--transaction-rows", type=int, default=DEFAULT_TRANSACTION_ROWS,
+                        help="rows per committed transaction/checkpoint")
+    parser.add_argument("--restart", action="store_true", help="discard checkpoints and start over")
+    args = parser.parse_args()
+    try:
+        plan = load_plan(args.plan)
+    except (OSError, PlanError, json.JSONDecodeError) as e:
+        print(f"Invalid plan: {e}")
+        sys.exit(2)
+    report = run(plan, args.report_dir, args.transaction_rows, args.restart)
+    _print_report(report)
+    sys.exit(0 if report["balanced"] else 1)
@@ -0,0 +1,232 @@
+"""
+Worker start-up: timed phases, parallel warm-up and health probes.
+
+The app records how long each start-up phase takes (module imports, app
+assembly, each warm-up task). Warm-up runs in the background once the server
+is listening: schema migrations are checked for (and applied, with
+MIGRATE_ON_STARTUP=1), connection pools are
+opened, catalog key indexes are read into MySQL's buffer pool, the block,
+survey and requisition caches are preloaded, typed insert models are compiled
+and the bcrypt backend is loaded, all in parallel. Failed tasks are retried
+with backoff. /healthz answers as soon as the process is up; /readyz reports
+ready only once every warm-up task has succeeded, no migration is pending and
+each database answers a live check, and lists the tasks still failing.
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+
+from fastapi.concurrency import run_in_threadpool
+
+import config
+import database
+import write_engine
+from single_flight import flights
+
+# Live database checks are reused for this long, so frequent probes stay cheap.
+READINESS_CHECK_TTL_SECONDS = 2.0
+# Failed warm-up tasks are retried after this delay, doubling up to the maximum.
+WARMUP_RETRY_SECONDS = 2.0
+WARMUP_RETRY_MAX_SECONDS = 60.0
+
+# Key columns scanned per database during warm-up; touching them pulls the
+# index pages behind the ID pickers and counts into MySQL's buffer pool.
+WARM_INDEXES = {
+    "field_data": [("block_data", "block_id"), ("survey_data", "survey_id"), ("acquisition_data", "acquisition_id")],
+    "processing_data": [("processing_data", "processing_id")],
+    "interpretation_data": [("interpretation_data", "myindex")],
+}
+
+
+class StartupReport:
+    def __init__(self):
+        self.started_at = time.time()
+        self._origin = self._last = time.perf_counter()
+        self.phases = []
+        self.warmup = {}
+        self.ready_after_ms = None
+
+    def _ms(self, start, end=None):
+        return round(((end or time.perf_counter()) - start) * 1000, 1)
+
+    def _record(self, name, start):
+        end = time.perf_counter()
+        self.phases.append({"phase": name, "ms": self._ms(start, end), "at_ms": self._ms(self._origin, start)})
+        self._last = end
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, start)
+
+    def mark(self, name):
+        """Records the time since the previous phase ended as phase `name`."""
+        self._record(name, self._last)
+
+    def as_dict(self):
+        return {
+            "started_at": self.started_at,
+            "phases": self.phases,
+            "warmup": self.warmup,
+            "ready": self.ready_after_ms is not None,
+            "ready_after_ms": self.ready_after_ms,
+        }
+
+
+startup = StartupReport()
+_ready = False
+_last_check = (0.0, None)
+# Pending (id, database) migrations as last checked; None until checked.
+_pending_migrations = None
+_migrations_checked_at = 0.0
+
+
+def _warm_database(name):
+    def warm():
+        database.ping(name)  # creates the pool and its connections
+        conn = database._connect(name)
+        cursor = conn.cursor()
+        try:
+            for table, column in WARM_INDEXES.get(name, []):
+                cursor.execute(f"SELECT COUNT(DISTINCT {column}) FROM {table}")
+                cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
+    return warm
+
+
+def _warm_password_hashing():
+    from routers.users import pwd_context
+
+    # Loads and self-tests the bcrypt backend, which passlib defers to first use.
+    pwd_context.dummy_verify()
+
+
+def _pending():
+    import migrations
+
+    global _pending_migrations, _migrations_checked_at
+    _pending_migrations = [] if config.DB_BACKEND == "sqlite" else migrations.pending()
+    _migrations_checked_at = time.monotonic()
+    return _pending_migrations
+
+
+def _migrate():
+    import migrations
+
+    if config.MIGRATE_ON_STARTUP and config.DB_BACKEND != "sqlite":
+        migrations.apply_migrations(verbose=False)
+    waiting = _pending()
+    if waiting:
+        raise RuntimeError(f"{len(waiting)} migration(s) pending; run python migrations.py")
+
+
+def _warm_caches():
+    from routers import blocks, requisitions, surveys
+
+    blocks.warm_cache()
+    surveys.warm_cache()
+    # Requisitions are reviewed on the central server; embedded installs
+    # may not even have the table.
+    if config.DB_BACKEND != "sqlite":
+        requisitions.warm_cache()
+
+
+WARMUP_TASKS = {
+    "migrations": _migrate,
+    "caches": _warm_caches,
+    **{f"database:{name}": _warm_database(name) for name in database.DATABASES},
+    "table_descriptors": write_engine.load_descriptors,
+    "password_hashing": _warm_password_hashing,
+}
+
+
+async def _run_task(name, task):
+    start = time.perf_counter()
+    attempts = startup.warmup.get(name, {}).get("attempts", 0) + 1
+    try:
+        await run_in_threadpool(task)
+        startup.warmup[name] = {"ok": True, "ms": startup._ms(start), "attempts": attempts}
+        return True
+    except Exception as e:
+        startup.warmup[name] = {"ok": False, "ms": startup._ms(start), "attempts": attempts, "error": str(e)}
+        return False
+
+
+async def warm_up():
+    """
+    Runs every warm-up task concurrently, retrying the failed ones with
+    backoff, and marks the worker ready once all have succeeded.
+    """
+    global _ready
+    remaining, delay = dict(WARMUP_TASKS), WARMUP_RETRY_SECONDS
+    with startup.phase("warm-up"):
+        while True:
+            names = list(remaining)
+            results = await asyncio.gather(*(_run_task(name, remaining[name]) for name in names))
+            for name, ok in zip(names, results):
+                if ok:
+                    del remaining[name]
+            if not remaining:
+                break
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WARMUP_RETRY_MAX_SECONDS)
+    _ready = True
+    startup.ready_after_ms = startup._ms(startup._origin)
+
+
+def _check_databases():
+    results = {}
+    for name in database.DATABASES:
+        start = time.perf_counter()
+        try:
+            database.ping(name)
+            results[name] = {"ok": True, "ms": round((time.perf_counter() - start) * 1000, 1)}
+        except Exception as e:
+            results[name] = {"ok": False, "error": str(e)}
+    return results
+
+
+async def check_databases():
+    """
+    Pings each database (reusing a check younger than the TTL); concurrent
+    probes share one round of pings.
+    """
+    global _last_check
+    checked_at, results = _last_check
+    if results is None or time.monotonic() - checked_at > READINESS_CHECK_TTL_SECONDS:
+        results = await flights.do(("lifecycle", "check_databases"), _check_databases)
+        _last_check = (time.monotonic(), results)
+    return results
+
+
+async def check_migrations():
+    """
+    The pending migrations; re-read (at most every TTL, shared by concurrent
+    probes) while any are pending, e.g. until a deploy step applies them.
+    """
+    if _pending_migrations == []:
+        return []
+    if _pending_migrations is None or time.monotonic() - _migrations_checked_at > READINESS_CHECK_TTL_SECONDS:
+        try:
+            return await flights.do(("lifecycle", "pending_migrations"), _pending)
+        except Exception:
+            return None
+    return _pending_migrations
+
+
+def is_warm():
+    return _ready
+
+
+def warmup_failures():
+    """{task: error} of the warm-up tasks whose last attempt failed."""
+    return {name: result["error"] for name, result in startup.warmup.items() if not result["ok"]}
+
+
+def last_database_check():
+    return _last_check[1]
@@ -0,0 +1,199 @@
+"""
+Structured, non-blocking logging.
+
+Every record is written as one JSON object per line carrying the request (or
+job) it belongs to: request_id, method, route and the databases the request
+opened, alongside any `extra=` fields. Handlers only put records on an
+in-memory queue; a listener thread formats them and writes to stdout, so the
+event loop and request threads never block on terminal or pipe I/O.
+
+RequestLogMiddleware assigns each request an id (reusing an incoming
+X-Request-ID), echoes it in the response and logs one access record with the
+status and duration. Fast successful requests are sampled at
+LOG_SUCCESS_SAMPLE_RATE; errors and slow requests are always logged.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from config import LOG_LEVEL, LOG_SLOW_REQUEST_MS, LOG_SUCCESS_SAMPLE_RATE
+
+logger = logging.getLogger("access")
+
+# Per request (or job) context; a dict so values filled in by a worker thread
+# (databases opened, time spent waiting for a connection) are visible to the
+# middleware that created it.
+_context = ContextVar("log_context", default=None)
+
+# Attributes every LogRecord has; anything else on a record came from `extra=`.
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener = None
+
+
+@contextmanager
+def context(**fields):
+    """Attaches `fields` to every record logged inside the block."""
+    token = _context.set({**(_context.get() or {}), **fields, "databases": set(), "db_wait_ms": 0.0})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def note_database(database, wait_seconds):
+    """Called by the database layer whenever a connection is handed out."""
+    current = _context.get()
+    if current is not None:
+        current["databases"].add(database)
+        current["db_wait_ms"] += wait_seconds * 1000
+
+
+def request_id():
+    current = _context.get()
+    return current.get("request_id") if current else None
+
+
+def _current_fields():
+    current = _context.get()
+    if not current:
+        return {}
+    fields = {key: value for key, value in current.items() if key not in ("databases", "db_wait_ms", "scope")}
+    scope = current.get("scope")
+    if scope is not None:
+        route = scope.get("route")
+        fields["route"] = getattr(route, "path", None) or scope["path"]
+    if current["databases"]:
+        fields["db"] = sorted(current["databases"])
+    return fields
+
+
+class _ContextFilter(logging.Filter):
+    """Runs in the thread that logs, where the context variable is visible."""
+
+    def filter(self, record):
+        for key, value in _current_fields().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class _SamplingFilter(logging.Filter):
+    """Drops records logged with extra={"sampled": True} at the configured rate."""
+
+    def filter(self, record):
+        if getattr(record, "sampled", False):
+            if LOG_SUCCESS_SAMPLE_RATE < 1 and random.random() >= LOG_SUCCESS_SAMPLE_RATE:
+                return False
+            record.sample_rate = LOG_SUCCESS_SAMPLE_RATE
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Only merge the arguments here (cheap, and they may be mutated after
+        # the call returns); JSON encoding and tracebacks wait for the listener.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key != "sampled":
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup():
+    """
+    Routes the root logger (and uvicorn's) through the queue. Idempotent; also
+    used as the initializer of job worker processes.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    records = queue.SimpleQueue()
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=False)
+    handler = _QueueHandler(records)
+    handler.addFilter(_SamplingFilter())
+    handler.addFilter(_ContextFilter())
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL)
+    for name in ("uvicorn", "uvicorn.error"):
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
+    # RequestLogMiddleware writes the access log.
+    logging.getLogger("uvicorn.access").handlers = []
+    logging.getLogger("uvicorn.access").propagate = False
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def _header(scope, name):
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")[:128]
+    return None
+
+
+class RequestLogMiddleware:
+    """Pure ASGI middleware: request ids, log context and the access log."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request_id = _header(scope, b"x-request-id") or uuid.uuid4().hex
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", request_id.encode())]
+            await send(message)
+
+        with context(request_id=request_id, method=scope["method"], scope=scope):
+            try:
+                await self.app(scope, receive, send_with_id)
+            finally:
+                duration_ms = round((time.perf_counter() - started) * 1000, 1)
+                fields = {
+                    "status": status,
+                    "path": scope["path"],
+                    "duration_ms": duration_ms,
+                    "db_wait_ms": round(_context.get()["db_wait_ms"], 1),
+                }
+                if status >= 500:
+                    logger.error("request", extra=fields)
+                elif status >= 400 or duration_ms >= LOG_SLOW_REQUEST_MS:
+                    logger.warning("request", extra=fields)
+                else:
+                    logger.info("request", extra={**fields, "sampled": True})
@@ -1,16 +1,68 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-import os
+import asyncio
+from contextlib import asynccontextmanager
 
-from routers import blocks, surveys, acquisition, acquisition_media
-from routers import processing, processing_media
-from routers import interpretation, interpretation_media
-from routers import users
-from routers import requisitions
+# Imported first: the start-up report's clock starts here.
+import lifecycle
 
-app = FastAPI()
+with lifecycle.startup.phase("import framework"):
+    from fastapi import FastAPI, Request
+    from fastapi.concurrency import run_in_threadpool
+    from fastapi.middleware.cors import CORSMiddleware
+
+    import config
+    import jobs
+    import logs
+    import requisition_pdf
+    import sync
+    from logs import RequestLogMiddleware
+    from profiling import ProfilingMiddleware
+    from admission import AdmissionMiddleware
+    from static_site import FrontendBuild
+
+logs.setup()
+
+with lifecycle.startup.phase("import routers"):
+    from routers import blocks, surveys, acquisition, acquisition_media
+    from routers import processing, processing_media
+    from routers import interpretation, interpretation_media
+    from routers import users
+    from routers import requisitions
+    from routers import jobs as jobs_router
+    from routers import ingest, extraction, qc as qc_router, fixity as fixity_router
+    from routers import system
+    from routers import sync as sync_router
+    from routers import media
+    from routers import batch as batch_router
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm pools, indexes and models in the background so the port opens
+    # (and /healthz answers) immediately; /readyz flips once this completes.
+    warm_up = asyncio.create_task(lifecycle.warm_up())
+    runner = None
+    if config.JOB_WORKERS > 0:
+        runner = jobs.JobRunner(config.JOB_WORKERS)
+        runner.start()
+    # Field installs push what they catalogued offline whenever the link is up.
+    syncing = config.DB_BACKEND == "sqlite" and bool(config.SYNC_SERVER_URL) and config.SYNC_INTERVAL_SECONDS > 0
+    if syncing:
+        sync.start_agent()
+    yield
+    warm_up.cancel()
+    if runner:
+        await run_in_threadpool(runner.stop)
+    if syncing:
+        await run_in_threadpool(sync.stop_agent)
+    requisition_pdf.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+
+# Sheds load before it reaches MySQL; added first so CORS (outermost) still
+# decorates its 429/503 responses.
+app.add_middleware(AdmissionMiddleware)
+
+# Opt-in per-request profiler; outside admission so queueing shows as wall time.
+app.add_middleware(ProfilingMiddleware)
 
 # CORS
 app.add_middleware(
@@ -21,6 +73,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost: every request, shed or not, gets an id and an access-log record.
+app.add_middleware(RequestLogMiddleware)
+
 # Register routers
 app.include_router(blocks.router)
 app.include_router(surveys.router)
@@ -32,14 +87,24 @@ app.include_router(interpretation.router)
 app.include_router(interpretation_media.router)
 app.include_router(users.router)
 app.include_router(requisitions.router)
+app.include_router(jobs_router.router)
+app.include_router(ingest.router)
+app.include_router(extraction.router)
+app.include_router(qc_router.router)
+app.include_router(fixity_router.router)
+app.include_router(media.router)
+app.include_router(sync_router.router)
+app.include_router(batch_router.router)
+app.include_router(system.router)
+app.include_router(system.probes)
 
 # ===== Serve React build =====
-from fastapi.responses import RedirectResponse
+# Registered after every router: Starlette matches routes in order, so API
+# paths never reach the catch-all and pay nothing for it.
+frontend = FrontendBuild(config.FRONTEND_BUILD_DIR)
 
-@app.get("/")
-async def root():
-    return RedirectResponse(url="https://seismic-data-cataloging-6.onrender.com/")
+@app.api_route("/{full_path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def serve_frontend(full_path: str, request: Request):
+    return frontend.response(full_path, request)
 
-@app.get("/{full_path:path}")
-async def catch_all(full_path: str):
-    return RedirectResponse(url=f"https://seismic-data-cataloging-6.onrender.com/{full_path}")
+lifecycle.startup.mark("assemble app")
@@ -0,0 +1,134 @@
+"""
+Bulk lifecycle updates of media rows.
+
+Status, QC, transcription and location columns of acquisition, processing
+and interpretation media change a shelf or a transcription run at a time.
+PATCH /<target>-media/bulk takes a selector and the new values:
+
+- ids: media ids, and/or ranges: inclusive [from, to] media id ranges.
+  Media ids are text, so ranges compare them as text ("10" sorts before
+  "9"); they suit ids of one fixed-width format. A range whose "from"
+  sorts after its "to" is rejected rather than selecting nothing.
+- rack / shelf / box: the current location (each one given must match),
+- acquisition_id / processing_id / survey_id: optional scope, applied to the
+  partition column so MySQL reads only the matching partitions.
+
+A row is selected when its id is listed or falls in a range (if any ids or
+ranges are given) and it matches every location and scope field given.
+write_engine.update_many() then applies the validated changes as one UPDATE
+per chunk of consecutive media ids.
+"""
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, model_validator
+
+import partitions
+import write_engine
+
+MAX_IDS = 10000
+MAX_RANGES = 100
+CHUNK_ROWS = 1000
+
+# Payload fields a bulk update may change, where the table has them.
+LIFECYCLE_FIELDS = (
+    "status", "dam_status", "qc_done_yes_no", "qc_done_by", "transcrp_tape_yn", "transcrp_yr",
+    "transcribed_by_wc", "copex_status", "floor_location", "rack", "shelf", "box", "Rack", "Shelf", "Box",
+)
+
+# target -> (media id column, {selector location field: column}, partitions target or None)
+TARGETS = {
+    "acquisition": ("acquisition_media_id", {"rack": "rack", "shelf": "shelf", "box": "box"}, "acquisition"),
+    "processing": ("processing_media_id", {"rack": "rack", "shelf": "shelf", "box": "box"}, "processing"),
+    "interpretation": ("integ_media_id", {"rack": "Rack", "shelf": "Shelf", "box": "Box"}, None),
+}
+
+
+class IdRange(BaseModel):
+    start: str = Field(alias="from")
+    end: str = Field(alias="to")
+
+    @model_validator(mode="after")
+    def _ordered(self):
+        if self.start.casefold() > self.end.casefold():
+            raise ValueError(
+                f"Range {self.start!r}..{self.end!r} is empty: media ids compare as text, "
+                "so give both ends in the same fixed-width format"
+            )
+        return self
+
+
+class MediaSelector(BaseModel):
+    ids: Optional[List[str]] = Field(None, max_length=MAX_IDS)
+    ranges: Optional[List[IdRange]] = Field(None, max_length=MAX_RANGES)
+    rack: Optional[str] = None
+    shelf: Optional[str] = None
+    box: Optional[str] = None
+    acquisition_id: Optional[str] = None
+    processing_id: Optional[str] = None
+    survey_id: Optional[str] = None
+
+    @model_validator(mode="after")
+    def _not_empty(self):
+        # An empty selector would update the whole table.
+        if not (self.ids or self.ranges or self.rack or self.shelf or self.box):
+            raise ValueError("Select rows by ids, ranges or rack/shelf/box")
+        return self
+
+
+class BulkUpdateRequest(BaseModel):
+    selector: MediaSelector
+    changes: dict
+    dry_run: bool = False  # only count the selected rows
+
+
+def allowed_fields(descriptor):
+    return [field for field in LIFECYCLE_FIELDS if field in descriptor.fields]
+
+
+def selector_filter(cursor, target, selector):
+    """(condition, params) selecting the rows of `target`'s media table described by `selector`."""
+    key_column, location_columns, partition_target = TARGETS[target]
+    conditions, params = [], []
+
+    matches = []
+    if selector.ids:
+        ids = sorted(set(selector.ids))
+        matches.append(f"{key_column} IN ({', '.join(['%s'] * len(ids))})")
+        params += ids
+    for id_range in selector.ranges or []:
+        matches.append(f"{key_column} BETWEEN %s AND %s")
+        params += [id_range.start, id_range.end]
+    if matches:
+        conditions.append("(" + " OR ".join(matches) + ")")
+
+    for field, column in location_columns.items():
+        value = getattr(selector, field)
+        if value is not None:
+            conditions.append(f"{column} = %s")
+            params.append(value)
+
+    parent_id = {"acquisition": selector.acquisition_id, "processing": selector.processing_id}.get(target)
+    if partition_target is not None and (parent_id is not None or selector.survey_id is not None):
+        condition, scope_params = partitions.scope_filter(cursor, partition_target, parent_id, selector.survey_id)
+        conditions.append(condition)
+        params += scope_params
+    elif selector.survey_id is not None:
+        conditions.append("survey_id = %s")
+        params.append(selector.survey_id)
+    return " AND ".join(conditions), params
+
+
+def bulk_update(target, descriptor, request):
+    """Runs one BulkUpdateRequest; returns rows matched and changed (write_engine.update_many)."""
+    conn = descriptor.connect()
+    cursor = conn.cursor()
+    try:
+        condition, params = selector_filter(cursor, target, request.selector)
+    finally:
+        cursor.close()
+        conn.close()
+    result = write_engine.update_many(
+        descriptor, request.changes, condition, params, TARGETS[target][0],
+        allowed=allowed_fields(descriptor), chunk_rows=CHUNK_ROWS, dry_run=request.dry_run,
+    )
+    return {**result, "dry_run": request.dry_run}
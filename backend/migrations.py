@@ -0,0 +1,601 @@
+"""
+Schema migrations for the tables this backend creates itself.
+
+Each migration targets one of the three databases and is applied at most once;
+applied ids are recorded in a schema_migrations table in that database.
+A migration is either a list of SQL statements or a `run(conn)` callable for
+data backfills.
+
+The code expects every migration to be applied (GET /requisitions/, for one,
+reads the 0006 child tables), and /readyz reports 503 until none are
+pending. Deploys run this module as a separate step, since some migrations
+rebuild large tables; with MIGRATE_ON_STARTUP=1 API workers apply them
+while warming up instead. Either way the run holds the MySQL named lock
+MIGRATION_LOCK, so concurrent workers and manual runs apply each migration
+once.
+
+Usage: python migrations.py          apply pending migrations
+       python migrations.py --list   show applied/pending state
+"""
+import json
+import sys
+
+import dedup
+import integrity
+import partitions
+import qc
+import versions
+from config import MIGRATION_LOCK_TIMEOUT_SECONDS
+from database import get_field_data_conn, get_processing_data_conn, get_interpretation_data_conn
+
+MIGRATION_LOCK = "schema_migrations"
+
+_MEDIA_QC_RESULTS = """
+CREATE TABLE IF NOT EXISTS media_qc_results (
+    media_table VARCHAR(64) NOT NULL,
+    media_id VARCHAR(100) NOT NULL,
+    file_name VARCHAR(1024) NULL,
+    flagged TINYINT(1) NOT NULL DEFAULT 0,
+    summary_json LONGTEXT NOT NULL,
+    checked_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (media_table, media_id),
+    INDEX idx_media_qc_flagged (media_table, flagged)
+)
+"""
+
+_LEGACY_MIGRATION_CHECKPOINTS = """
+CREATE TABLE IF NOT EXISTS legacy_migration_checkpoints (
+    run_name VARCHAR(100) NOT NULL,
+    source VARCHAR(255) NOT NULL,
+    target_table VARCHAR(64) NOT NULL,
+    rows_read BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    rows_loaded BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    rows_duplicate BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    rows_rejected BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    target_rows_before BIGINT UNSIGNED NULL,
+    completed TINYINT(1) NOT NULL DEFAULT 0,
+    started_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (run_name, source)
+)
+"""
+
+def _requisition_children_json(cursor, batch_size=1000):
+    """Yields (id, dataTypes, slNoData) from the JSON columns of every requisition, a batch at a time."""
+    last_id = 0
+    while True:
+        cursor.execute(
+            "SELECT id, data_types_json, sl_no_data_json FROM requisition_forms "
+            "WHERE id > %s ORDER BY id LIMIT %s",
+            (last_id, batch_size),
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        for requisition_id, data_types_json, sl_no_data_json in rows:
+            yield (
+                requisition_id,
+                json.loads(data_types_json) if data_types_json else [],
+                json.loads(sl_no_data_json) if sl_no_data_json else [],
+            )
+        last_id = rows[-1][0]
+
+
+def _has_index(cursor, table, name):
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+        (table, name),
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def _column_type(cursor, table, column):
+    cursor.execute(
+        "SELECT DATA_TYPE FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+        (table, column),
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _index_and_backfill_requisition_children(conn):
+    """
+    Indexes requisition_forms by status and backfills the child tables.
+    DDL commits at once, so the index is only added if an earlier, failed
+    attempt has not already added it.
+    """
+    cursor = conn.cursor()
+    try:
+        if not _has_index(cursor, "requisition_forms", "idx_requisition_forms_status"):
+            cursor.execute(
+                "ALTER TABLE requisition_forms "
+                "ADD INDEX idx_requisition_forms_status (current_approval_status, created_at)"
+            )
+    finally:
+        cursor.close()
+    _backfill_requisition_children(conn)
+
+
+def _backfill_requisition_children(conn):
+    """Copies the dataTypes/slNoData JSON of existing requisitions into the child tables."""
+    from routers.requisitions import write_requisition_children
+
+    cursor = conn.cursor()
+    try:
+        for requisition_id, data_types, sl_no_data in _requisition_children_json(cursor):
+            write_requisition_children(cursor, requisition_id, data_types, sl_no_data, ignore=True)
+    finally:
+        cursor.close()
+
+
+# (JSON list, keys, length) of the child columns 0006 created as VARCHAR.
+_NARROW_CHILD_COLUMNS = (
+    (1, ("typeOfData", "dataObserver"), 255),
+    (2, ("designation",), 255),
+    (2, ("mobileNo",), 32),
+)
+
+
+def _widen_requisition_children(conn):
+    """
+    Widens the 0006 child columns to TEXT, then repairs truncated rows. The
+    ALTERs commit at once, so each is skipped if a failed attempt made it.
+    """
+    cursor = conn.cursor()
+    try:
+        if _column_type(cursor, "requisition_data_types", "type_of_data") != "text":
+            cursor.execute(
+                """
+                ALTER TABLE requisition_data_types
+                    DROP INDEX idx_requisition_data_types_type,
+                    DROP INDEX idx_requisition_data_types_observer,
+                    MODIFY type_of_data TEXT NULL,
+                    MODIFY data_observer TEXT NULL,
+                    ADD INDEX idx_requisition_data_types_type (type_of_data(255), requisition_id),
+                    ADD INDEX idx_requisition_data_types_observer (data_observer(255), requisition_id)
+                """
+            )
+        if _column_type(cursor, "requisition_sl_no_data", "mobile_no") != "text":
+            cursor.execute(
+                """
+                ALTER TABLE requisition_sl_no_data
+                    MODIFY mobile_no TEXT NULL,
+                    MODIFY designation TEXT NULL
+                """
+            )
+    finally:
+        cursor.close()
+    _repair_truncated_requisition_children(conn)
+
+
+def _repair_truncated_requisition_children(conn):
+    """Rewrites, from the JSON columns, the child rows of requisitions with values 0006 truncated."""
+    from routers.requisitions import write_requisition_children
+
+    cursor = conn.cursor()
+    try:
+        for entry in _requisition_children_json(cursor):
+            truncated = any(
+                len(str(item.get(key) or "")) > length
+                for index, keys, length in _NARROW_CHILD_COLUMNS
+                for item in entry[index] for key in keys
+            )
+            if not truncated:
+                continue
+            requisition_id, data_types, sl_no_data = entry
+            cursor.execute("DELETE FROM requisition_data_types WHERE requisition_id = %s", (requisition_id,))
+            cursor.execute("DELETE FROM requisition_sl_no_data WHERE requisition_id = %s", (requisition_id,))
+            write_requisition_children(cursor, requisition_id, data_types, sl_no_data)
+    finally:
+        cursor.close()
+
+
+def _rebuild_media_identifier_index(conn):
+    """Re-reads the media tables into media_identifier_index (its own connection; the ALTER has committed)."""
+    dedup.rebuild_index()
+
+
+CONNECTORS = {
+    "field_data": get_field_data_conn,
+    "processing_data": get_processing_data_conn,
+    "interpretation_data": get_interpretation_data_conn,
+}
+
+MIGRATIONS = [
+    {
+        "id": "0001_jobs",
+        "database": "field_data",
+        "statements": [
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+                kind VARCHAR(64) NOT NULL,
+                params_json LONGTEXT NOT NULL,
+                status VARCHAR(16) NOT NULL DEFAULT 'queued',
+                progress DOUBLE NOT NULL DEFAULT 0,
+                progress_message VARCHAR(255) NULL,
+                result_json LONGTEXT NULL,
+                result_path VARCHAR(1024) NULL,
+                error TEXT NULL,
+                cancel_requested TINYINT(1) NOT NULL DEFAULT 0,
+                submitted_by VARCHAR(64) NULL,
+                worker VARCHAR(128) NULL,
+                created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                started_at DATETIME NULL,
+                finished_at DATETIME NULL,
+                heartbeat_at DATETIME NULL,
+                INDEX idx_jobs_status_id (status, id),
+                INDEX idx_jobs_kind_created (kind, created_at)
+            )
+            """,
+        ],
+    },
+    {
+        "id": "0002_media_qc_results",
+        "database": "field_data",
+        "statements": [_MEDIA_QC_RESULTS],
+    },
+    {
+        "id": "0002_media_qc_results",
+        "database": "processing_data",
+        "statements": [_MEDIA_QC_RESULTS],
+    },
+    {
+        "id": "0003_file_fixity",
+        "database": "field_data",
+        "statements": [
+            """
+            CREATE TABLE IF NOT EXISTS file_fixity (
+                path VARCHAR(700) NOT NULL PRIMARY KEY,
+                source VARCHAR(64) NOT NULL,
+                record_id VARCHAR(100) NULL,
+                size BIGINT UNSIGNED NULL,
+                mtime BIGINT NULL,
+                algorithm VARCHAR(16) NOT NULL,
+                checksum CHAR(128) NULL,
+                status VARCHAR(16) NOT NULL,
+                error VARCHAR(1000) NULL,
+                last_checked_at DATETIME NOT NULL,
+                last_verified_at DATETIME NULL,
+                INDEX idx_file_fixity_status (status, path)
+            )
+            """,
+        ],
+    },
+    {
+        "id": "0004_survey_footprints",
+        "database": "field_data",
+        "statements": [
+            """
+            CREATE TABLE IF NOT EXISTS survey_footprints (
+                kind VARCHAR(16) NOT NULL,
+                ref_id VARCHAR(100) NOT NULL,
+                survey_id VARCHAR(100) NOT NULL,
+                min_x DOUBLE NOT NULL,
+                min_y DOUBLE NOT NULL,
+                max_x DOUBLE NOT NULL,
+                max_y DOUBLE NOT NULL,
+                point_count BIGINT UNSIGNED NOT NULL,
+                file_count INT UNSIGNED NOT NULL,
+                hull_json LONGTEXT NOT NULL,
+                footprint POLYGON NOT NULL SRID 0,
+                updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (kind, ref_id),
+                INDEX idx_survey_footprints_survey (survey_id),
+                SPATIAL INDEX idx_survey_footprints_footprint (footprint)
+            )
+            """,
+        ],
+    },
+    {
+        "id": "0005_legacy_migration_checkpoints",
+        "database": "field_data",
+        "statements": [_LEGACY_MIGRATION_CHECKPOINTS],
+    },
+    {
+        "id": "0005_legacy_migration_checkpoints",
+        "database": "processing_data",
+        "statements": [_LEGACY_MIGRATION_CHECKPOINTS],
+    },
+    {
+        "id": "0005_legacy_migration_checkpoints",
+        "database": "interpretation_data",
+        "statements": [_LEGACY_MIGRATION_CHECKPOINTS],
+    },
+    {
+        "id": "0006_requisition_children",
+        "database": "field_data",
+        "statements": [
+            """
+            CREATE TABLE IF NOT EXISTS requisition_data_types (
+                requisition_id INT NOT NULL,
+                position SMALLINT UNSIGNED NOT NULL,
+                sl_no INT NULL,
+                type_of_data VARCHAR(255) NULL,
+                sl_no_required TEXT NULL,
+                data_observer VARCHAR(255) NULL,
+                project_objective TEXT NULL,
+                remarks TEXT NULL,
+                PRIMARY KEY (requisition_id, position),
+                INDEX idx_requisition_data_types_type (type_of_data, requisition_id),
+                INDEX idx_requisition_data_types_observer (data_observer, requisition_id)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS requisition_sl_no_data (
+                requisition_id INT NOT NULL,
+                position SMALLINT UNSIGNED NOT NULL,
+                sl_no INT NULL,
+                description TEXT NULL,
+                mobile_no VARCHAR(32) NULL,
+                designation VARCHAR(255) NULL,
+                PRIMARY KEY (requisition_id, position)
+            )
+            """,
+        ],
+        "run": _index_and_backfill_requisition_children,
+    },
+    {
+        # Partitioned the media tables by parent id; superseded by 0012 and
+        # now empty, so new installs rebuild them once. Installs that applied
+        # it are repartitioned by 0012.
+        "id": "0007_partition_media_tables",
+        "database": "field_data",
+        "statements": [],
+    },
+    {
+        "id": "0007_partition_media_tables",
+        "database": "processing_data",
+        "statements": [],
+    },
+    {
+        "id": "0008_requisition_archive",
+        "database": "field_data",
+        "statements": [
+            """
+            CREATE TABLE IF NOT EXISTS requisition_forms_archive (
+                id INT NOT NULL PRIMARY KEY,
+                requester_user_id VARCHAR(255) NULL,
+                current_approval_status VARCHAR(50) NOT NULL,
+                l2_approver_id VARCHAR(255) NULL,
+                l3_approver_id VARCHAR(255) NULL,
+                created_at DATETIME NULL,
+                finalized_at DATETIME NULL,
+                archived_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                payload LONGBLOB NOT NULL,
+                INDEX idx_requisition_archive_status (current_approval_status, created_at),
+                INDEX idx_requisition_archive_requester (requester_user_id, created_at),
+                INDEX idx_requisition_archive_l2 (l2_approver_id),
+                INDEX idx_requisition_archive_l3 (l3_approver_id)
+            )
+            """,
+        ],
+    },
+    {
+        "id": "0009_media_identifier_index",
+        "database": "field_data",
+        "statements": [
+            """
+            CREATE TABLE IF NOT EXISTS media_identifier_index (
+                key_hash BIGINT UNSIGNED NOT NULL,
+                normalized VARCHAR(255) NOT NULL,
+                source VARCHAR(16) NOT NULL,
+                media_id VARCHAR(255) NOT NULL,
+                parent_id VARCHAR(255) NOT NULL DEFAULT '',
+                id_column VARCHAR(32) NOT NULL,
+                raw_value VARCHAR(255) NOT NULL,
+                PRIMARY KEY (key_hash, source, media_id, parent_id, id_column),
+                INDEX idx_media_identifier_media (source, media_id)
+            )
+            """,
+        ],
+    },
+    {
+        "id": "0010_latest_versions",
+        "database": "processing_data",
+        "statements": [
+            """
+            CREATE TABLE IF NOT EXISTS processing_latest (
+                survey_id VARCHAR(255) NOT NULL,
+                processing_id VARCHAR(255) NOT NULL,
+                version VARCHAR(255) NULL,
+                version_sort VARCHAR(255) NOT NULL,
+                PRIMARY KEY (survey_id, processing_id)
+            )
+            """,
+        ],
+        "run": versions.migration("processing"),
+    },
+    {
+        "id": "0010_latest_versions",
+        "database": "interpretation_data",
+        "statements": [
+            """
+            CREATE TABLE IF NOT EXISTS interpretation_latest (
+                survey_id VARCHAR(255) NOT NULL,
+                version VARCHAR(255) NULL,
+                version_sort VARCHAR(255) NOT NULL,
+                PRIMARY KEY (survey_id)
+            )
+            """,
+        ],
+        "run": versions.migration("interpretation"),
+    },
+    {
+        "id": "0011_integrity_watermarks",
+        "database": "field_data",
+        "statements": [
+            """
+            CREATE TABLE IF NOT EXISTS integrity_watermarks (
+                relation VARCHAR(64) NOT NULL PRIMARY KEY,
+                watermark DATETIME NOT NULL,
+                checked_at DATETIME NOT NULL,
+                incremental TINYINT(1) NOT NULL,
+                checked_rows BIGINT UNSIGNED NOT NULL,
+                orphan_rows BIGINT UNSIGNED NOT NULL,
+                dangling_keys BIGINT UNSIGNED NOT NULL,
+                unlinked_rows BIGINT UNSIGNED NOT NULL
+            )
+            """,
+        ],
+        "run": integrity.add_modified_columns("field_data"),
+    },
+    {
+        "id": "0011_integrity_watermarks",
+        "database": "processing_data",
+        "run": integrity.add_modified_columns("processing_data"),
+    },
+    {
+        "id": "0011_integrity_watermarks",
+        "database": "interpretation_data",
+        "run": integrity.add_modified_columns("interpretation_data"),
+    },
+    {
+        # By survey_id: partitions by the parent id (0007 on older installs)
+        # are not pruned by survey reads.
+        "id": "0012_partition_media_by_survey",
+        "database": "field_data",
+        "run": partitions.partition_media_table("acquisition"),
+    },
+    {
+        "id": "0012_partition_media_by_survey",
+        "database": "processing_data",
+        "run": partitions.partition_media_table("processing"),
+    },
+    {
+        # Media ids repeat across parents; 0009 keyed rows without the parent,
+        # so a rebuild recovers the rows INSERT IGNORE dropped.
+        "id": "0013_media_identifier_parent",
+        "database": "field_data",
+        "statements": [
+            "UPDATE media_identifier_index SET parent_id = '' WHERE parent_id IS NULL",
+            """
+            ALTER TABLE media_identifier_index
+                MODIFY parent_id VARCHAR(255) NOT NULL DEFAULT '',
+                DROP PRIMARY KEY,
+                ADD PRIMARY KEY (key_hash, source, media_id, parent_id, id_column)
+            """,
+        ],
+        "run": _rebuild_media_identifier_index,
+    },
+    {
+        # The forms put no length limit on these fields; over-long values
+        # failed the insert or were truncated by the 0006 backfill.
+        "id": "0014_requisition_children_text",
+        "database": "field_data",
+        "run": _widen_requisition_children,
+    },
+    {
+        # Media ids repeat across parents; results keyed by media id alone
+        # overwrote each other.
+        "id": "0015_media_qc_results_parent",
+        "database": "field_data",
+        "run": qc.add_result_parent("acquisition"),
+    },
+    {
+        "id": "0015_media_qc_results_parent",
+        "database": "processing_data",
+        "run": qc.add_result_parent("processing"),
+    },
+    {
+        # Fences a requeued job's earlier runner (see jobs.py).
+        "id": "0016_jobs_attempt",
+        "database": "field_data",
+        "statements": ["ALTER TABLE jobs ADD COLUMN attempt INT UNSIGNED NOT NULL DEFAULT 0"],
+    },
+]
+
+
+def _ensure_migrations_table(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            id VARCHAR(100) NOT NULL PRIMARY KEY,
+            applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+
+def applied_ids(database):
+    conn = CONNECTORS[database]()
+    cursor = conn.cursor()
+    try:
+        _ensure_migrations_table(cursor)
+        cursor.execute("SELECT id FROM schema_migrations")
+        return {row[0] for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def pending():
+    """(id, database) of the migrations not yet applied, in order."""
+    applied = {database: applied_ids(database) for database in CONNECTORS}
+    return [
+        (migration["id"], migration["database"])
+        for migration in MIGRATIONS if migration["id"] not in applied[migration["database"]]
+    ]
+
+
+def apply_migrations(verbose=True, lock_timeout=MIGRATION_LOCK_TIMEOUT_SECONDS):
+    """
+    Applies pending migrations in order, holding MIGRATION_LOCK (waiting up to
+    `lock_timeout` seconds for another run to finish). Returns the ids applied.
+    """
+    lock_conn = get_field_data_conn()
+    lock_cursor = lock_conn.cursor()
+    try:
+        lock_cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, lock_timeout))
+        if not lock_cursor.fetchone()[0]:
+            raise RuntimeError(f"Another migration run held {MIGRATION_LOCK!r} for over {lock_timeout} s")
+        try:
+            # Read under the lock: a run we waited for may have applied them.
+            return _apply_pending(verbose)
+        finally:
+            lock_cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+            lock_cursor.fetchall()
+    finally:
+        lock_cursor.close()
+        lock_conn.close()
+
+
+def _apply_pending(verbose):
+    applied = {database: applied_ids(database) for database in CONNECTORS}
+    done = []
+    for migration in MIGRATIONS:
+        database = migration["database"]
+        if migration["id"] in applied[database]:
+            continue
+        conn = CONNECTORS[database]()
+        cursor = conn.cursor()
+        try:
+            for statement in migration.get("statements", []):
+                cursor.execute(statement)
+            if "run" in migration:
+                migration["run"](conn)
+            cursor.execute("INSERT INTO schema_migrations (id) VALUES (%s)", (migration["id"],))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+        done.append(migration["id"])
+        if verbose:
+            print(f"Applied {migration['id']} on {database}")
+    return done
+
+
+if __name__ == "__main__":
+    if "--list" in sys.argv:
+        waiting = set(pending())
+        for migration in MIGRATIONS:
+            state = "pending" if (migration["id"], migration["database"]) in waiting else "applied"
+            print(f"{migration['id']:<40} {migration['database']:<20} {state}")
+    else:
+        if not apply_migrations():
+            print("Nothing to apply.")
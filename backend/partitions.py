@@ -0,0 +1,225 @@
+"""
+Partitioning of the media catalog tables.
+
+acquisition_media_data and processing_media_data hold one row per cartridge
+or file. Reads are scoped by survey (counts, listings, QC, bulk updates) or
+by one acquisition / processing id, so both tables carry a denormalised
+survey_id (their parent's survey, '' while the parent is unknown) and are
+partitioned by KEY on it: every media row of a survey lives in one partition,
+and MySQL prunes KEY partitions on an equality with the partition column.
+Partitioning on the parent id would not help survey reads: a survey's parent
+ids, as an IN list, hash to nearly every partition.
+
+survey_id is maintained by triggers, so no writer has to set it: a media row
+takes its parent's survey on insert (and when its parent id changes), and a
+parent inserted or moved to another survey carries its media rows along.
+`scope_filter()` always constrains survey_id, resolving it from the parent id
+when only that is given.
+
+With DB_BACKEND=sqlite there are no partitions or triggers; scoped reads
+filter on the parent ids instead.
+"""
+from config import DB_BACKEND
+from database import get_field_data_conn, get_processing_data_conn
+
+MEDIA_PARTITIONS = 32
+PARTITION_COLUMN = "survey_id"
+
+# target -> (connection getter, media table, parent id column, parent table)
+MEDIA_TABLES = {
+    "acquisition": (get_field_data_conn, "acquisition_media_data", "acquisition_id", "acquisition_data"),
+    "processing": (get_processing_data_conn, "processing_media_data", "processing_id", "processing_data"),
+}
+
+
+def survey_parent_ids(cursor, target, survey_id):
+    """The acquisition or processing ids of a survey (parent tables share the media table's database)."""
+    _, _, column, parent_table = MEDIA_TABLES[target]
+    cursor.execute(f"SELECT {column} FROM {parent_table} WHERE survey_id = %s", (survey_id,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def parent_survey(cursor, target, parent_id):
+    """The survey_id media rows of `parent_id` carry: the parent's survey, or '' if there is none."""
+    _, _, column, parent_table = MEDIA_TABLES[target]
+    cursor.execute(f"SELECT survey_id FROM {parent_table} WHERE {column} = %s LIMIT 1", (parent_id,))
+    row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return ""
+    return row[0]
+
+
+def parent_filter(column, parent_ids):
+    """A `column IN (...)` condition and its parameters; never matches for no ids."""
+    if not parent_ids:
+        return "FALSE", []
+    return f"{column} IN ({', '.join(['%s'] * len(parent_ids))})", list(parent_ids)
+
+
+def scope_filter(cursor, target, parent_id=None, survey_id=None, alias=""):
+    """
+    (condition, params) restricting the media table of `target` (qualified by
+    `alias` in joins) to one parent id and/or survey. The condition always
+    pins the partition column, so MySQL reads one partition.
+    """
+    column = MEDIA_TABLES[target][2]
+    prefix = f"{alias}." if alias else ""
+    if parent_id is None and survey_id is None:
+        return "TRUE", []
+    if DB_BACKEND == "sqlite":
+        if survey_id is None:
+            return f"{prefix}{column} = %s", [parent_id]
+        parent_ids = survey_parent_ids(cursor, target, survey_id)
+        if parent_id is not None:
+            parent_ids = [value for value in parent_ids if str(value) == str(parent_id)]
+        return parent_filter(f"{prefix}{column}", parent_ids)
+    if parent_id is None:
+        return f"{prefix}{PARTITION_COLUMN} = %s", [survey_id]
+    if survey_id is None:
+        survey_id = parent_survey(cursor, target, parent_id)
+    return f"{prefix}{PARTITION_COLUMN} = %s AND {prefix}{column} = %s", [survey_id, parent_id]
+
+
+def row_filter(target, survey_id, parent_id, alias=""):
+    """
+    (condition, params) for the media rows of one parent of a known survey,
+    without a lookup; the condition's text depends only on `target` and
+    `alias`, so it can serve a whole executemany.
+    """
+    column = MEDIA_TABLES[target][2]
+    prefix = f"{alias}." if alias else ""
+    if DB_BACKEND == "sqlite":
+        return f"{prefix}{column} = %s", [parent_id]
+    return f"{prefix}{PARTITION_COLUMN} = %s AND {prefix}{column} = %s", [survey_id, parent_id]
+
+
+def partition_expression(cursor, table):
+    """The partitioning expression of `table` (e.g. '`survey_id`'), or None if it is not partitioned."""
+    cursor.execute(
+        "SELECT PARTITION_EXPRESSION FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL LIMIT 1",
+        (table,),
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return row[0].decode() if isinstance(row[0], (bytes, bytearray)) else row[0]
+
+
+def _indexes(cursor, table):
+    """{index name: (unique, [columns in order])}."""
+    cursor.execute(
+        "SELECT INDEX_NAME, NON_UNIQUE, COLUMN_NAME FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY INDEX_NAME, SEQ_IN_INDEX",
+        (table,),
+    )
+    indexes = {}
+    for name, non_unique, column in cursor.fetchall():
+        indexes.setdefault(name, (not non_unique, []))[1].append(column)
+    return indexes
+
+
+def _has_column(cursor, table, column):
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+        (table, column),
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def partition_alter_sql(cursor, table, column, partitions=MEDIA_PARTITIONS):
+    """
+    The ALTER TABLE that (re)partitions `table` by KEY(`column`), or None if
+    it already is. MySQL requires every unique key to contain the partition
+    column, so such keys are widened; survey_id follows from the parent id,
+    so a widened key that already holds the parent id is no weaker.
+    """
+    if partition_expression(cursor, table) == f"`{column}`":
+        return None
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.KEY_COLUMN_USAGE "
+        "WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL "
+        "AND (TABLE_NAME = %s OR REFERENCED_TABLE_NAME = %s)",
+        (table, table),
+    )
+    if cursor.fetchone()[0]:
+        raise RuntimeError(f"{table} has foreign keys, which partitioned InnoDB tables cannot have")
+
+    changes = []
+    for name, (unique, columns) in _indexes(cursor, table).items():
+        if not unique or column in columns:
+            continue
+        widened = ", ".join(f"`{key}`" for key in [*columns, column])
+        if name == "PRIMARY":
+            changes += ["DROP PRIMARY KEY", f"ADD PRIMARY KEY ({widened})"]
+        else:
+            changes += [f"DROP INDEX `{name}`", f"ADD UNIQUE INDEX `{name}` ({widened})"]
+    # One statement, so the table is rebuilt once.
+    return f"ALTER TABLE {table} {', '.join(changes)}{' ' if changes else ''}PARTITION BY KEY (`{column}`) PARTITIONS {partitions}"
+
+
+def _survey_of(parent_table, column, parent_ref):
+    return f"COALESCE((SELECT survey_id FROM {parent_table} WHERE {column} = {parent_ref} LIMIT 1), '')"
+
+
+def trigger_sql(target):
+    """The CREATE TRIGGER statements keeping the media table's survey_id in step with its parent."""
+    _, table, column, parent_table = MEDIA_TABLES[target]
+    return [
+        f"CREATE TRIGGER {table}_survey_insert BEFORE INSERT ON {table} FOR EACH ROW "
+        f"SET NEW.{PARTITION_COLUMN} = {_survey_of(parent_table, column, f'NEW.{column}')}",
+        f"CREATE TRIGGER {table}_survey_update BEFORE UPDATE ON {table} FOR EACH ROW "
+        f"BEGIN IF NOT (NEW.{column} <=> OLD.{column}) THEN "
+        f"SET NEW.{PARTITION_COLUMN} = {_survey_of(parent_table, column, f'NEW.{column}')}; END IF; END",
+        f"CREATE TRIGGER {parent_table}_media_survey_insert AFTER INSERT ON {parent_table} FOR EACH ROW "
+        f"UPDATE {table} SET {PARTITION_COLUMN} = COALESCE(NEW.survey_id, '') "
+        f"WHERE {PARTITION_COLUMN} = '' AND {column} = NEW.{column}",
+        f"CREATE TRIGGER {parent_table}_media_survey_update AFTER UPDATE ON {parent_table} FOR EACH ROW "
+        f"BEGIN IF NOT (NEW.survey_id <=> OLD.survey_id AND NEW.{column} <=> OLD.{column}) THEN "
+        f"UPDATE {table} SET {PARTITION_COLUMN} = COALESCE(NEW.survey_id, '') WHERE {column} = NEW.{column}; "
+        f"END IF; END",
+    ]
+
+
+def _trigger_names(target):
+    _, table, _, parent_table = MEDIA_TABLES[target]
+    return [
+        f"{table}_survey_insert", f"{table}_survey_update",
+        f"{parent_table}_media_survey_insert", f"{parent_table}_media_survey_update",
+    ]
+
+
+def partition_media_table(target):
+    """
+    A migration `run` callable adding survey_id to one media table, creating
+    its triggers, backfilling it and partitioning the table by it. Safe to run
+    again, e.g. on a table an earlier release partitioned by the parent id.
+    """
+    _, table, column, parent_table = MEDIA_TABLES[target]
+
+    def run(conn):
+        cursor = conn.cursor()
+        try:
+            if not _has_column(cursor, table, PARTITION_COLUMN):
+                cursor.execute(
+                    f"ALTER TABLE {table} ADD COLUMN {PARTITION_COLUMN} VARCHAR(255) NOT NULL DEFAULT '', "
+                    f"ADD INDEX idx_{table}_survey ({PARTITION_COLUMN}, {column})"
+                )
+            # Triggers first: rows written during the backfill get their survey too.
+            for name in _trigger_names(target):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            for statement in trigger_sql(target):
+                cursor.execute(statement)
+            cursor.execute(
+                f"UPDATE {table} m "
+                f"JOIN (SELECT {column}, MAX(survey_id) AS survey_id FROM {parent_table} GROUP BY {column}) p "
+                f"ON p.{column} = m.{column} "
+                f"SET m.{PARTITION_COLUMN} = COALESCE(p.survey_id, '') WHERE m.{PARTITION_COLUMN} = ''"
+            )
+            sql = partition_alter_sql(cursor, table, PARTITION_COLUMN)
+            if sql:
+                cursor.execute(sql)
+        finally:
+            cursor.close()
+    return run
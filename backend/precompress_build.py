@@ -0,0 +1,60 @@
+"""
+Writes .gz (and, when the brotli package is installed, .br) siblings for the
+compressible files of a React production build so the backend can serve them
+without compressing on every request.
+
+Usage: python precompress_build.py [BUILD_DIR]
+
+The frontend's `postbuild` npm script runs this automatically.
+"""
+import gzip
+import os
+import sys
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip alone still covers every browser
+    brotli = None
+
+from config import FRONTEND_BUILD_DIR
+
+COMPRESSIBLE_EXTENSIONS = {".html", ".js", ".css", ".json", ".map", ".txt", ".svg", ".ico"}
+MIN_SIZE = 1024
+# Only keep a variant if it saves at least this fraction of the original size.
+MIN_SAVING = 0.05
+
+
+def _write_if_smaller(path, original_size, data):
+    if len(data) > original_size * (1 - MIN_SAVING):
+        if os.path.exists(path):
+            os.remove(path)
+        return False
+    with open(path, "wb") as f:
+        f.write(data)
+    return True
+
+
+def precompress(directory):
+    written = 0
+    for root, _dirs, files in os.walk(directory):
+        for name in files:
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            if len(data) < MIN_SIZE:
+                continue
+            # mtime=0 keeps the output byte-identical across rebuilds.
+            written += _write_if_smaller(path + ".gz", len(data), gzip.compress(data, 9, mtime=0))
+            if brotli is not None:
+                written += _write_if_smaller(path + ".br", len(data), brotli.compress(data, quality=11))
+    return written
+
+
+if __name__ == "__main__":
+    build_dir = sys.argv[1] if len(sys.argv) > 1 else FRONTEND_BUILD_DIR
+    count = precompress(build_dir)
+    print(f"Wrote {count} precompressed files under {build_dir}")
+    if brotli is None:
+        print("brotli is not installed; only gzip variants were written.")
@@ -0,0 +1,275 @@
+"""
+Opt-in sampling profiler for single requests.
+
+A request carrying `X-Profile: <PROFILING_TOKEN>` is profiled: a sampler
+thread snapshots the stacks of the threads working on it every
+PROFILE_SAMPLE_INTERVAL_MS and the report is written under PROFILES_DIR. The
+response carries its id in `X-Profile-Id`; GET /system/profiles/{id} returns
+it. Without the header the only cost is a scan of the request headers.
+
+Reports contain:
+- phases: exact wall time of instrumented phases (connection wait, queries and
+  row mapping in handlers that mark them with `phase()`),
+- sampled_phases: every sample classified as db, validation, encoding or the
+  innermost marked phase, so framework work shows up without instrumentation,
+- call_tree and collapsed stacks (flamegraph.pl / speedscope input).
+
+Sampled threads are the event loop thread plus any thread that entered a
+phase or opened a database connection for the request. Other requests served
+concurrently by the same worker can leak samples into the loop thread's share.
+"""
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import logs
+from config import PROFILE_KEEP, PROFILE_SAMPLE_INTERVAL_MS, PROFILES_DIR, PROFILING_TOKEN
+
+_active = ContextVar("profile", default=None)
+
+# (phase, predicate on (module, function)) tried from the innermost frame
+# outwards; the first frame that matches classifies the sample.
+PHASE_RULES = [
+    ("db", lambda module, function: module.startswith(("mysql.connector", "_mysql_connector"))),
+    ("validation", lambda module, function: module.startswith("pydantic") or module == "fastapi._compat"),
+    ("encoding", lambda module, function: module in ("fastapi.encoders", "json", "json.encoder", "starlette.responses")),
+]
+# Innermost frames of a thread that is waiting rather than working.
+IDLE_FRAMES = {("selectors", "select"), ("threading", "wait"), ("queue", "get"), ("asyncio.base_events", "_run_once")}
+MAX_STACK_DEPTH = 128
+MIN_TREE_SHARE = 0.01
+
+
+def authorized(token):
+    return bool(PROFILING_TOKEN) and token is not None and hmac.compare_digest(token, PROFILING_TOKEN)
+
+
+class Profile:
+    def __init__(self, method, path):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.threads = {threading.get_ident()}
+        self.labels = {}  # thread id -> stack of open phase names
+        self.phases = Counter()  # name -> seconds
+        self.stacks = Counter()  # tuple of frames -> samples
+        self.categories = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name=f"profiler-{self.id[:8]}", daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+        self.duration = time.perf_counter() - self.started
+
+    def _run(self):
+        interval = PROFILE_SAMPLE_INTERVAL_MS / 1000
+        while not self._stop.wait(interval):
+            frames = sys._current_frames()
+            for thread_id in list(self.threads):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self._sample(thread_id, frame)
+
+    def _sample(self, thread_id, frame):
+        stack = []
+        while frame is not None and len(stack) < MAX_STACK_DEPTH:
+            stack.append((frame.f_globals.get("__name__", "?"), frame.f_code.co_name))
+            frame = frame.f_back
+        if not stack or stack[0] in IDLE_FRAMES:
+            return
+        self.samples += 1
+        self.stacks[tuple(reversed(stack))] += 1
+        self.categories[self._classify(thread_id, stack)] += 1
+
+    def _classify(self, thread_id, stack):
+        for module, function in stack:
+            for name, matches in PHASE_RULES:
+                if matches(module, function):
+                    return name
+        labels = self.labels.get(thread_id)
+        return labels[-1] if labels else "handler"
+
+    def report(self, status, request_id=None, route=None):
+        collapsed = {
+            ";".join(f"{module}:{function}" for module, function in stack): count
+            for stack, count in self.stacks.most_common()
+        }
+        return {
+            "id": self.id,
+            "request_id": request_id,
+            "method": self.method,
+            "path": self.path,
+            "route": route,
+            "status": status,
+            "duration_ms": round(self.duration * 1000, 1),
+            "interval_ms": PROFILE_SAMPLE_INTERVAL_MS,
+            "samples": self.samples,
+            "phases": {name: {"ms": round(seconds * 1000, 1)} for name, seconds in self.phases.most_common()},
+            "sampled_phases": {
+                # Estimated from the sample share: the sampler needs the GIL, so
+                # under load it ticks less often than the nominal interval.
+                name: {"samples": count, "share": round(count / self.samples, 4), "ms": round(count / self.samples * self.duration * 1000, 1)}
+                for name, count in self.categories.most_common()
+            },
+            "call_tree": _call_tree(self.stacks, self.samples),
+            "collapsed": [f"{stack} {count}" for stack, count in collapsed.items()],
+        }
+
+
+def _call_tree(stacks, total):
+    root = {"name": "all", "samples": total, "children": {}}
+    for stack, count in stacks.items():
+        node = root
+        for module, function in stack:
+            node = node["children"].setdefault(
+                f"{module}:{function}", {"name": f"{module}:{function}", "samples": 0, "children": {}}
+            )
+            node["samples"] += count
+
+    def prune(node):
+        children = [
+            prune(child) for child in sorted(node["children"].values(), key=lambda child: -child["samples"])
+            if child["samples"] >= total * MIN_TREE_SHARE
+        ]
+        return {"name": node["name"], "samples": node["samples"], "children": children}
+
+    return prune(root)
+
+
+def _join():
+    profile = _active.get()
+    if profile is not None:
+        profile.threads.add(threading.get_ident())
+    return profile
+
+
+@contextmanager
+def phase(name):
+    """Marks a block of handler code; timed and used to label samples inside it."""
+    profile = _join()
+    if profile is None:
+        yield
+        return
+    labels = profile.labels.setdefault(threading.get_ident(), [])
+    labels.append(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.phases[name] += time.perf_counter() - started
+        labels.pop()
+
+
+def record(name, seconds):
+    """Adds time measured elsewhere (e.g. connection pool waits) to a phase."""
+    profile = _join()
+    if profile is not None:
+        profile.phases[name] += seconds
+
+
+def _report_path(profile_id):
+    return os.path.join(PROFILES_DIR, f"{profile_id}.json")
+
+
+def _store(report):
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    tmp_path = _report_path(report["id"]) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(report, f)
+    os.replace(tmp_path, _report_path(report["id"]))
+    stored = sorted(
+        (entry for entry in os.scandir(PROFILES_DIR) if entry.name.endswith(".json")),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in stored[:-PROFILE_KEEP]:
+        os.remove(entry.path)
+
+
+def load(profile_id):
+    """A stored report, or None. Ids are generated hex strings."""
+    if not profile_id.isalnum():
+        return None
+    try:
+        with open(_report_path(profile_id)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def list_profiles():
+    if not os.path.isdir(PROFILES_DIR):
+        return []
+    profiles = []
+    for entry in sorted(os.scandir(PROFILES_DIR), key=lambda entry: -entry.stat().st_mtime):
+        if entry.name.endswith(".json"):
+            with open(entry.path) as f:
+                report = json.load(f)
+            profiles.append({key: report.get(key) for key in ("id", "request_id", "method", "path", "status", "duration_ms", "samples")})
+    return profiles
+
+
+def _header(scope, name):
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware that profiles requests carrying a valid X-Profile header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PROFILING_TOKEN:
+            return await self.app(scope, receive, send)
+        token = _header(scope, b"x-profile")
+        # Reading reports authenticates with the same header; do not profile that.
+        if token is None or scope["path"].startswith("/system/profiles"):
+            return await self.app(scope, receive, send)
+        if not authorized(token):
+            body = b'{"detail":"Invalid profiling token."}'
+            await send({
+                "type": "http.response.start",
+                "status": 403,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            })
+            return await send({"type": "http.response.body", "body": body})
+
+        profile = Profile(scope["method"], scope["path"])
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        context_token = _active.set(profile)
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile.stop()
+            _active.reset(context_token)
+            route = getattr(scope.get("route"), "path", None)
+            request_id = logs.request_id()
+            # Built and written from a thread so the report never blocks the event loop.
+            threading.Thread(
+                target=lambda: _store(profile.report(status, request_id, route)), daemon=True
+            ).start()
@@ -0,0 +1,324 @@
+"""
+Automatic quality control of the SEG-Y files behind acquisition and
+processing media rows.
+
+qc_file() walks a memory-mapped file in chunks of traces (sized so that a
+chunk's float64 working copy stays within CHUNK_BYTES, whatever the trace
+length), decoding each chunk and reducing it with NumPy in reused buffers: zero/dead traces, clipped traces,
+RMS amplitude per line, and sample-interval/record-length agreement with the
+catalog. run_survey_qc() fans every media file of a survey out over a
+process pool and writes the outcomes back in batches.
+
+Media ids repeat across parents, so a media row (and its stored result) is
+identified by its parent id and media id together.
+"""
+import json
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import partitions
+import segy
+import storage
+from database import get_field_data_conn, get_processing_data_conn
+
+# Working-set budget per chunk: the float64 copy of the samples; its
+# absolute-value buffer and mask are reused and add half as much again.
+CHUNK_BYTES = 64 * 1024 * 1024
+# A trace is clipped when more than this fraction of its samples sit at its
+# peak absolute amplitude.
+CLIP_FRACTION = 0.01
+CLIP_TOLERANCE = 1e-4
+WRITE_BATCH_SIZE = 100
+
+# target -> (connection getter, media table, media key, parent table, parent
+# key, catalog interval column, catalog record length column)
+TARGETS = {
+    "acquisition": (
+        get_field_data_conn, "acquisition_media_data", "acquisition_media_id",
+        "acquisition_data", "acquisition_id", "samp_rate", "record_length",
+    ),
+    "processing": (
+        get_processing_data_conn, "processing_media_data", "processing_media_id",
+        "processing_data", "processing_id", "sampling_interval", "record_length",
+    ),
+}
+
+_NUMBER = re.compile(r"[-+]?\d*\.?\d+")
+
+
+def _catalog_number(value):
+    """Catalog values are free text ("2", "2 ms", "6000"); take the first number."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER.search(str(value))
+    return float(match.group()) if match else None
+
+
+def qc_file(path, expected_interval_ms=None, expected_record_length_ms=None):
+    """
+    Computes QC statistics for one SEG-Y file without loading it into memory.
+    Returns a JSON-serialisable summary with a `flags` list (empty when the
+    file passes).
+    """
+    with segy.SegyFile(path) as f:
+        n, ns = f.trace_count, f.samples_per_trace
+        lines = np.array(f.header("iline"))
+        line_key = "iline"
+        if not lines.any():
+            lines, line_key = np.array(f.header("fldr")), "fldr"
+        line_ids, line_index = np.unique(lines, return_inverse=True)
+        line_sumsq = np.zeros(len(line_ids))
+        line_live = np.zeros(len(line_ids), dtype=np.int64)
+
+        chunk_traces = max(1, CHUNK_BYTES // (max(ns, 1) * 8))
+        rows = min(chunk_traces, n)
+        data_buffer = np.empty((rows, ns))
+        abs_buffer = np.empty((rows, ns))
+        mask_buffer = np.empty((rows, ns), dtype=bool)
+
+        zero_traces = dead_traces = clipped_traces = 0
+        for start in range(0, n, chunk_traces):
+            stop = min(start + chunk_traces, n)
+            samples = f.samples(start, stop)
+            data, magnitude, mask = data_buffer[:stop - start], abs_buffer[:stop - start], mask_buffer[:stop - start]
+            np.isfinite(samples, out=mask)
+            finite = mask.all(axis=1)
+            np.copyto(data, samples)
+            del samples
+            np.logical_not(mask, out=mask)
+            data[mask] = 0
+            np.abs(data, out=magnitude)
+            peak = magnitude.max(axis=1)
+            # Dead: unreadable (non-finite) or flat non-zero traces; zero:
+            # readable and all zero. The two never overlap.
+            zero = finite & (peak == 0)
+            dead = ~finite | (~zero & (data.max(axis=1) == data.min(axis=1)))
+            np.greater_equal(magnitude, (peak * (1 - CLIP_TOLERANCE))[:, None], out=mask)
+            clipped = ~zero & ~dead & (mask.sum(axis=1) > max(2, CLIP_FRACTION * ns))
+
+            zero_traces += int(zero.sum())
+            dead_traces += int(dead.sum())
+            clipped_traces += int(clipped.sum())
+
+            live = ~zero & ~dead
+            index = line_index[start:stop]
+            sumsq = np.einsum("ij,ij->i", data, data)
+            line_sumsq += np.bincount(index, weights=np.where(live, sumsq, 0), minlength=len(line_ids))
+            line_live += np.bincount(index, weights=live, minlength=len(line_ids)).astype(np.int64)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            line_rms = np.sqrt(line_sumsq / (line_live * ns))
+        summary = {
+            "file_size": f.file_size,
+            "trace_count": n,
+            "samples_per_trace": ns,
+            "sample_interval_ms": f.sample_interval_us / 1000.0,
+            "record_length_ms": f.record_length_ms,
+            "zero_traces": zero_traces,
+            "dead_traces": dead_traces,
+            "clipped_traces": clipped_traces,
+            "line_key": line_key,
+            "rms_per_line": {
+                str(int(line)): (round(float(rms), 6) if np.isfinite(rms) else None)
+                for line, rms in zip(line_ids, line_rms)
+            },
+        }
+
+    flags = []
+    if n == 0:
+        flags.append("no traces")
+    if n and zero_traces + dead_traces == n:
+        flags.append("all traces dead or zero")
+    if expected_interval_ms is not None and not np.isclose(summary["sample_interval_ms"], expected_interval_ms):
+        flags.append(f"sample interval {summary['sample_interval_ms']} ms != catalog {expected_interval_ms} ms")
+    if expected_record_length_ms is not None and not (
+        np.isclose(summary["record_length_ms"], expected_record_length_ms)
+        # Catalogs often quote ns * dt rather than (ns - 1) * dt.
+        or np.isclose(summary["record_length_ms"] + summary["sample_interval_ms"], expected_record_length_ms)
+    ):
+        flags.append(f"record length {summary['record_length_ms']} ms != catalog {expected_record_length_ms} ms")
+    summary["flags"] = flags
+    return summary
+
+
+def _qc_media(parent_id, media_id, relative_path, expected_interval_ms, expected_record_length_ms):
+    """Process-pool entry point for one media file."""
+    try:
+        summary = qc_file(storage.resolve(relative_path), expected_interval_ms, expected_record_length_ms)
+    except (OSError, segy.SegyError) as e:
+        summary = {"error": str(e), "flags": [f"unreadable: {e}"]}
+    return parent_id, media_id, relative_path, summary
+
+
+def survey_media(target, survey_id):
+    """(media_id, parent_id, catalog interval, catalog record length) for a survey."""
+    connect, media_table, media_key, parent_table, parent_key, interval_column, length_column = TARGETS[target]
+    conn = connect()
+    cursor = conn.cursor()
+    try:
+        # Filter the media table on its own partition column; a condition
+        # reached only through the join would scan every partition.
+        condition, params = partitions.scope_filter(cursor, target, survey_id=survey_id, alias="m")
+        cursor.execute(
+            f"""
+            SELECT m.{media_key}, m.{parent_key}, p.{interval_column}, p.{length_column}
+            FROM {media_table} m
+            JOIN {parent_table} p ON p.{parent_key} = m.{parent_key}
+            WHERE {condition}
+            """,
+            params,
+        )
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _write_results(target, survey_id, results, qc_by):
+    connect, media_table, media_key = TARGETS[target][:3]
+    conn = connect()
+    cursor = conn.cursor()
+    try:
+        cursor.executemany(
+            """
+            INSERT INTO media_qc_results (media_table, parent_id, media_id, file_name, flagged, summary_json)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE file_name = VALUES(file_name), flagged = VALUES(flagged),
+                summary_json = VALUES(summary_json), checked_at = CURRENT_TIMESTAMP
+            """,
+            [
+                (media_table, parent_id, media_id, path, bool(summary["flags"]), json.dumps(summary))
+                for parent_id, media_id, path, summary in results
+            ],
+        )
+        # Only files that could be read get their catalog QC fields updated.
+        checked = [
+            (partitions.row_filter(target, survey_id, parent_id), media_id, summary)
+            for parent_id, media_id, _, summary in results if "error" not in summary
+        ]
+        if checked:
+            condition = checked[0][0][0]
+            cursor.executemany(
+                f"UPDATE {media_table} SET qc_done_yes_no = %s, qc_done_by = %s, status = %s "
+                f"WHERE {condition} AND {media_key} = %s",
+                [
+                    ("Yes", qc_by, "QC Flagged" if summary["flags"] else "QC Passed", *params, media_id)
+                    for (_, params), media_id, summary in checked
+                ],
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def run_survey_qc(survey_id, target="acquisition", qc_by="auto-qc", workers=None, progress=None):
+    """
+    QCs every media file of a survey in parallel and records the outcomes.
+    `progress(fraction, message)` is called as files complete.
+    """
+    media = survey_media(target, survey_id)
+    tasks = []
+    missing = []
+    for media_id, parent_id, interval, record_length in media:
+        relative_path = storage.media_file(parent_id, media_id)
+        if relative_path is None:
+            missing.append({"parent_id": parent_id, "media_id": media_id})
+            continue
+        tasks.append((parent_id, media_id, relative_path, _catalog_number(interval), _catalog_number(record_length)))
+
+    counts = {"files": len(tasks), "passed": 0, "flagged": 0, "unreadable": 0, "missing_files": missing}
+    flagged = []
+    pending = []
+    if tasks:
+        workers = min(workers or os.cpu_count() or 1, len(tasks))
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(_qc_media, *task) for task in tasks]
+            for done, future in enumerate(as_completed(futures), start=1):
+                parent_id, media_id, relative_path, summary = future.result()
+                if "error" in summary:
+                    counts["unreadable"] += 1
+                elif summary["flags"]:
+                    counts["flagged"] += 1
+                else:
+                    counts["passed"] += 1
+                if summary["flags"]:
+                    flagged.append({
+                        "parent_id": parent_id, "media_id": media_id, "file": relative_path, "flags": summary["flags"],
+                    })
+                pending.append((parent_id, media_id, relative_path, summary))
+                if len(pending) >= WRITE_BATCH_SIZE:
+                    _write_results(target, survey_id, pending, qc_by)
+                    pending = []
+                if progress:
+                    progress(done / len(tasks), f"{done} of {len(tasks)} files checked")
+    if pending:
+        _write_results(target, survey_id, pending, qc_by)
+    return {"survey_id": survey_id, "target": target, **counts, "flagged_files": flagged}
+
+
+def get_result(target, parent_id, media_id):
+    connect, media_table = TARGETS[target][:2]
+    conn = connect()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            "SELECT parent_id, media_id, file_name, flagged, summary_json, checked_at FROM media_qc_results "
+            "WHERE media_table = %s AND parent_id = %s AND media_id = %s",
+            (media_table, parent_id, media_id),
+        )
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+    if row:
+        row["flagged"] = bool(row["flagged"])
+        row["summary"] = json.loads(row.pop("summary_json"))
+    return row
+
+
+def add_result_parent(target):
+    """
+    A migration `run` callable adding parent_id to the media_qc_results key.
+    Existing results take their media id's parent where that id has only
+    one; the rest keep '' (ambiguous) until their survey is QC'd again.
+    """
+    media_table, media_key, _, parent_key = TARGETS[target][1:5]
+
+    def run(conn):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "SELECT COUNT(*) FROM information_schema.COLUMNS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'media_qc_results' AND COLUMN_NAME = 'parent_id'"
+            )
+            if not cursor.fetchone()[0]:
+                cursor.execute(
+                    "ALTER TABLE media_qc_results "
+                    "ADD COLUMN parent_id VARCHAR(255) NOT NULL DEFAULT '' AFTER media_table, "
+                    "DROP PRIMARY KEY, ADD PRIMARY KEY (media_table, parent_id, media_id)"
+                )
+            cursor.execute(
+                f"""
+                UPDATE media_qc_results r
+                JOIN (
+                    SELECT {media_key} AS media_id, MIN({parent_key}) AS parent_id FROM {media_table}
+                    GROUP BY {media_key} HAVING COUNT(DISTINCT {parent_key}) = 1
+                ) m ON m.media_id = r.media_id
+                SET r.parent_id = m.parent_id
+                WHERE r.media_table = %s AND r.parent_id = '' AND m.parent_id IS NOT NULL
+                """,
+                (media_table,),
+            )
+        finally:
+            cursor.close()
+    return run
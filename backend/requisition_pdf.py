@@ -0,0 +1,396 @@
+"""
+Printable PDFs of requisition forms.
+
+Approved requisitions are printed and signed on paper. GET
+/requisitions/{id}/pdf renders one form; GET /requisitions/daily-approvals/pdf
+renders every form approved on one day into a single document. Each form
+takes one or more A4 pages: the form fields, the requested data types and
+personnel tables, the preparer's and group coordinator's signature blocks,
+and the Level 2 and Level 3 decisions with their comments.
+
+- The PDF is written by PdfDocument below: standard Helvetica fonts, text,
+  rules and Flate-compressed page streams, which is all a form needs and
+  keeps the backend free of a PDF dependency. Text outside Windows-1252
+  (e.g. Devanagari) prints as "?".
+- Rendering is CPU-bound, so it runs in a process pool of PDF_RENDER_WORKERS
+  spawned processes; the API loop only awaits the result.
+- Output is cached on disk under PDF_CACHE_DIR, keyed by a hash of the forms'
+  complete state (every field, approval and comment, plus LAYOUT_VERSION).
+  An approval or edit changes the key, so a cached PDF is never stale, and
+  the key doubles as the response's ETag. The oldest files are pruned once
+  the cache exceeds PDF_CACHE_MAX_MB.
+- Concurrent requests for the same document share one render (single flight).
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from config import PDF_CACHE_DIR, PDF_CACHE_MAX_MB, PDF_RENDER_TIMEOUT_SECONDS, PDF_RENDER_WORKERS
+
+# Bump when the layout changes so cached documents are re-rendered.
+LAYOUT_VERSION = 1
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+MARGIN = 42
+FONT_SIZE = 9
+LINE_HEIGHT = 12
+CELL_PADDING = 3
+
+# Helvetica advance widths (1/1000 em) for ASCII 32..126, from the standard AFM.
+_HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+# Helvetica-Bold runs a little wider; wrapping only needs an upper bound.
+_BOLD_FACTOR = 1.1
+
+# (heading, key, width in points) of the two tables.
+DATA_TYPE_TABLE = (
+    ("Sl.", "slNo", 28), ("Type of data", "typeOfData", 105), ("Sl. no. required", "slNoRequired", 90),
+    ("Data observer", "dataObserver", 85), ("Project objective", "projectObjective", 110),
+    ("Remarks", "remarks", 93),
+)
+SL_NO_DATA_TABLE = (
+    ("Sl.", "slNo", 28), ("Description", "description", 235), ("Mobile no.", "mobileNo", 90),
+    ("Designation", "designation", 158),
+)
+
+
+def text_width(text, size, bold=False):
+    width = sum(_HELVETICA_WIDTHS[ord(ch) - 32] if 32 <= ord(ch) <= 126 else 556 for ch in text)
+    return width * size / 1000 * (_BOLD_FACTOR if bold else 1)
+
+
+def wrap(text, width, size=FONT_SIZE, bold=False):
+    """Splits `text` into lines no wider than `width` points, breaking at spaces where possible."""
+    lines = []
+    for paragraph in str(text).splitlines() or [""]:
+        line = ""
+        for word in paragraph.split(" "):
+            candidate = f"{line} {word}" if line else word
+            if text_width(candidate, size, bold) <= width:
+                line = candidate
+                continue
+            if line:
+                lines.append(line)
+            # A word wider than the column is cut wherever it overflows.
+            while text_width(word, size, bold) > width and len(word) > 1:
+                cut = len(word) - 1
+                while cut > 1 and text_width(word[:cut], size, bold) > width:
+                    cut -= 1
+                lines.append(word[:cut])
+                word = word[cut:]
+            line = word
+        lines.append(line)
+    return lines
+
+
+def _pdf_string(text):
+    data = str(text).encode("cp1252", errors="replace")
+    return b"(" + data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+class PdfDocument:
+    """A minimal PDF 1.4 writer: pages of Helvetica text and lines."""
+
+    def __init__(self, title=""):
+        self.title = title
+        self.pages = []
+
+    def new_page(self):
+        self.pages.append([])
+        return len(self.pages) - 1
+
+    def text(self, x, y, text, size=FONT_SIZE, bold=False, page=-1):
+        font = b"/F2" if bold else b"/F1"
+        self.pages[page].append(
+            b"BT %s %d Tf %.2f %.2f Td %s Tj ET" % (font, size, x, y, _pdf_string(text))
+        )
+
+    def line(self, x1, y1, x2, y2, width=0.5, page=-1):
+        self.pages[page].append(b"%.2f w %.2f %.2f m %.2f %.2f l S" % (width, x1, y1, x2, y2))
+
+    def to_bytes(self):
+        objects = [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            None,  # the page tree, once the page objects are numbered
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+            b"<< /Title %s /Producer (Seismic Data Hub) >>" % _pdf_string(self.title),
+        ]
+        page_ids = []
+        for operations in self.pages:
+            stream = zlib.compress(b"\n".join(operations))
+            objects.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (len(stream), stream))
+            objects.append(
+                b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+                b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>"
+                % (PAGE_WIDTH, PAGE_HEIGHT, len(objects))
+            )
+            page_ids.append(len(objects))
+        objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            b" ".join(b"%d 0 R" % page_id for page_id in page_ids), len(page_ids),
+        )
+
+        out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(out))
+            out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+        xref = len(out)
+        out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+        out += b"trailer\n<< /Size %d /Root 1 0 R /Info 5 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+            len(objects) + 1, xref,
+        )
+        return bytes(out)
+
+
+class _Layout:
+    """Flows one form down the pages of a PdfDocument, breaking pages as needed."""
+
+    def __init__(self, doc, form):
+        self.doc = doc
+        self.form = form
+        self.first_page = doc.new_page()
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def ensure(self, height):
+        if self.y - height < MARGIN + LINE_HEIGHT:
+            self.doc.new_page()
+            self.y = PAGE_HEIGHT - MARGIN
+            return True
+        return False
+
+    def heading(self, text):
+        self.ensure(LINE_HEIGHT * 3)
+        self.y -= LINE_HEIGHT
+        self.doc.text(MARGIN, self.y, text, size=11, bold=True)
+        self.y -= LINE_HEIGHT * 0.75
+
+    def fields(self, pairs, label_width=130):
+        for label, value in pairs:
+            lines = wrap(value if value not in (None, "") else "-", PAGE_WIDTH - 2 * MARGIN - label_width)
+            self.ensure(LINE_HEIGHT * len(lines))
+            self.y -= LINE_HEIGHT
+            self.doc.text(MARGIN, self.y, label, bold=True)
+            for index, line in enumerate(lines):
+                self.doc.text(MARGIN + label_width, self.y - index * LINE_HEIGHT, line)
+            self.y -= LINE_HEIGHT * (len(lines) - 1)
+
+    def _table_row(self, columns, cells, bold=False):
+        wrapped = [
+            wrap(cell, width - 2 * CELL_PADDING, bold=bold) for cell, (_, _, width) in zip(cells, columns)
+        ]
+        height = max(len(lines) for lines in wrapped) * LINE_HEIGHT + 2 * CELL_PADDING
+        x = MARGIN
+        top = self.y
+        for lines, (_, _, width) in zip(wrapped, columns):
+            for index, line in enumerate(lines):
+                self.doc.text(x + CELL_PADDING, top - CELL_PADDING - (index + 1) * LINE_HEIGHT + 3, line, bold=bold)
+            self.doc.line(x, top, x, top - height)
+            x += width
+        self.doc.line(x, top, x, top - height)
+        self.doc.line(MARGIN, top - height, x, top - height)
+        self.y = top - height
+        return height
+
+    def table(self, columns, rows):
+        headings = [heading for heading, _, _ in columns]
+        right = MARGIN + sum(width for _, _, width in columns)
+
+        def header():
+            self.doc.line(MARGIN, self.y, right, self.y)
+            self._table_row(columns, headings, bold=True)
+
+        self.ensure(LINE_HEIGHT * 4)
+        header()
+        if not rows:
+            rows = [{}]
+        for row in rows:
+            cells = ["" if row.get(key) is None else str(row.get(key)) for _, key, _ in columns]
+            lines = max(len(wrap(cell, width - 2 * CELL_PADDING)) for cell, (_, _, width) in zip(cells, columns))
+            if self.ensure(lines * LINE_HEIGHT + 2 * CELL_PADDING):
+                header()  # repeated on each page the table continues on
+            self.doc.line(MARGIN, self.y, right, self.y)
+            self._table_row(columns, cells)
+
+    def signatures(self, blocks):
+        """Side-by-side signature blocks: [(title, signature, designation)]."""
+        self.ensure(LINE_HEIGHT * 7)
+        width = (PAGE_WIDTH - 2 * MARGIN) / len(blocks)
+        top = self.y - LINE_HEIGHT * 2
+        for index, (title, signature, designation) in enumerate(blocks):
+            x = MARGIN + index * width
+            self.doc.text(x, top, title, bold=True)
+            self.doc.text(x, top - LINE_HEIGHT * 1.5, signature or "")
+            self.doc.line(x, top - LINE_HEIGHT * 2, x + width - 20, top - LINE_HEIGHT * 2)
+            self.doc.text(x, top - LINE_HEIGHT * 3, "Signature")
+            self.doc.text(x, top - LINE_HEIGHT * 4, f"Designation: {designation or '-'}")
+        self.y = top - LINE_HEIGHT * 4
+
+
+def _decision(form, level):
+    status = form.get("current_approval_status") or ""
+    if status == f"L{level}_Declined":
+        return "Declined"
+    if form.get(f"l{level}_approver_id") and (level == 2 or status == "L3_Approved"):
+        return "Approved"
+    return "Pending"
+
+
+def _render_form(doc, form):
+    layout = _Layout(doc, form)
+    doc.text(MARGIN, layout.y - 6, "DATA REQUISITION FORM", size=14, bold=True)
+    status = f"Requisition #{form.get('id')}  |  {form.get('current_approval_status') or ''}"
+    doc.text(PAGE_WIDTH - MARGIN - text_width(status, FONT_SIZE), layout.y - 6, status)
+    layout.y -= 18
+    doc.line(MARGIN, layout.y, PAGE_WIDTH - MARGIN, layout.y, width=1)
+
+    layout.fields([
+        ("Subject", form.get("subject")),
+        ("Date of requisition", form.get("dateOfRequisition")),
+        ("Project / District", form.get("projectDistrict")),
+        ("Sheet", form.get("sheet")),
+        ("Remark", form.get("remark")),
+        ("Requested by", form.get("requester_user_id")),
+        ("Submitted on", form.get("created_at")),
+    ])
+    layout.heading("Data requested")
+    layout.table(DATA_TYPE_TABLE, form.get("dataTypes") or [])
+    layout.heading("Personnel")
+    layout.table(SL_NO_DATA_TABLE, form.get("slNoData") or [])
+    layout.signatures([
+        ("Prepared by", form.get("preparedBySignature"), form.get("preparedByDesignation")),
+        ("Group coordinator", form.get("groupCoordinatorSignature"), form.get("groupCoordinatorDesignation")),
+    ])
+    for level in (2, 3):
+        layout.heading(f"Level {level} approval")
+        layout.fields([
+            ("Decision", _decision(form, level)),
+            ("Approver", form.get(f"l{level}_approver_id")),
+            ("Date", form.get(f"l{level}_approval_date")),
+            ("Comments", form.get(f"l{level}_comments")),
+        ])
+    layout.signatures([(f"Level {level} approver", "", "") for level in (2, 3)])
+    return layout.first_page
+
+
+def render_document(forms, title):
+    """The PDF of `forms` (requisitions in API shape), one after another. Runs in the render pool."""
+    doc = PdfDocument(title)
+    starts = [_render_form(doc, form) for form in forms]
+    # Footers go on last, once each form's page count is known.
+    for index, (form, start) in enumerate(zip(forms, starts)):
+        end = starts[index + 1] if index + 1 < len(starts) else len(doc.pages)
+        for page in range(start, end):
+            footer = f"Requisition #{form.get('id')}  -  page {page - start + 1} of {end - start}"
+            doc.text(PAGE_WIDTH - MARGIN - text_width(footer, 8), MARGIN - 18, footer, size=8, page=page)
+    return doc.to_bytes()
+
+
+# ===== Cache =====
+
+def state_key(forms):
+    """Hash of everything a document shows; it changes whenever any form does."""
+    state = json.dumps({"layout": LAYOUT_VERSION, "forms": forms}, sort_keys=True, default=str)
+    return hashlib.sha256(state.encode()).hexdigest()
+
+
+def _cache_path(key):
+    return os.path.join(PDF_CACHE_DIR, key[:2], f"{key}.pdf")
+
+
+def _read_cached(key):
+    try:
+        with open(_cache_path(key), "rb") as handle:
+            data = handle.read()
+    except FileNotFoundError:
+        return None
+    os.utime(_cache_path(key))  # pruning removes the least recently served first
+    return data
+
+
+def _store(key, data):
+    path = _cache_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(handle, "wb") as out:
+        out.write(data)
+    os.replace(temporary, path)
+    _prune()
+
+
+def _prune():
+    files = []
+    for root, _, names in os.walk(PDF_CACHE_DIR):
+        for name in names:
+            if name.endswith(".pdf"):
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in files)
+    limit = PDF_CACHE_MAX_MB * 1024 * 1024
+    for _, size, path in sorted(files):
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+# ===== Render pool =====
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the API process is multi-threaded.
+            _pool = ProcessPoolExecutor(PDF_RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def render_cached(key, forms, title):
+    """
+    The PDF for `key` from the disk cache, or rendered in the pool and cached.
+    Blocking; raises concurrent.futures.TimeoutError after PDF_RENDER_TIMEOUT_SECONDS.
+    """
+    global _pool
+    data = _read_cached(key)
+    if data is not None:
+        return data
+    pool = _executor()
+    try:
+        data = pool.submit(render_document, forms, title).result(timeout=PDF_RENDER_TIMEOUT_SECONDS)
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory); the next request gets a fresh pool.
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        raise
+    _store(key, data)
+    return data
@@ -1,45 +1,133 @@
-from fastapi import APIRouter, HTTPException
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+import mysql.connector
 from database import get_field_data_conn
+import dedup
+import media_updates
+import partitions
+import write_engine
+from single_flight import coalesce
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/acquisition-media", tags=["Acquisition Media"])
 
+ACQUISITION_MEDIA_TABLE = write_engine.register(write_engine.TableDescriptor(
+    "acquisition_media_data",
+    get_field_data_conn,
+    [
+        "acq_serial_num", "acquisition_id", "acquisition_media_id", "cart_number",
+        "line_name", "org_cart_number", "fsp", "lsp", "ff", "lf", "rack", "box",
+        "shelf", "date_cat", "media_type", "data_type", "data_format", "original_copy",
+        "archival_media_id", "catalog_by", "remarks", "qc_done_yes_no", "qc_done_by",
+        "status", "dam_status", "transcrp_tape_yn", "transcrp_yr", "transcribed_by_wc",
+        "copex_status",
+    ],
+))
+
 @router.post("")
-def create_acquisition_media(data: dict):
+def create_acquisition_media(
+    data: dict,
+    reject_duplicates: bool = Query(False, description="Refuse (409) a cartridge that is already catalogued"),
+):
+    """
+    Inserts one media row. Rows already catalogued under one of its
+    identifiers (in any of the three media tables) are listed in
+    `duplicates`, or refuse the insert with reject_duplicates.
+    """
+    duplicates = dedup.check("acquisition", data)
+    if duplicates and reject_duplicates:
+        raise HTTPException(status_code=409, detail={"message": "Cartridge already catalogued", "matches": duplicates})
+    try:
+        write_engine.insert_one(ACQUISITION_MEDIA_TABLE, data)
+        dedup.register("acquisition", [data])
+        return {"message": "Acquisition media data inserted successfully", "duplicates": duplicates}
+    except write_engine.PayloadError as err:
+        raise HTTPException(status_code=422, detail=err.errors)
+    except mysql.connector.Error as err: # Catch specific MySQL errors
+        logger.error("MySQL Database Error in create_acquisition_media: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+    except Exception as e:
+        logger.exception("Unexpected error in create_acquisition_media")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/count")
+@coalesce
+def get_acquisition_media_count(
+    acquisition_id: Optional[str] = Query(None, description="Only media of this acquisition"),
+    survey_id: Optional[str] = Query(None, description="Only media of this survey's acquisitions"),
+):
+    """
+    Returns the number of acquisition_media_data rows, optionally for one acquisition
+    or survey. Filters are applied to the partition column so only the
+    matching partitions are read.
+    """
+    conn = None
+    cursor = None
     try:
         conn = get_field_data_conn()
         cursor = conn.cursor()
-
-        query = """
-            INSERT INTO acquisition_media_data (
-                acq_serial_num, acquisition_id, acquisition_media_id, cart_number, line_name,
-                org_cart_number, fsp, lsp, ff, lf, rack, box, shelf, date_cat, media_type,
-                data_type, data_format, original_copy, archival_media_id, catalog_by,
-                remarks, qc_done_yes_no, qc_done_by, status, dam_status,
-                transcrp_tape_yn, transcrp_yr, transcribed_by_wc, copex_status
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                    %s, %s, %s, %s)
-        """
-
-        values = (
-            data["acq_serial_num"], data["acquisition_id"], data["acquisition_media_id"], data["cart_number"],
-            data["line_name"], data["org_cart_number"], data["fsp"], data["lsp"],
-            data["ff"], data["lf"], data["rack"], data["box"], data["shelf"],
-            data["date_cat"], data["media_type"], data["data_type"], data["data_format"],
-            data["original_copy"], data["archival_media_id"], data["catalog_by"],
-            data["remarks"], data["qc_done_yes_no"], data["qc_done_by"], data["status"],
-            data["dam_status"], data["transcrp_tape_yn"], data["transcrp_yr"],
-            data["transcribed_by_wc"], data["copex_status"]
-        )
-
-        cursor.execute(query, values)
-        conn.commit()
-        return {"message": "Acquisition media data inserted successfully"}
-
+        condition, params = partitions.scope_filter(cursor, "acquisition", acquisition_id, survey_id)
+        cursor.execute(f"SELECT COUNT(*) FROM acquisition_media_data WHERE {condition}", params)
+        count = cursor.fetchone()[0]
+        return {"count": count}
+    except mysql.connector.Error as err:
+        logger.error("Error in /acquisition-media/count: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        logger.exception("Unexpected error in /acquisition-media/count")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
 
+@router.get("")
+def list_acquisition_media(
+    acquisition_id: Optional[str] = Query(None, description="Media of this acquisition"),
+    survey_id: Optional[str] = Query(None, description="Media of this survey's acquisitions"),
+    limit: int = Query(1000, ge=1, le=10000),
+    offset: int = Query(0, ge=0),
+):
+    """
+    Lists acquisition_media_data rows of one acquisition or survey. A filter is
+    required: an unscoped listing would read every partition.
+    """
+    if acquisition_id is None and survey_id is None:
+        raise HTTPException(status_code=400, detail="Give acquisition_id or survey_id.")
+    conn = None
+    cursor = None
+    try:
+        conn = get_field_data_conn()
+        cursor = conn.cursor(dictionary=True)
+        condition, params = partitions.scope_filter(cursor, "acquisition", acquisition_id, survey_id)
+        cursor.execute(
+            f"SELECT * FROM acquisition_media_data WHERE {condition} ORDER BY acquisition_id, acquisition_media_id LIMIT %s OFFSET %s",
+            [*params, limit, offset],
+        )
+        return {"media": cursor.fetchall()}
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in list_acquisition_media: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
     finally:
-        cursor.close()
-        conn.close()
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+@router.patch("/bulk")
+def bulk_update_acquisition_media(request: media_updates.BulkUpdateRequest):
+    """
+    Applies the same lifecycle changes (status, QC, transcription, location)
+    to every acquisition_media_data row the selector matches, in chunks; returns
+    the rows matched and changed. With dry_run only the match is counted.
+    """
+    try:
+        return media_updates.bulk_update("acquisition", ACQUISITION_MEDIA_TABLE, request)
+    except write_engine.PayloadError as err:
+        raise HTTPException(status_code=422, detail=err.errors)
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in bulk_update_acquisition_media: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
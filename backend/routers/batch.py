@@ -0,0 +1,48 @@
+import logging
+from typing import Dict, List, Optional, Union
+
+from fastapi import APIRouter, Request
+from pydantic import BaseModel, Field, field_validator
+
+import batch
+import logs
+from config import BATCH_MAX_REQUESTS
+
+logger = logging.getLogger(__name__)
+router = APIRouter(tags=["Batch"])
+
+class SubRequest(BaseModel):
+    id: Optional[str] = None  # echoed back, to match responses to requests
+    method: str = "GET"
+    path: str  # may carry a query string
+    params: Optional[Dict[str, Union[str, int, float, bool, List[str]]]] = None
+
+    @field_validator("method")
+    @classmethod
+    def _get_only(cls, method):
+        if method.upper() != "GET":
+            raise ValueError("Only GET requests can be batched")
+        return "GET"
+
+    @field_validator("path")
+    @classmethod
+    def _absolute(cls, path):
+        if not path.startswith("/"):
+            raise ValueError("Path must start with /")
+        return path
+
+class BatchRequest(BaseModel):
+    requests: List[SubRequest] = Field(..., min_length=1, max_length=BATCH_MAX_REQUESTS)
+
+@router.post(batch.BATCH_PATH)
+async def run_batch(body: BatchRequest, request: Request):
+    """
+    Runs several GET requests to the API concurrently and returns their
+    statuses and bodies together, in request order (see batch.py).
+    """
+    items = [(sub.id, sub.path, sub.params) for sub in body.requests]
+    responses = await batch.run(request.app, request.scope, items, logs.request_id() or "batch")
+    failed = [f"{path} ({response['status']})" for (_, path, _), response in zip(items, responses) if response["status"] >= 500]
+    if failed:
+        logger.error("Batch sub-requests failed: %s", ", ".join(failed))
+    return {"responses": responses}
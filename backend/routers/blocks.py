@@ -1,50 +1,43 @@
+import logging
 from fastapi import APIRouter, HTTPException
 import mysql.connector # Import mysql.connector
 from database import get_field_data_conn
+import cache
+import write_engine
+from single_flight import coalesce
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/blocks", tags=["Blocks"])
 
+BLOCK_TABLE = write_engine.register(write_engine.TableDescriptor(
+    "block_data",
+    get_field_data_conn,
+    [
+        "block_id", "block_name", "basin_name", "block_type", "environment",
+        "off_type", "block_status", "area", "effective_date", "block_duration",
+        "relinquish_date", "admin_basin", "operator", "current_phase", "original_area",
+        "current_phase_area", "file_name",
+    ],
+))
+
 @router.post("")
 def create_block(data: dict):
     try:
-        conn = get_field_data_conn()
-        cursor = conn.cursor()
-
-        query = """
-            INSERT INTO block_data (
-                block_id, block_name, basin_name, block_type, environment, off_type,
-                block_status, area, effective_date, block_duration, relinquish_date,
-                admin_basin, operator, current_phase, original_area, current_phase_area,
-                file_name
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-
-        values = (
-            data["block_id"], data["block_name"], data["basin_name"], data["block_type"],
-            data["environment"], data["off_type"], data["block_status"], data["area"],
-            data["effective_date"], data["block_duration"], data["relinquish_date"],
-            data["admin_basin"], data["operator"], data["current_phase"],
-            data["original_area"], data["current_phase_area"], data["file_name"]
-        )
-
-        cursor.execute(query, values)
-        conn.commit()
+        write_engine.insert_one(BLOCK_TABLE, data)
+        if data.get("block_id") is not None:
+            cache.blocks.invalidate(str(data["block_id"]))
         return {"message": "Block data inserted successfully"}
-
+    except write_engine.PayloadError as err:
+        raise HTTPException(status_code=422, detail=err.errors)
     except mysql.connector.Error as err: # Catch specific MySQL errors
-        print(f"MySQL Database Error in create_block: {err}")
+        logger.error("MySQL Database Error in create_block: %s", err)
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
     except Exception as e:
-        print(f"Unexpected error in create_block: {e}")
+        logger.exception("Unexpected error in create_block")
         raise HTTPException(status_code=500, detail=str(e))
 
-    finally:
-        if cursor: # Ensure cursor is closed only if it was opened
-            cursor.close()
-        if conn: # Ensure connection is closed only if it was opened
-            conn.close()
-
 @router.get("/count")
+@coalesce
 def get_block_count():
     try:
         conn = get_field_data_conn()
@@ -53,10 +46,10 @@ def get_block_count():
         count = cursor.fetchone()[0]
         return {"count": count}
     except mysql.connector.Error as err: # Catch specific MySQL errors
-        print(f"MySQL Database Error in get_block_count: {err}")
+        logger.error("MySQL Database Error in get_block_count: %s", err)
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
     except Exception as e:
-        print(f"Unexpected error in get_block_count: {e}")
+        logger.exception("Unexpected error in get_block_count")
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         if cursor:
@@ -65,6 +58,7 @@ def get_block_count():
             conn.close()
 
 @router.get("/blocks/ids")
+@coalesce
 def get_block_ids():
     """
     Fetches a list of all existing block_ids from the block_data table.
@@ -80,13 +74,49 @@ def get_block_ids():
         block_ids = [row[0] for row in cursor.fetchall()]
         return {"block_ids": block_ids}
     except mysql.connector.Error as err:
-        print(f"MySQL Database Error in get_block_ids: {err}")
+        logger.error("MySQL Database Error in get_block_ids: %s", err)
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
     except Exception as e:
-        print(f"Unexpected error in get_block_ids: {e}")
+        logger.exception("Unexpected error in get_block_ids")
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         if cursor:
             cursor.close()
         if conn:
             conn.close()
+
+def _load_block(block_id):
+    conn = get_field_data_conn()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT * FROM block_data WHERE block_id = %s", (block_id,))
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+
+def warm_cache():
+    """Preloads the block cache (start-up warm-up); returns the number of records."""
+    conn = get_field_data_conn()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT * FROM block_data LIMIT %s", (cache.blocks.max_entries,))
+        return cache.blocks.preload((str(row["block_id"]), row) for row in cursor.fetchall())
+    finally:
+        cursor.close()
+        conn.close()
+
+# Declared last so the fixed paths above take precedence.
+@router.get("/{block_id}")
+def get_block(block_id: str):
+    """
+    Fetches a single block record, served from the read-through cache.
+    """
+    try:
+        record = cache.blocks.get(block_id, lambda: _load_block(block_id))
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in get_block: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+    if record is None:
+        raise HTTPException(status_code=404, detail="Block not found.")
+    return record
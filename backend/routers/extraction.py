@@ -0,0 +1,93 @@
+import logging
+import os
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+import segy
+import segy_index
+import storage
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/extraction", tags=["Extraction"])
+
+class IndexRequest(BaseModel):
+    file: str # Path relative to the data root
+    kind: str = "inline_xline"
+
+class ExtractionRequest(BaseModel):
+    file: str # Path relative to the data root
+    inline_range: Optional[List[int]] = Field(None, min_length=2, max_length=2)
+    xline_range: Optional[List[int]] = Field(None, min_length=2, max_length=2)
+    shot_range: Optional[List[int]] = Field(None, min_length=2, max_length=2)
+    channel_range: Optional[List[int]] = Field(None, min_length=2, max_length=2)
+    requisition_id: Optional[int] = None # Only used to name the download
+
+def _resolve_file(file):
+    try:
+        path = storage.resolve(file)
+    except storage.StoragePathError as e:
+        logger.warning("Rejected extraction path %r: %s", file, e)
+        raise HTTPException(status_code=400, detail=str(e))
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="File not found.")
+    return path
+
+def _load_index(path, kind):
+    if kind not in segy_index.INDEX_KINDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid index kind. Allowed kinds: {', '.join(segy_index.INDEX_KINDS)}"
+        )
+    try:
+        return segy_index.load_index(path, kind)
+    except segy.SegyError as e:
+        logger.warning("Unreadable SEG-Y file %s: %s", path, e)
+        raise HTTPException(status_code=422, detail=f"Not a readable SEG-Y file: {e}")
+
+@router.post("/index")
+def build_trace_index(request: IndexRequest):
+    """
+    Builds (or refreshes) the trace-key index of a stored SEG-Y file.
+    Extraction builds it on demand too; this lets large files be indexed ahead.
+    """
+    path = _resolve_file(request.file)
+    index = _load_index(path, request.kind)
+    return {"file": request.file, "kind": request.kind, **segy_index.index_stats(index)}
+
+@router.post("/segy")
+def extract_segy(request: ExtractionRequest):
+    """
+    Streams a new SEG-Y containing only the traces inside the requested
+    inline/crossline (or shot/channel) window of a stored file.
+    """
+    by_lines = request.inline_range is not None or request.xline_range is not None
+    by_shots = request.shot_range is not None or request.channel_range is not None
+    if by_lines == by_shots:
+        raise HTTPException(
+            status_code=400,
+            detail="Give an inline/xline window or a shot/channel window, not both or neither."
+        )
+    path = _resolve_file(request.file)
+    if by_lines:
+        index = _load_index(path, "inline_xline")
+        traces = segy_index.select_traces(index, request.inline_range, request.xline_range)
+    else:
+        index = _load_index(path, "shot_channel")
+        traces = segy_index.select_traces(index, request.shot_range, request.channel_range)
+    if len(traces) == 0:
+        raise HTTPException(status_code=404, detail="No traces fall inside the requested window.")
+
+    base = os.path.splitext(os.path.basename(path))[0]
+    suffix = f"_req{request.requisition_id}" if request.requisition_id else "_subset"
+    return StreamingResponse(
+        segy_index.stream_extract(path, index, traces),
+        media_type="application/octet-stream",
+        headers={
+            "Content-Disposition": f'attachment; filename="{base}{suffix}.sgy"',
+            "Content-Length": str(segy_index.extracted_size(index, traces)),
+            "X-Trace-Count": str(len(traces)),
+        },
+    )
@@ -0,0 +1,55 @@
+import logging
+from typing import List, Optional
+
+import mysql.connector
+from fastapi import APIRouter, HTTPException, Query, status
+from pydantic import BaseModel, Field
+
+import fixity
+import jobs
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/fixity", tags=["Fixity"])
+
+class AuditRequest(BaseModel):
+    full: bool = False # Re-hash unchanged files too
+    max_mb_per_second: Optional[float] = Field(None, ge=0)
+    submitted_by: Optional[str] = None
+
+class RebaselineRequest(BaseModel):
+    paths: List[str] = Field(..., min_length=1)
+
+@router.get("/status")
+def get_fixity_status(limit: int = Query(500, ge=1, le=5000)):
+    """
+    Summarises the last audit of every catalogued file and lists the ones
+    that are corrupted, modified, missing or unreadable.
+    """
+    try:
+        return fixity.status_report(limit)
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in get_fixity_status: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+
+@router.post("/run", status_code=status.HTTP_202_ACCEPTED)
+def run_fixity_audit(request: AuditRequest):
+    """Queues an audit outside the regular schedule. Track it with GET /jobs/{job_id}."""
+    params = {"full": request.full}
+    if request.max_mb_per_second is not None:
+        params["max_mb_per_second"] = request.max_mb_per_second
+    try:
+        job_id = jobs.submit("fixity_audit", params, request.submitted_by)
+        return {"job_id": job_id, "status": "queued"}
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in run_fixity_audit: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+
+@router.post("/rebaseline")
+def rebaseline_files(request: RebaselineRequest):
+    """Accepts the current content of deliberately replaced files as their new baseline."""
+    try:
+        updated = fixity.rebaseline(request.paths)
+        return {"message": f"{updated} file(s) will be re-baselined on the next audit."}
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in rebaseline_files: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
@@ -0,0 +1,169 @@
+import logging
+import os
+import shutil
+from typing import Optional
+
+import mysql.connector
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from pydantic import BaseModel
+
+import segy
+import storage
+from database import get_field_data_conn, get_processing_data_conn
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/ingest", tags=["Ingest"])
+
+UPLOAD_DIR = "uploads"
+COPY_BUFFER_SIZE = 8 * 1024 * 1024
+
+# target -> (table, key column, connection getter, parent column for media rows)
+TARGETS = {
+    "acquisition": ("acquisition_data", "acquisition_id", get_field_data_conn, None),
+    "processing": ("processing_data", "processing_id", get_processing_data_conn, None),
+    "acquisition_media": ("acquisition_media_data", "acquisition_media_id", get_field_data_conn, "acquisition_id"),
+    "processing_media": ("processing_media_data", "processing_media_id", get_processing_data_conn, "processing_id"),
+}
+
+class SegyScanRequest(BaseModel):
+    file: str # Path relative to the data root
+    inline_byte: Optional[int] = None
+    xline_byte: Optional[int] = None
+    target: Optional[str] = None
+    record_id: Optional[str] = None
+    parent_id: Optional[str] = None # Acquisition/processing id of a media record
+    overwrite: bool = False
+
+def _catalog_fields(summary, file_name):
+    return {
+        "acquisition": segy.acquisition_fields(summary, file_name),
+        "processing": segy.processing_fields(summary),
+        "acquisition_media": segy.acquisition_media_fields(summary),
+        "processing_media": segy.processing_media_fields(summary),
+    }
+
+def apply_fields(target, record_id, fields, overwrite=False, parent_id=None):
+    """
+    Writes extracted header values into an existing catalog row (a media
+    row is identified by its id within `parent_id`). Unless `overwrite` is
+    set, only columns that are still empty are filled. Returns the number
+    of rows updated.
+    """
+    table, key, connect, parent_column = TARGETS[target]
+    fields = {column: value for column, value in fields.items() if value is not None}
+    if not fields:
+        return 0
+    if overwrite:
+        assignments = ", ".join(f"{column} = %s" for column in fields)
+    else:
+        assignments = ", ".join(
+            f"{column} = IF({column} IS NULL OR {column} = '', %s, {column})" for column in fields
+        )
+    condition, params = f"{key} = %s", [record_id]
+    if parent_column:
+        condition, params = f"{condition} AND {parent_column} = %s", [*params, parent_id]
+    conn = connect()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"UPDATE {table} SET {assignments} WHERE {condition}",
+            (*fields.values(), *params),
+        )
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        cursor.close()
+        conn.close()
+
+def _check_target(target, record_id, parent_id):
+    if target is not None and target not in TARGETS:
+        raise HTTPException(status_code=400, detail=f"Invalid target. Allowed targets: {', '.join(TARGETS)}")
+    if record_id is not None and target is None:
+        raise HTTPException(status_code=400, detail="A target is required to apply fields to a record.")
+    if record_id is not None and TARGETS[target][3] and parent_id is None:
+        raise HTTPException(status_code=400, detail=f"A parent_id ({TARGETS[target][3]}) is required for {target} records.")
+
+def _ingest(path, file_name, inline_byte, xline_byte, target, record_id, overwrite, parent_id=None):
+    _check_target(target, record_id, parent_id)
+    try:
+        summary = segy.scan(path, inline_byte, xline_byte)
+    except segy.SegyError as e:
+        raise HTTPException(status_code=422, detail=f"Not a readable SEG-Y file: {e}")
+    fields = _catalog_fields(summary, file_name)
+    response = {"file": file_name, "summary": summary, "fields": fields}
+    if record_id is not None:
+        try:
+            response["updated_rows"] = apply_fields(target, record_id, fields[target], overwrite, parent_id)
+        except mysql.connector.Error as err:
+            logger.error("MySQL Database Error in ingest apply_fields: %s", err)
+            raise HTTPException(status_code=500, detail=f"Database error: {err}")
+    return response
+
+@router.post("/segy")
+def upload_segy(
+    file: UploadFile = File(...),
+    subdir: Optional[str] = Form(None),
+    target: Optional[str] = Form(None),
+    record_id: Optional[str] = Form(None),
+    parent_id: Optional[str] = Form(None),
+    overwrite: bool = Form(False),
+):
+    """
+    Stores an uploaded SEG-Y file under the data root and extracts its
+    header values for the acquisition, processing and media forms.
+    With `target` and `record_id`, the values are also written into that
+    catalog row (empty columns only unless `overwrite`). The file of a media
+    record (with its `parent_id`) is stored where QC and footprints look for
+    it, media/<parent_id>/<record_id>.sgy; other uploads go under uploads/.
+    """
+    name = os.path.basename(file.filename or "")
+    if not name:
+        raise HTTPException(status_code=400, detail="Uploaded file has no name.")
+    _check_target(target, record_id, parent_id)
+    try:
+        if record_id is not None and TARGETS[target][3]:
+            extension = os.path.splitext(name)[1]
+            file_name = storage.media_path(
+                parent_id, record_id, extension if extension in storage.SEGY_EXTENSIONS else storage.SEGY_EXTENSIONS[0]
+            )
+        else:
+            file_name = "/".join(part for part in (UPLOAD_DIR, (subdir or "").strip("/"), name) if part)
+        path = storage.resolve(file_name)
+    except storage.StoragePathError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if os.path.exists(path):
+        raise HTTPException(status_code=409, detail=f"A file named {file_name} already exists.")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = path + ".part"
+    try:
+        with open(partial, "wb") as out:
+            shutil.copyfileobj(file.file, out, COPY_BUFFER_SIZE)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+    try:
+        return _ingest(path, file_name, None, None, target, record_id, overwrite, parent_id)
+    except HTTPException as e:
+        if e.status_code in (400, 422):
+            os.remove(path) # Don't keep files we refused to catalog
+        raise
+
+@router.post("/segy/scan")
+def scan_segy(request: SegyScanRequest):
+    """
+    Extracts header values from a SEG-Y file already stored under the data
+    root, optionally applying them to a catalog row.
+    """
+    try:
+        path = storage.resolve(request.file)
+    except storage.StoragePathError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="File not found.")
+    return _ingest(
+        path, request.file, request.inline_byte, request.xline_byte,
+        request.target, request.record_id, request.overwrite, request.parent_id,
+    )
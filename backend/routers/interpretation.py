@@ -1,65 +1,46 @@
-from fastapi import APIRouter, HTTPException
+import logging
+from typing import List
+from fastapi import APIRouter, HTTPException, Query
 import mysql.connector # Ensure mysql.connector is imported
 from database import get_interpretation_data_conn
+import versions
+import write_engine
+from single_flight import coalesce
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/interpretation", tags=["Interpretation"])
 
+INTERPRETATION_TABLE = write_engine.register(write_engine.TableDescriptor(
+    "interpretation_data",
+    get_interpretation_data_conn,
+    [
+        "myindex", "version", "projTitle", "sbasin", "blockName", "blockType",
+        "mygroup", "objective", "inputDataType", "appSwUsed", "interpretationYear",
+        "interpreter", "mediaDetails", "backupDetails", "file", "lkm", "sqm",
+        "submittedOn", "SubmittedBy", "receivedOn", "receivedBy", "survey_id",
+        "multi_volume", "multi_volume_details", "TypeOfData",
+    ],
+    aliases={"SubmittedBy": "submittedBy"},
+))
+
 @router.post("")
 def create_interpretation(data: dict):
-    conn = None
-    cursor = None
     try:
-        conn = get_interpretation_data_conn()
-        cursor = conn.cursor()
-
-        query = """
-            INSERT INTO interpretation_data (
-                myindex, version, projTitle, sbasin, blockName, blockType, mygroup,
-                objective, inputDataType, appSwUsed, interpretationYear, interpreter,
-                mediaDetails, backupDetails, file, lkm, sqm, submittedOn, SubmittedBy,
-                receivedOn, receivedBy, survey_id, multi_volume, multi_volume_details,
-                TypeOfData
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-
-        values = (
-            data["myindex"], data["version"], data["projTitle"], data["sbasin"],
-            data["blockName"], data["blockType"], data["mygroup"], data["objective"],
-            data["inputDataType"], data["appSwUsed"], data["interpretationYear"],
-            data["interpreter"], data["mediaDetails"], data["backupDetails"],
-            data["file"], data["lkm"], data["sqm"], data["submittedOn"],
-            data["submittedBy"], data["receivedOn"], data["receivedBy"],
-            data["survey_id"], data["multi_volume"], data["multi_volume_details"],
-            data["TypeOfData"]
-        )
-
-        cursor.execute(query, values)
-        conn.commit()
+        row = write_engine.insert_one(INTERPRETATION_TABLE, data)
+        versions.note_inserted("interpretation", [row])
         return {"message": "Interpretation data inserted successfully"}
-
-    except mysql.connector.Error as err:
-        # This will catch database-specific errors and print them clearly
-        print(f"MySQL Database Error in create_interpretation: {err}")
+    except write_engine.PayloadError as err:
+        raise HTTPException(status_code=422, detail=err.errors)
+    except mysql.connector.Error as err: # Catch specific MySQL errors
+        logger.error("MySQL Database Error in create_interpretation: %s", err)
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
-    except KeyError as ke:
-        # This will catch if a required key is missing from the incoming data
-        print(f"Missing data key in create_interpretation: {ke}")
-        raise HTTPException(status_code=400, detail=f"Missing data: {ke}. Please provide all required fields.")
     except Exception as e:
-        # Catch any other unexpected errors
-        print(f"Unexpected error in create_interpretation: {e}")
-        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
-
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+        logger.exception("Unexpected error in create_interpretation")
+        raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/count") # This will be /interpretation/count due to the prefix
-async def get_interpretation_count():
+@coalesce
+def get_interpretation_count():
     """
     Returns the total count of records in the 'interpretation_data' table.
     Connects to the 'interpretation_data' database.
@@ -73,10 +54,10 @@ async def get_interpretation_count():
         count = cursor.fetchone()[0]
         return {"count": count}
     except mysql.connector.Error as err:
-        print(f"Error in /interpretation/count: {err}")
+        logger.error("Error in /interpretation/count: %s", err)
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
     except Exception as e:
-        print(f"Unexpected error in /interpretation/count: {e}")
+        logger.exception("Unexpected error in /interpretation/count")
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
     finally:
         if cursor:
@@ -85,6 +66,7 @@ async def get_interpretation_count():
             conn.close()
 
 @router.get("/ids")
+@coalesce
 def get_interpretation_ids():
     """
     Fetches a list of all existing interpretation_ids from the interpretation_data table.
@@ -103,15 +85,29 @@ def get_interpretation_ids():
         return {"interpretation_ids": interpretation_ids} # This will return [] if no rows are found
     except mysql.connector.Error as err: # Broaden to catch any mysql.connector.Error
         # Log the error for debugging purposes
-        print(f"MySQL Database Error in get_interpretation_ids: {err}. Returning empty list gracefully.")
+        logger.warning("MySQL Database Error in get_interpretation_ids: %s. Returning empty list gracefully.", err)
         # Return an empty list to the frontend instead of raising a 500 error
         return {"interpretation_ids": []}
     except Exception as e:
         # This catches any other unexpected Python errors
-        print(f"Unexpected error in get_interpretation_ids: {e}")
+        logger.exception("Unexpected error in get_interpretation_ids")
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
     finally:
         if cursor:
             cursor.close()
         if conn:
             conn.close()
+
+@router.get("/latest")
+def get_latest_interpretation(
+    survey_id: List[str] = Query(..., max_length=versions.MAX_SURVEYS, description="Survey id; repeatable"),
+):
+    """
+    Returns the latest interpretation record of each given survey,
+    read through the interpretation_latest index in one query.
+    """
+    try:
+        return {"surveys": versions.latest("interpretation", survey_id)}
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in get_latest_interpretation: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
@@ -1,42 +1,63 @@
-from fastapi import APIRouter, HTTPException
+import logging
+from fastapi import APIRouter, HTTPException, Query
+import mysql.connector
 from database import get_interpretation_data_conn
+import dedup
+import media_updates
+import write_engine
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/interpretation-media", tags=["Interpretation Media"])
 
+INTERPRETATION_MEDIA_TABLE = write_engine.register(write_engine.TableDescriptor(
+    "interpretation_media_data",
+    get_interpretation_data_conn,
+    [
+        "integ_media_id", "survey_id", "integ_id", "BarCode", "MediaType",
+        "ContentsOfMedia", "DataFormat", "Rack", "Shelf", "Box", "Remarks",
+        "floor_location", "status", "dam_status", "org_cart_number",
+        "archival_media_id", "transcrp_tape_yn", "transcrp_yr", "transcribed_by_wc",
+        "date_cat", "catalog_by", "original_copy",
+    ],
+))
+
 @router.post("")
-def create_interpretation_media(data: dict):
+def create_interpretation_media(
+    data: dict,
+    reject_duplicates: bool = Query(False, description="Refuse (409) a cartridge that is already catalogued"),
+):
+    """
+    Inserts one media row. Rows already catalogued under one of its
+    identifiers (in any of the three media tables) are listed in
+    `duplicates`, or refuse the insert with reject_duplicates.
+    """
+    duplicates = dedup.check("interpretation", data)
+    if duplicates and reject_duplicates:
+        raise HTTPException(status_code=409, detail={"message": "Cartridge already catalogued", "matches": duplicates})
     try:
-        conn = get_interpretation_data_conn()
-        cursor = conn.cursor()
-
-        query = """
-            INSERT INTO interpretation_media_data (
-                integ_media_id, survey_id, integ_id, BarCode, MediaType, ContentsOfMedia,
-                DataFormat, Rack, Shelf, Box, Remarks, floor_location, status, dam_status,
-                org_cart_number, archival_media_id, transcrp_tape_yn, transcrp_yr,
-                transcribed_by_wc, date_cat, catalog_by, original_copy
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                    %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-
-        values = (
-            data["integ_media_id"], data["survey_id"], data["integ_id"], data["BarCode"],
-            data["MediaType"], data["ContentsOfMedia"], data["DataFormat"], data["Rack"],
-            data["Shelf"], data["Box"], data["Remarks"], data["floor_location"],
-            data["status"], data["dam_status"], data["org_cart_number"],
-            data["archival_media_id"], data["transcrp_tape_yn"], data["transcrp_yr"],
-            data["transcribed_by_wc"], data["date_cat"], data["catalog_by"],
-            data["original_copy"]
-        )
-
-        cursor.execute(query, values)
-        conn.commit()
-        return {"message": "Interpretation media data inserted successfully"}
-
+        write_engine.insert_one(INTERPRETATION_MEDIA_TABLE, data)
+        dedup.register("interpretation", [data])
+        return {"message": "Interpretation media data inserted successfully", "duplicates": duplicates}
+    except write_engine.PayloadError as err:
+        raise HTTPException(status_code=422, detail=err.errors)
+    except mysql.connector.Error as err: # Catch specific MySQL errors
+        logger.error("MySQL Database Error in create_interpretation_media: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
     except Exception as e:
+        logger.exception("Unexpected error in create_interpretation_media")
         raise HTTPException(status_code=500, detail=str(e))
 
-    finally:
-        cursor.close()
-        conn.close()
+@router.patch("/bulk")
+def bulk_update_interpretation_media(request: media_updates.BulkUpdateRequest):
+    """
+    Applies the same lifecycle changes (status, QC, transcription, location)
+    to every interpretation_media_data row the selector matches, in chunks; returns
+    the rows matched and changed. With dry_run only the match is counted.
+    """
+    try:
+        return media_updates.bulk_update("interpretation", INTERPRETATION_MEDIA_TABLE, request)
+    except write_engine.PayloadError as err:
+        raise HTTPException(status_code=422, detail=err.errors)
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in bulk_update_interpretation_media: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
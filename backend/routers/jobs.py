@@ -0,0 +1,100 @@
+import logging
+import os
+from typing import Any, Dict, Optional
+
+import mysql.connector
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import FileResponse
+from pydantic import BaseModel
+
+import jobs
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+class JobSubmission(BaseModel):
+    kind: str
+    params: Dict[str, Any] = {}
+    submitted_by: Optional[str] = None
+
+@router.post("", status_code=status.HTTP_202_ACCEPTED)
+def submit_job(submission: JobSubmission):
+    """
+    Queues a background job and returns its ID immediately.
+    Poll GET /jobs/{job_id} for progress and fetch the output from
+    GET /jobs/{job_id}/result once it has succeeded.
+    """
+    try:
+        jobs.validate_params(submission.kind, submission.params)
+    except KeyError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown job kind. Allowed kinds: {', '.join(sorted(jobs.TASKS))}"
+        )
+    except TypeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid job parameters: {e}")
+
+    try:
+        job_id = jobs.submit(submission.kind, submission.params, submission.submitted_by)
+        return {"job_id": job_id, "status": "queued"}
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in submit_job: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+
+@router.get("")
+def list_jobs(
+    status: Optional[str] = Query(None, description="Filter by job status"),
+    kind: Optional[str] = Query(None, description="Filter by job kind"),
+    limit: int = Query(50, ge=1, le=500),
+):
+    try:
+        return {"jobs": jobs.list_jobs(status, kind, limit)}
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in list_jobs: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+
+@router.get("/{job_id}")
+def get_job(job_id: int):
+    """
+    Returns the job's status, progress and (small) result.
+    """
+    try:
+        job = jobs.get_job(job_id)
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in get_job: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+@router.get("/{job_id}/result")
+def get_job_result(job_id: int):
+    """
+    Downloads the job's result file, or returns its JSON result when the
+    task produced no file.
+    """
+    try:
+        job = jobs.get_job(job_id)
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in get_job_result: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if job["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job has no result yet. Current status: {job['status']}")
+    if job["result_path"]:
+        if not os.path.isfile(job["result_path"]):
+            raise HTTPException(status_code=410, detail="Result file is no longer available.")
+        return FileResponse(job["result_path"], filename=os.path.basename(job["result_path"]))
+    return job["result"]
+
+@router.post("/{job_id}/cancel")
+def cancel_job(job_id: int):
+    try:
+        job = jobs.request_cancel(job_id)
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in cancel_job: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
@@ -0,0 +1,68 @@
+import json
+import logging
+from typing import List, Optional
+
+import mysql.connector
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+import dedup
+import jobs
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/media", tags=["Media"])
+
+class RebuildRequest(BaseModel):
+    submitted_by: Optional[str] = None
+
+@router.get("/lookup")
+def lookup_media(identifier: List[str] = Query(..., description="Cart number, archival id or barcode; repeatable")):
+    """
+    Is this cartridge already catalogued? Returns every acquisition, processing
+    and interpretation media row carrying any of the identifiers, however
+    they were spelled.
+    """
+    try:
+        return {
+            "identifiers": sorted({value for value in map(dedup.normalize, identifier) if value}),
+            "matches": dedup.lookup(identifier),
+        }
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in lookup_media: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+
+@router.get("/duplicates")
+def get_duplicate_report(
+    cross_catalog_only: bool = Query(False, description="Only identifiers shared across acquisition, processing and interpretation"),
+):
+    """
+    Streams the duplicate report as NDJSON: one line per identifier carried
+    by more than one media row, produced in one pass over the identifier index.
+    """
+    report = dedup.duplicate_report(cross_catalog_only)
+    try:
+        # Runs the query now so database errors become a 500, not a cut stream.
+        first = next(report, None)
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in get_duplicate_report: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+
+    def lines():
+        if first is None:
+            return
+        yield json.dumps(first, default=str) + "\n"
+        for group in report:
+            yield json.dumps(group, default=str) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.post("/dedup-index/rebuild", status_code=status.HTTP_202_ACCEPTED)
+def rebuild_dedup_index(request: RebuildRequest):
+    """Queues a rebuild of the identifier index outside the regular schedule."""
+    try:
+        job_id = jobs.submit("rebuild_media_index", {}, request.submitted_by)
+        return {"job_id": job_id, "status": "queued"}
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in rebuild_dedup_index: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
@@ -1,58 +1,47 @@
-from fastapi import APIRouter, HTTPException
+import logging
+from typing import List
+from fastapi import APIRouter, HTTPException, Query
 import mysql.connector # Ensure mysql.connector is imported
 from database import get_processing_data_conn
+import versions
+import write_engine
+from single_flight import coalesce
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/processing", tags=["Processing"])
 
+PROCESSING_TABLE = write_engine.register(write_engine.TableDescriptor(
+    "processing_data",
+    get_processing_data_conn,
+    [
+        "survey_id", "processing_id", "version", "data_processed_by",
+        "processing_year", "processing_centre_name", "received_from",
+        "date_of_receiving", "processing_software", "bin_size", "sampling_interval",
+        "fold", "record_length", "multi_volume", "multi_volume_details",
+        "reprocessing_done", "proc_issued", "proc_issue_date", "proc_issue_details",
+        "processing_type", "file_name", "file_size", "file_type", "file_content",
+        "remarks",
+    ],
+))
+
 @router.post("")
 def create_processing(data: dict):
     try:
-        conn = get_processing_data_conn()
-        cursor = conn.cursor()
-
-        query = """
-            INSERT INTO processing_data (
-                survey_id, processing_id, version, data_processed_by, processing_year,
-                processing_centre_name, received_from, date_of_receiving,
-                processing_software, bin_size, sampling_interval, fold,
-                record_length, multi_volume, multi_volume_details, reprocessing_done,
-                proc_issued, proc_issue_date, proc_issue_details, processing_type,
-                file_name, file_size, file_type, file_content, remarks
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                    %s, %s, %s, %s, %s, %s, %s,
-                    %s, %s, %s, %s, %s)
-        """
-
-        values = (
-            data["survey_id"], data["processing_id"], data["version"], data["data_processed_by"],
-            data["processing_year"], data["processing_centre_name"], data["received_from"],
-            data["date_of_receiving"], data["processing_software"], data["bin_size"],
-            data["sampling_interval"], data["fold"], data["record_length"],
-            data["multi_volume"], data["multi_volume_details"], data["reprocessing_done"],
-            data["proc_issued"], data["proc_issue_date"], data["proc_issue_details"],
-            data["processing_type"], data["file_name"], data["file_size"],
-            data["file_type"], data["file_content"], data["remarks"]
-        )
-
-        cursor.execute(query, values)
-        conn.commit()
+        row = write_engine.insert_one(PROCESSING_TABLE, data)
+        versions.note_inserted("processing", [row])
         return {"message": "Processing data inserted successfully"}
-
+    except write_engine.PayloadError as err:
+        raise HTTPException(status_code=422, detail=err.errors)
     except mysql.connector.Error as err: # Catch specific MySQL errors
-        print(f"MySQL Database Error in create_processing: {err}")
+        logger.error("MySQL Database Error in create_processing: %s", err)
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
     except Exception as e:
-        print(f"Unexpected error in create_processing: {e}")
+        logger.exception("Unexpected error in create_processing")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 @router.get("/count") # This will be /processing/count due to the prefix
-async def get_processing_count():
+@coalesce
+def get_processing_count():
     """
     Returns the total count of records in the 'processing_data' table.
     Connects to the 'processing_data' database.
@@ -66,10 +55,10 @@ async def get_processing_count():
         count = cursor.fetchone()[0]
         return {"count": count}
     except mysql.connector.Error as err:
-        print(f"Error in /processing/count: {err}")
+        logger.error("Error in /processing/count: %s", err)
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
     except Exception as e:
-        print(f"Unexpected error in /processing/count: {e}")
+        logger.exception("Unexpected error in /processing/count")
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
     finally:
         if cursor:
@@ -78,6 +67,7 @@ async def get_processing_count():
             conn.close()
 
 @router.get("/ids")
+@coalesce
 def get_processing_ids():
     """
     Fetches a list of all existing processing_ids from the processing_data table.
@@ -101,13 +91,27 @@ def get_processing_ids():
         # If the goal is to *always* return 200 OK with an empty list on no data,
         # then the try-except should be around the fetchall() and return [] on error.
         # However, a 500 indicates a deeper problem (e.g., table doesn't exist).
-        print(f"MySQL Database Error in get_processing_ids: {err}")
+        logger.error("MySQL Database Error in get_processing_ids: %s", err)
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
     except Exception as e:
-        print(f"Unexpected error in get_processing_ids: {e}")
+        logger.exception("Unexpected error in get_processing_ids")
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
     finally:
         if cursor:
             cursor.close()
         if conn:
             conn.close()
+
+@router.get("/latest")
+def get_latest_processing(
+    survey_id: List[str] = Query(..., max_length=versions.MAX_SURVEYS, description="Survey id; repeatable"),
+):
+    """
+    Returns the latest version of every processing_id of the given surveys,
+    read through the processing_latest index in one query.
+    """
+    try:
+        return {"surveys": versions.latest("processing", survey_id)}
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in get_latest_processing: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
@@ -1,80 +1,135 @@
-from fastapi import APIRouter, HTTPException
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
 import mysql.connector # Ensure mysql.connector is imported
 from database import get_field_data_conn, get_processing_data_conn # Keep both imports
+import dedup
+import media_updates
+import partitions
+import write_engine
+from single_flight import coalesce
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/processing-media", tags=["Processing Media"])
 
+PROCESSING_MEDIA_TABLE = write_engine.register(write_engine.TableDescriptor(
+    "processing_media_data",
+    get_processing_data_conn,
+    [
+        "pro_serial_num", "processing_id", "processing_media_id",
+        "pre_post_identifier", "cart_number", "org_cart_number", "line_name",
+        "file_seq_no", "fcdp", "lcdp", "fsp", "lsp", "first_inline", "last_inline",
+        "first_xline", "last_xline", "floor_location", "box", "rack", "shelf",
+        "date_cat", "data_type", "data_format", "catalog_by", "media_type",
+        "original_copy", "archival_media_id", "remarks", "qc_done_yes_no",
+        "qc_done_by", "status", "dam_status", "transcrp_tape_yn", "transcrp_yr",
+        "transcribed_by_wc",
+    ],
+))
+
 @router.post("")
-def create_processing_media(data: dict):
+def create_processing_media(
+    data: dict,
+    reject_duplicates: bool = Query(False, description="Refuse (409) a cartridge that is already catalogued"),
+):
+    """
+    Inserts one media row. Rows already catalogued under one of its
+    identifiers (in any of the three media tables) are listed in
+    `duplicates`, or refuse the insert with reject_duplicates.
+    """
+    duplicates = dedup.check("processing", data)
+    if duplicates and reject_duplicates:
+        raise HTTPException(status_code=409, detail={"message": "Cartridge already catalogued", "matches": duplicates})
     try:
-        conn = get_processing_data_conn() # Correctly uses processing_data_conn
-        cursor = conn.cursor()
-
-        query = """
-            INSERT INTO processing_media_data (
-                pro_serial_num, processing_id, processing_media_id, pre_post_identifier,
-                cart_number, org_cart_number, line_name, file_seq_no, fcdp, lcdp, fsp,
-                lsp, first_inline, last_inline, first_xline, last_xline, floor_location,
-                box, rack, shelf, date_cat, data_type, data_format, catalog_by,
-                media_type, original_copy, archival_media_id, remarks, qc_done_yes_no,
-                qc_done_by, status, dam_status, transcrp_tape_yn, transcrp_yr,
-                transcribed_by_wc
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                    %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-
-        values = (
-            data["pro_serial_num"], data["processing_id"], data["processing_media_id"],
-            data["pre_post_identifier"], data["cart_number"], data["org_cart_number"],
-            data["line_name"], data["file_seq_no"], data["fcdp"], data["lcdp"],
-            data["fsp"], data["lsp"], data["first_inline"], data["last_inline"],
-            data["first_xline"], data["last_xline"], data["floor_location"],
-            data["box"], data["rack"], data["shelf"], data["date_cat"],
-            data["data_type"], data["data_format"], data["catalog_by"],
-            data["media_type"], data["original_copy"], data["archival_media_id"],
-            data["remarks"], data["qc_done_yes_no"], data["qc_done_by"],
-            data["status"], data["dam_status"], data["transcrp_tape_yn"],
-            data["transcrp_yr"], data["transcribed_by_wc"]
-        )
-
-        cursor.execute(query, values)
-        conn.commit()
-        return {"message": "Processing media data inserted successfully"}
-
+        write_engine.insert_one(PROCESSING_MEDIA_TABLE, data)
+        dedup.register("processing", [data])
+        return {"message": "Processing media data inserted successfully", "duplicates": duplicates}
+    except write_engine.PayloadError as err:
+        raise HTTPException(status_code=422, detail=err.errors)
+    except mysql.connector.Error as err: # Catch specific MySQL errors
+        logger.error("MySQL Database Error in create_processing_media: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
     except Exception as e:
+        logger.exception("Unexpected error in create_processing_media")
         raise HTTPException(status_code=500, detail=str(e))
 
-    finally:
-        if cursor: # Added check for cursor existence
-            cursor.close()
-        if conn: # Added check for conn existence
-            conn.close()
-
 @router.get("/count")
-async def get_processing_media_count():
+@coalesce
+def get_processing_media_count(
+    processing_id: Optional[str] = Query(None, description="Only media of this processing"),
+    survey_id: Optional[str] = Query(None, description="Only media of this survey's processings"),
+):
     """
-    Returns the total count of records in the 'processing_media_data' table.
-    Connects to the 'processing_data' database.
+    Returns the number of processing_media_data rows, optionally for one processing
+    or survey. Filters are applied to the partition column so only the
+    matching partitions are read.
     """
-    conn = None # Initialize conn to None
-    cursor = None # Initialize cursor to None
+    conn = None
+    cursor = None
     try:
-        # FIX: Changed to get_processing_data_conn() to match where data is inserted
         conn = get_processing_data_conn()
         cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM processing_media_data")
+        condition, params = partitions.scope_filter(cursor, "processing", processing_id, survey_id)
+        cursor.execute(f"SELECT COUNT(*) FROM processing_media_data WHERE {condition}", params)
         count = cursor.fetchone()[0]
         return {"count": count}
     except mysql.connector.Error as err:
-        print(f"Error in /processing-media/count: {err}")
+        logger.error("Error in /processing-media/count: %s", err)
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
     except Exception as e:
-        print(f"Unexpected error in /processing-media/count: {e}")
+        logger.exception("Unexpected error in /processing-media/count")
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
     finally:
         if cursor:
             cursor.close()
         if conn:
             conn.close()
+
+@router.get("")
+def list_processing_media(
+    processing_id: Optional[str] = Query(None, description="Media of this processing"),
+    survey_id: Optional[str] = Query(None, description="Media of this survey's processings"),
+    limit: int = Query(1000, ge=1, le=10000),
+    offset: int = Query(0, ge=0),
+):
+    """
+    Lists processing_media_data rows of one processing or survey. A filter is
+    required: an unscoped listing would read every partition.
+    """
+    if processing_id is None and survey_id is None:
+        raise HTTPException(status_code=400, detail="Give processing_id or survey_id.")
+    conn = None
+    cursor = None
+    try:
+        conn = get_processing_data_conn()
+        cursor = conn.cursor(dictionary=True)
+        condition, params = partitions.scope_filter(cursor, "processing", processing_id, survey_id)
+        cursor.execute(
+            f"SELECT * FROM processing_media_data WHERE {condition} ORDER BY processing_id, processing_media_id LIMIT %s OFFSET %s",
+            [*params, limit, offset],
+        )
+        return {"media": cursor.fetchall()}
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in list_processing_media: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+@router.patch("/bulk")
+def bulk_update_processing_media(request: media_updates.BulkUpdateRequest):
+    """
+    Applies the same lifecycle changes (status, QC, transcription, location)
+    to every processing_media_data row the selector matches, in chunks; returns
+    the rows matched and changed. With dry_run only the match is counted.
+    """
+    try:
+        return media_updates.bulk_update("processing", PROCESSING_MEDIA_TABLE, request)
+    except write_engine.PayloadError as err:
+        raise HTTPException(status_code=422, detail=err.errors)
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in bulk_update_processing_media: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
@@ -0,0 +1,59 @@
+import logging
+from typing import Optional
+
+import mysql.connector
+from fastapi import APIRouter, HTTPException, status
+from pydantic import BaseModel
+
+import jobs
+import qc
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/qc", tags=["Quality Control"])
+
+class SurveyQCRequest(BaseModel):
+    target: str = "acquisition" # "acquisition" or "processing" media
+    qc_by: str = "auto-qc"
+    submitted_by: Optional[str] = None
+
+def _check_target(target):
+    if target not in qc.TARGETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid QC target. Allowed targets: {', '.join(qc.TARGETS)}"
+        )
+
+@router.post("/surveys/{survey_id}", status_code=status.HTTP_202_ACCEPTED)
+def run_survey_qc(survey_id: str, request: SurveyQCRequest):
+    """
+    Queues an automatic QC pass over every stored SEG-Y file of a survey.
+    Track it with GET /jobs/{job_id}; each media row's qc_done fields and
+    status are filled in as its file is checked.
+    """
+    _check_target(request.target)
+    try:
+        job_id = jobs.submit(
+            "survey_qc",
+            {"survey_id": survey_id, "target": request.target, "qc_by": request.qc_by},
+            request.submitted_by,
+        )
+        return {"job_id": job_id, "status": "queued"}
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in run_survey_qc: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+
+@router.get("/media/{target}/{parent_id}/{media_id}")
+def get_media_qc(target: str, parent_id: str, media_id: str):
+    """
+    Returns the latest automatic QC result recorded for one media row,
+    identified by its acquisition or processing id and its media id.
+    """
+    _check_target(target)
+    try:
+        result = qc.get_result(target, parent_id, media_id)
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in get_media_qc: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+    if result is None:
+        raise HTTPException(status_code=404, detail="No QC result recorded for this media.")
+    return result
@@ -1,13 +1,24 @@
+import logging
 import mysql.connector
-from fastapi import APIRouter, HTTPException, Depends, Query
+from concurrent.futures import TimeoutError as RenderTimeout
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import json
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 
 # Import your database connection utility
 from database import get_field_data_conn # Assuming your database.py is in the backend root
-
+import archive
+import cache
+import jobs
+import profiling
+import requisition_pdf
+from config import PDF_MAX_BATCH_FORMS
+from single_flight import flights
+
+logger = logging.getLogger(__name__)
 router = APIRouter(
     prefix="/requisitions",
     tags=["requisitions"],
@@ -58,81 +69,190 @@ class ApprovalRequest(BaseModel):
     approver_id: str
     comments: Optional[str] = None
 
+# dataTypes/slNoData rows live in child tables so they can be indexed and
+# filtered on; the JSON columns are still written for older readers.
+DATA_TYPE_COLUMNS = (
+    ("slNo", "sl_no"), ("typeOfData", "type_of_data"), ("slNoRequired", "sl_no_required"),
+    ("dataObserver", "data_observer"), ("projectObjective", "project_objective"), ("remarks", "remarks"),
+)
+SL_NO_DATA_COLUMNS = (
+    ("slNo", "sl_no"), ("description", "description"), ("mobileNo", "mobile_no"),
+    ("designation", "designation"),
+)
+CHILD_TABLES = (
+    ("dataTypes", "requisition_data_types", DATA_TYPE_COLUMNS),
+    ("slNoData", "requisition_sl_no_data", SL_NO_DATA_COLUMNS),
+)
+
+# Roles whose requisition list depends on the requesting user's ID.
+USER_SCOPED_ROLES = ("data_entry", "read_only_l1", "read_only_l2", "read_only_l3")
+
+# Roles that print a day's approvals for signing.
+APPROVER_ROLES = ("admin", "read_only_l2", "read_only_l3")
+
+def write_requisition_children(cursor, requisition_id, data_types, sl_no_data, ignore=False):
+    """Inserts a requisition's child rows (lists of dicts keyed like the API) without committing."""
+    for items, (_, table, columns) in zip((data_types, sl_no_data), CHILD_TABLES):
+        if not items:
+            continue
+        cursor.executemany(
+            "INSERT %sINTO %s (requisition_id, position, %s) VALUES (%s)" % (
+                "IGNORE " if ignore else "", table, ", ".join(column for _, column in columns),
+                ", ".join(["%s"] * (len(columns) + 2)),
+            ),
+            [
+                (requisition_id, position, *(item.get(key) for key, _ in columns))
+                for position, item in enumerate(items)
+            ],
+        )
+
+def _attach_children(cursor, requisitions):
+    """Fills dataTypes/slNoData for a list of requisition rows, one query per child table."""
+    by_id = {req['id']: req for req in requisitions}
+    for req in requisitions:
+        req['dataTypes'], req['slNoData'] = [], []
+    if not by_id:
+        return
+    placeholders = ", ".join(["%s"] * len(by_id))
+    for key, table, columns in CHILD_TABLES:
+        cursor.execute(
+            "SELECT requisition_id, %s FROM %s WHERE requisition_id IN (%s) ORDER BY requisition_id, position"
+            % (", ".join(column for _, column in columns), table, placeholders),
+            list(by_id),
+        )
+        for row in cursor.fetchall():
+            by_id[row['requisition_id']][key].append({name: row[column] for name, column in columns})
+
+def _format_requisition(req):
+    """Maps a requisition_forms row (with children attached) to the API shape, in place."""
+    # Format datetime objects to ISO strings for JSON serialization
+    req['dateOfRequisition'] = req['date_of_requisition'].isoformat() if req.get('date_of_requisition') else None
+    req['l2_approval_date'] = req['l2_approval_date'].isoformat() if req.get('l2_approval_date') else None
+    req['l3_approval_date'] = req['l3_approval_date'].isoformat() if req.get('l3_approval_date') else None
+    req['created_at'] = req['created_at'].isoformat() if req.get('created_at') else None
+
+    # Map SQL column names to frontend camelCase
+    req['projectDistrict'] = req.pop('project_district')
+    req['preparedBySignature'] = req.pop('prepared_by_signature')
+    req['preparedByDesignation'] = req.pop('prepared_by_designation')
+    req['groupCoordinatorSignature'] = req.pop('group_coordinator_signature')
+    req['groupCoordinatorDesignation'] = req.pop('group_coordinator_designation')
+
+    # Remove raw JSON fields
+    req.pop('data_types_json', None)
+    req.pop('sl_no_data_json', None)
+    return req
+
+def _fetch_requisition(cursor, requisition_id):
+    """Reads one requisition in API shape, or None."""
+    cursor.execute("SELECT * FROM requisition_forms WHERE id = %s", (requisition_id,))
+    requisition = cursor.fetchone()
+    if not requisition:
+        return None
+    _attach_children(cursor, [requisition])
+    return _format_requisition(requisition)
+
+
 @router.get("/", response_model=List[RequisitionFormResponse])
 async def get_all_requisitions(
     user_role: str = Query(..., description="Role of the requesting user"),
-    user_id: str = Query(..., description="ID of the requesting user")
+    user_id: str = Query(..., description="ID of the requesting user"),
+    type_of_data: Optional[str] = Query(None, description="Only forms requesting this typeOfData"),
+    data_observer: Optional[str] = Query(None, description="Only forms with this dataObserver"),
+    status: Optional[str] = Query(None, description="Only forms in this approval status"),
+    include_archived: bool = Query(False, description="Also search finalised forms moved to the archive")
 ):
     """
-    Fetches requisition forms based on the user's role and approval status.
+    Fetches requisition forms based on the user's role and approval status,
+    optionally narrowed by requested data type, data observer or status.
+    Only forms in the hot table are listed unless include_archived is set.
+    Identical concurrent requests share one query.
     """
+    # The user only matters for roles whose view depends on it, so e.g. every
+    # admin opening the list at once shares a single query.
+    key_user = user_id if user_role in USER_SCOPED_ROLES else None
+    key = ("requisitions", user_role, key_user, type_of_data, data_observer, status, include_archived)
+    return await flights.do(
+        key, lambda: _list_requisitions(user_role, user_id, type_of_data, data_observer, status, include_archived)
+    )
+
+def _visibility_filter(user_role, user_id):
+    """(condition, params) for the forms a role may list; uses only columns the archive also has."""
+    if user_role == "admin":
+        # Admin sees all forms
+        return "TRUE", []
+    elif user_role == "data_entry":
+        # Data Entry (L1) sees all forms they submitted
+        return "requester_user_id = %s", [user_id]
+    elif user_role == "read_only_l2":
+        # Level 2 sees forms pending their approval, and those they have approved/declined
+        return "(current_approval_status = 'Pending_L2_Approval' OR l2_approver_id = %s)", [user_id]
+    elif user_role == "read_only_l3":
+        # Level 3 sees forms approved by L2, and those they have approved/declined
+        return "(current_approval_status = 'L2_Approved' OR l3_approver_id = %s)", [user_id]
+    elif user_role == "read_only_l1":
+        # Read-Only Level 1 sees only forms they submitted, regardless of final status
+        return "requester_user_id = %s", [user_id]
+    else:
+        # For any other roles, return nothing or only fully approved ones
+        # This case might need refinement based on exact requirements for unmapped roles
+        return "current_approval_status = 'L3_Approved'", [] # Default for unknown roles
+
+def _search_archive(cursor, condition, params, type_of_data, data_observer):
+    """Archived forms visible under `condition`; data type filters are applied to the decoded forms."""
+    forms = archive.search(cursor, condition, params)
+    if type_of_data is not None:
+        forms = [form for form in forms if any(dt.get("typeOfData") == type_of_data for dt in form["dataTypes"])]
+    if data_observer is not None:
+        forms = [form for form in forms if any(dt.get("dataObserver") == data_observer for dt in form["dataTypes"])]
+    return forms
+
+def _list_requisitions(user_role, user_id, type_of_data, data_observer, status, include_archived=False):
     conn = None
     cursor = None
     try:
         conn = get_field_data_conn()
         cursor = conn.cursor(dictionary=True) # Return results as dictionaries
 
-        query = "SELECT * FROM requisition_forms WHERE 1=1"
-        params = []
-
-        if user_role == "admin":
-            # Admin sees all forms
-            pass
-        elif user_role == "data_entry":
-            # Data Entry (L1) sees all forms they submitted
-            query += " AND requester_user_id = %s"
-            params.append(user_id)
-        elif user_role == "read_only_l2":
-            # Level 2 sees forms pending their approval, and those they have approved/declined
-            query += " AND (current_approval_status = 'Pending_L2_Approval' OR l2_approver_id = %s)"
-            params.append(user_id)
-        elif user_role == "read_only_l3":
-            # Level 3 sees forms approved by L2, and those they have approved/declined
-            query += " AND (current_approval_status = 'L2_Approved' OR l3_approver_id = %s)"
-            params.append(user_id)
-        elif user_role == "read_only_l1":
-            # Read-Only Level 1 sees only forms they submitted, regardless of final status
-            query += " AND requester_user_id = %s"
-            params.append(user_id)
-        else:
-            # For any other roles, return nothing or only fully approved ones
-            # This case might need refinement based on exact requirements for unmapped roles
-            query += " AND current_approval_status = 'L3_Approved'" # Default for unknown roles
+        visible, params = _visibility_filter(user_role, user_id)
+        query = f"SELECT * FROM requisition_forms WHERE {visible}"
+        params = list(params)
+
+        if type_of_data is not None:
+            query += " AND EXISTS (SELECT 1 FROM requisition_data_types d WHERE d.requisition_id = requisition_forms.id AND d.type_of_data = %s)"
+            params.append(type_of_data)
+        if data_observer is not None:
+            query += " AND EXISTS (SELECT 1 FROM requisition_data_types d WHERE d.requisition_id = requisition_forms.id AND d.data_observer = %s)"
+            params.append(data_observer)
+        if status is not None:
+            query += " AND current_approval_status = %s"
+            params.append(status)
 
         query += " ORDER BY created_at DESC"
-        cursor.execute(query, params)
-        requisitions = cursor.fetchall()
-
-        # Deserialize JSON fields and format dates
-        for req in requisitions:
-            req['dataTypes'] = json.loads(req['data_types_json']) if req.get('data_types_json') else []
-            req['slNoData'] = json.loads(req['sl_no_data_json']) if req.get('sl_no_data_json') else []
-
-            # Format datetime objects to ISO strings for JSON serialization
-            req['dateOfRequisition'] = req['date_of_requisition'].isoformat() if req.get('date_of_requisition') else None
-            req['l2_approval_date'] = req['l2_approval_date'].isoformat() if req.get('l2_approval_date') else None
-            req['l3_approval_date'] = req['l3_approval_date'].isoformat() if req.get('l3_approval_date') else None
-            req['created_at'] = req['created_at'].isoformat() if req.get('created_at') else None
-
-            # Map SQL column names to frontend camelCase
-            req['projectDistrict'] = req.pop('project_district')
-            req['preparedBySignature'] = req.pop('prepared_by_signature')
-            req['preparedByDesignation'] = req.pop('prepared_by_designation')
-            req['groupCoordinatorSignature'] = req.pop('group_coordinator_signature')
-            req['groupCoordinatorDesignation'] = req.pop('group_coordinator_designation')
-            req['requester_user_id'] = req.pop('requester_user_id')
-            req['current_approval_status'] = req.pop('current_approval_status')
-            req['l2_approver_id'] = req.pop('l2_approver_id')
-            req['l2_comments'] = req.pop('l2_comments')
-            req['l3_approver_id'] = req.pop('l3_approver_id')
-            req['l3_comments'] = req.pop('l3_comments')
-
-            # Remove raw JSON fields
-            req.pop('data_types_json', None)
-            req.pop('sl_no_data_json', None)
+        with profiling.phase("db query"):
+            cursor.execute(query, params)
+            requisitions = cursor.fetchall()
+            _attach_children(cursor, requisitions)
+
+        with profiling.phase("row mapping"):
+            for req in requisitions:
+                _format_requisition(req)
+
+        if include_archived:
+            condition, archive_params = _visibility_filter(user_role, user_id)
+            if status is not None:
+                condition += " AND current_approval_status = %s"
+                archive_params = [*archive_params, status]
+            with profiling.phase("archive search"):
+                archived = _search_archive(cursor, condition, archive_params, type_of_data, data_observer)
+            # Both lists are newest first with created_at as ISO strings; merge.
+            requisitions = sorted(
+                requisitions + archived, key=lambda req: req.get("created_at") or "", reverse=True
+            )
 
         return requisitions
     except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in _list_requisitions: %s", err)
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
     finally:
         if cursor:
@@ -140,58 +260,152 @@ async def get_all_requisitions(
         if conn:
             conn.close()
 
+@router.get("/archive/stats")
+def get_archive_stats():
+    """Hot vs archived form counts and the archive's compressed size."""
+    try:
+        return archive.stats()
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in get_archive_stats: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+
+@router.post("/archive", status_code=202)
+def run_archive(
+    user_role: str = Query(..., description="Role of the requesting user"),
+    user_id: str = Query(..., description="ID of the requesting user"),
+    older_than_days: Optional[int] = Query(None, ge=0, description="Defaults to ARCHIVE_AFTER_DAYS"),
+):
+    """Queues an archive run now instead of waiting for the schedule. Admin only."""
+    if user_role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can archive requisitions.")
+    try:
+        job_id = jobs.submit("archive_requisitions", {"older_than_days": older_than_days}, submitted_by=user_id)
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in run_archive: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+    return {"job_id": job_id, "status": "queued"}
+
+def _load_requisition(requisition_id):
+    conn = get_field_data_conn()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        # Finalised forms may have moved to the archive.
+        return _fetch_requisition(cursor, requisition_id) or archive.load(cursor, requisition_id)
+    finally:
+        cursor.close()
+        conn.close()
+
+def warm_cache():
+    """
+    Preloads the requisition cache with the newest forms, those still being
+    reviewed and approved (start-up warm-up); returns the number of forms.
+    """
+    conn = get_field_data_conn()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT * FROM requisition_forms ORDER BY id DESC LIMIT %s", (cache.requisitions.max_entries,))
+        forms = cursor.fetchall()
+        _attach_children(cursor, forms)
+        return cache.requisitions.preload((form["id"], _format_requisition(form)) for form in forms)
+    finally:
+        cursor.close()
+        conn.close()
+
 # NEW: Endpoint to get a single requisition by ID
 @router.get("/{requisition_id}", response_model=RequisitionFormResponse)
-async def get_requisition_by_id(requisition_id: int):
+def get_requisition_by_id(requisition_id: int):
     """
-    Fetches a single requisition form by its ID.
+    Fetches a single requisition form by its ID (served from the read-through
+    cache; writes to the form invalidate it).
     """
-    conn = None
-    cursor = None
     try:
-        conn = get_field_data_conn()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM requisition_forms WHERE id = %s", (requisition_id,))
-        requisition = cursor.fetchone()
+        requisition = cache.requisitions.get(requisition_id, lambda: _load_requisition(requisition_id))
 
         if not requisition:
             raise HTTPException(status_code=404, detail="Requisition form not found.")
 
-        # Deserialize JSON fields and format dates
-        requisition['dataTypes'] = json.loads(requisition['data_types_json']) if requisition.get('data_types_json') else []
-        requisition['slNoData'] = json.loads(requisition['sl_no_data_json']) if requisition.get('sl_no_data_json') else []
-
-        # Format datetime objects to ISO strings for JSON serialization
-        requisition['dateOfRequisition'] = requisition['date_of_requisition'].isoformat() if requisition.get('date_of_requisition') else None
-        requisition['l2_approval_date'] = requisition['l2_approval_date'].isoformat() if requisition.get('l2_approval_date') else None
-        requisition['l3_approval_date'] = requisition['l3_approval_date'].isoformat() if requisition.get('l3_approval_date') else None
-        requisition['created_at'] = requisition['created_at'].isoformat() if requisition.get('created_at') else None
-
-        # Map SQL column names to frontend camelCase
-        requisition['projectDistrict'] = requisition.pop('project_district')
-        requisition['preparedBySignature'] = requisition.pop('prepared_by_signature')
-        requisition['preparedByDesignation'] = requisition.pop('prepared_by_designation')
-        requisition['groupCoordinatorSignature'] = requisition.pop('group_coordinator_signature')
-        requisition['groupCoordinatorDesignation'] = requisition.pop('group_coordinator_designation')
-        requisition['requester_user_id'] = requisition.pop('requester_user_id')
-        requisition['current_approval_status'] = requisition.pop('current_approval_status')
-        requisition['l2_approver_id'] = requisition.pop('l2_approver_id')
-        requisition['l2_comments'] = requisition.pop('l2_comments')
-        requisition['l3_approver_id'] = requisition.pop('l3_approver_id')
-        requisition['l3_comments'] = requisition.pop('l3_comments')
-
-        # Remove raw JSON fields
-        requisition.pop('data_types_json', None)
-        requisition.pop('sl_no_data_json', None)
-
         return requisition
     except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in get_requisition_by_id: %s", err)
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
+
+def _approved_on(day):
+    """Forms given an L2 or L3 approval on `day`, in id order (hot table only: archived forms are months old)."""
+    conn = get_field_data_conn()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        start = datetime.combine(day, datetime.min.time())
+        end = start + timedelta(days=1)
+        cursor.execute(
+            "SELECT * FROM requisition_forms "
+            "WHERE (l2_approval_date >= %s AND l2_approval_date < %s AND current_approval_status <> 'L2_Declined') "
+            "OR (l3_approval_date >= %s AND l3_approval_date < %s AND current_approval_status = 'L3_Approved') "
+            "ORDER BY id LIMIT %s",
+            (start, end, start, end, PDF_MAX_BATCH_FORMS + 1),
+        )
+        forms = cursor.fetchall()
+        if len(forms) > PDF_MAX_BATCH_FORMS:
+            raise HTTPException(
+                status_code=413, detail=f"More than {PDF_MAX_BATCH_FORMS} forms were approved on {day}."
+            )
+        _attach_children(cursor, forms)
+        return [_format_requisition(form) for form in forms]
     finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+        cursor.close()
+        conn.close()
+
+async def _pdf_response(forms, filename, if_none_match):
+    """Serves the PDF of `forms` from the disk cache or the render pool, with the state hash as ETag."""
+    key = requisition_pdf.state_key(forms)
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    try:
+        data = await flights.do(
+            ("requisition_pdf", key), lambda: requisition_pdf.render_cached(key, forms, filename)
+        )
+    except RenderTimeout:
+        raise HTTPException(status_code=504, detail="Rendering the PDF took too long; try again shortly.")
+    headers["Content-Disposition"] = f'inline; filename="{filename}"'
+    return Response(content=data, media_type="application/pdf", headers=headers)
+
+@router.get("/daily-approvals/pdf")
+async def get_daily_approvals_pdf(
+    day: date = Query(..., description="Approval date (YYYY-MM-DD)"),
+    user_role: str = Query(..., description="Role of the requesting user"),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Renders every requisition approved at Level 2 or 3 on `day` into one PDF
+    for printing and signing (see requisition_pdf.py).
+    """
+    if user_role not in APPROVER_ROLES:
+        raise HTTPException(status_code=403, detail="Only approvers can print the day's approvals.")
+    try:
+        forms = await run_in_threadpool(_approved_on, day)
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in get_daily_approvals_pdf: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+    if not forms:
+        raise HTTPException(status_code=404, detail=f"No requisitions were approved on {day}.")
+    return await _pdf_response(forms, f"requisitions-approved-{day}.pdf", if_none_match)
+
+@router.get("/{requisition_id}/pdf")
+async def get_requisition_pdf(requisition_id: int, if_none_match: Optional[str] = Header(None)):
+    """
+    The requisition form as a PDF for printing and signing, re-rendered only
+    when the form has changed since it was last rendered.
+    """
+    try:
+        # Read fresh rather than through the cache: the PDF must show the latest decisions.
+        requisition = await run_in_threadpool(_load_requisition, requisition_id)
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in get_requisition_pdf: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+    if not requisition:
+        raise HTTPException(status_code=404, detail="Requisition form not found.")
+    return await _pdf_response([requisition], f"requisition-{requisition_id}.pdf", if_none_match)
 
 @router.post("/", response_model=RequisitionFormResponse, status_code=201)
 async def create_requisition(requisition: RequisitionFormCreate, requester_id: str = Query(..., description="ID of the user creating the requisition")):
@@ -205,8 +419,10 @@ async def create_requisition(requisition: RequisitionFormCreate, requester_id: s
         conn = get_field_data_conn()
         cursor = conn.cursor(dictionary=True) # Return results as dictionaries
 
-        data_types_json_str = json.dumps([dt.dict() for dt in requisition.dataTypes])
-        sl_no_data_json_str = json.dumps([sld.dict() for sld in requisition.slNoData])
+        data_types = [dt.dict() for dt in requisition.dataTypes]
+        sl_no_data = [sld.dict() for sld in requisition.slNoData]
+        data_types_json_str = json.dumps(data_types)
+        sl_no_data_json_str = json.dumps(sl_no_data)
 
         query = """
         INSERT INTO requisition_forms (
@@ -233,51 +449,26 @@ async def create_requisition(requisition: RequisitionFormCreate, requester_id: s
             "Pending_L2_Approval" # Initial status
         )
         cursor.execute(query, values)
+        requisition_id = cursor.lastrowid
+        # The form and its child rows commit together.
+        write_requisition_children(cursor, requisition_id, data_types, sl_no_data)
         conn.commit()
+        cache.requisitions.invalidate(requisition_id)
 
-        requisition_id = cursor.lastrowid
         # Fetch the newly created record as a dictionary
-        cursor.execute(
-            "SELECT * FROM requisition_forms WHERE id = %s", (requisition_id,)
-        )
-        new_requisition = cursor.fetchone() # This will be a dictionary now
+        new_requisition = _fetch_requisition(cursor, requisition_id)
 
         if new_requisition:
-            # Format datetime objects to ISO strings for JSON serialization
-            new_requisition['dateOfRequisition'] = new_requisition['date_of_requisition'].isoformat() if new_requisition.get('date_of_requisition') else None
-            new_requisition['l2_approval_date'] = new_requisition['l2_approval_date'].isoformat() if new_requisition.get('l2_approval_date') else None
-            new_requisition['l3_approval_date'] = new_requisition['l3_approval_date'].isoformat() if new_requisition.get('l3_approval_date') else None
-            new_requisition['created_at'] = new_requisition['created_at'].isoformat() if new_requisition.get('created_at') else None
-
-            # Deserialize JSON fields
-            new_requisition['dataTypes'] = json.loads(new_requisition['data_types_json']) if new_requisition.get('data_types_json') else []
-            new_requisition['slNoData'] = json.loads(new_requisition['sl_no_data_json']) if new_requisition.get('sl_no_data_json') else []
-
-            # Map SQL column names to frontend camelCase from the dictionary
-            new_requisition['projectDistrict'] = new_requisition.pop('project_district')
-            new_requisition['preparedBySignature'] = new_requisition.pop('prepared_by_signature')
-            new_requisition['preparedByDesignation'] = new_requisition.pop('prepared_by_designation')
-            new_requisition['groupCoordinatorSignature'] = new_requisition.pop('group_coordinator_signature')
-            new_requisition['groupCoordinatorDesignation'] = new_requisition.pop('group_coordinator_designation')
-            new_requisition['requester_user_id'] = new_requisition.pop('requester_user_id')
-            new_requisition['current_approval_status'] = new_requisition.pop('current_approval_status')
-            new_requisition['l2_approver_id'] = new_requisition.pop('l2_approver_id')
-            new_requisition['l2_comments'] = new_requisition.pop('l2_comments')
-            new_requisition['l3_approver_id'] = new_requisition.pop('l3_approver_id')
-            new_requisition['l3_comments'] = new_requisition.pop('l3_comments')
-
-            # Remove raw JSON fields
-            new_requisition.pop('data_types_json', None)
-            new_requisition.pop('sl_no_data_json', None)
-
             return new_requisition
         else:
             raise HTTPException(status_code=500, detail="Failed to retrieve created requisition.")
 
     except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in create_requisition: %s", err)
         conn.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
     except Exception as e:
+        logger.exception("Unexpected error in create_requisition")
         conn.rollback()
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
     finally:
@@ -325,49 +516,22 @@ async def approve_requisition_l2(
         values = (user_id, datetime.now(), approval_data.comments, requisition_id)
         cursor.execute(query, values)
         conn.commit()
+        cache.requisitions.invalidate(requisition_id)
 
         # Fetch updated record as a dictionary
-        cursor.execute(
-            "SELECT * FROM requisition_forms WHERE id = %s", (requisition_id,)
-        )
-        updated_requisition = cursor.fetchone()
+        updated_requisition = _fetch_requisition(cursor, requisition_id)
 
         if updated_requisition:
-            # Format datetime objects to ISO strings for JSON serialization
-            updated_requisition['dateOfRequisition'] = updated_requisition['date_of_requisition'].isoformat() if updated_requisition.get('date_of_requisition') else None
-            updated_requisition['l2_approval_date'] = updated_requisition['l2_approval_date'].isoformat() if updated_requisition.get('l2_approval_date') else None
-            updated_requisition['l3_approval_date'] = updated_requisition['l3_approval_date'].isoformat() if updated_requisition.get('l3_approval_date') else None
-            updated_requisition['created_at'] = updated_requisition['created_at'].isoformat() if updated_requisition.get('created_at') else None
-
-            # Deserialize JSON fields
-            updated_requisition['dataTypes'] = json.loads(updated_requisition['data_types_json']) if updated_requisition.get('data_types_json') else []
-            updated_requisition['slNoData'] = json.loads(updated_requisition['sl_no_data_json']) if updated_requisition.get('sl_no_data_json') else []
-
-            # Map SQL column names to frontend camelCase
-            updated_requisition['projectDistrict'] = updated_requisition.pop('project_district')
-            updated_requisition['preparedBySignature'] = updated_requisition.pop('prepared_by_signature')
-            updated_requisition['preparedByDesignation'] = updated_requisition.pop('prepared_by_designation')
-            updated_requisition['groupCoordinatorSignature'] = updated_requisition.pop('group_coordinator_signature')
-            updated_requisition['groupCoordinatorDesignation'] = updated_requisition.pop('group_coordinator_designation')
-            updated_requisition['requester_user_id'] = updated_requisition.pop('requester_user_id')
-            updated_requisition['current_approval_status'] = updated_requisition.pop('current_approval_status')
-            updated_requisition['l2_approver_id'] = updated_requisition.pop('l2_approver_id')
-            updated_requisition['l2_comments'] = updated_requisition.pop('l2_comments')
-            updated_requisition['l3_approver_id'] = updated_requisition.pop('l3_approver_id')
-            updated_requisition['l3_comments'] = updated_requisition.pop('l3_comments')
-
-            # Remove raw JSON fields
-            updated_requisition.pop('data_types_json', None)
-            updated_requisition.pop('sl_no_data_json', None)
-
             return updated_requisition
         else:
             raise HTTPException(status_code=500, detail="Failed to retrieve updated requisition.")
 
     except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in approve_requisition_l2: %s", err)
         conn.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
     except Exception as e:
+        logger.exception("Unexpected error in approve_requisition_l2")
         conn.rollback()
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
     finally:
@@ -414,49 +578,22 @@ async def decline_requisition_l2(
         values = (user_id, datetime.now(), approval_data.comments, requisition_id)
         cursor.execute(query, values)
         conn.commit()
+        cache.requisitions.invalidate(requisition_id)
 
         # Fetch updated record as a dictionary
-        cursor.execute(
-            "SELECT * FROM requisition_forms WHERE id = %s", (requisition_id,)
-        )
-        updated_requisition = cursor.fetchone()
+        updated_requisition = _fetch_requisition(cursor, requisition_id)
 
         if updated_requisition:
-            # Format datetime objects to ISO strings for JSON serialization
-            updated_requisition['dateOfRequisition'] = updated_requisition['date_of_requisition'].isoformat() if updated_requisition.get('date_of_requisition') else None
-            updated_requisition['l2_approval_date'] = updated_requisition['l2_approval_date'].isoformat() if updated_requisition.get('l2_approval_date') else None
-            updated_requisition['l3_approval_date'] = updated_requisition['l3_approval_date'].isoformat() if updated_requisition.get('l3_approval_date') else None
-            updated_requisition['created_at'] = updated_requisition['created_at'].isoformat() if updated_requisition.get('created_at') else None
-
-            # Deserialize JSON fields
-            updated_requisition['dataTypes'] = json.loads(updated_requisition['data_types_json']) if updated_requisition.get('data_types_json') else []
-            updated_requisition['slNoData'] = json.loads(updated_requisition['sl_no_data_json']) if updated_requisition.get('sl_no_data_json') else []
-
-            # Map SQL column names to frontend camelCase
-            updated_requisition['projectDistrict'] = updated_requisition.pop('project_district')
-            updated_requisition['preparedBySignature'] = updated_requisition.pop('prepared_by_signature')
-            updated_requisition['preparedByDesignation'] = updated_requisition.pop('prepared_by_designation')
-            updated_requisition['groupCoordinatorSignature'] = updated_requisition.pop('group_coordinator_signature')
-            updated_requisition['groupCoordinatorDesignation'] = updated_requisition.pop('group_coordinator_designation')
-            updated_requisition['requester_user_id'] = updated_requisition.pop('requester_user_id')
-            updated_requisition['current_approval_status'] = updated_requisition.pop('current_approval_status')
-            updated_requisition['l2_approver_id'] = updated_requisition.pop('l2_approver_id')
-            updated_requisition['l2_comments'] = updated_requisition.pop('l2_comments')
-            updated_requisition['l3_approver_id'] = updated_requisition.pop('l3_approver_id')
-            updated_requisition['l3_comments'] = updated_requisition.pop('l3_comments')
-
-            # Remove raw JSON fields
-            updated_requisition.pop('data_types_json', None)
-            updated_requisition.pop('sl_no_data_json', None)
-
             return updated_requisition
         else:
             raise HTTPException(status_code=500, detail="Failed to retrieve updated requisition.")
 
     except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in decline_requisition_l2: %s", err)
         conn.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
     except Exception as e:
+        logger.exception("Unexpected error in decline_requisition_l2")
         conn.rollback()
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
     finally:
@@ -504,49 +641,22 @@ async def approve_requisition_l3(
         values = (user_id, datetime.now(), approval_data.comments, requisition_id)
         cursor.execute(query, values)
         conn.commit()
+        cache.requisitions.invalidate(requisition_id)
 
         # Fetch updated record as a dictionary
-        cursor.execute(
-            "SELECT * FROM requisition_forms WHERE id = %s", (requisition_id,)
-        )
-        updated_requisition = cursor.fetchone()
+        updated_requisition = _fetch_requisition(cursor, requisition_id)
 
         if updated_requisition:
-            # Format datetime objects to ISO strings for JSON serialization
-            updated_requisition['dateOfRequisition'] = updated_requisition['date_of_requisition'].isoformat() if updated_requisition.get('date_of_requisition') else None
-            updated_requisition['l2_approval_date'] = updated_requisition['l2_approval_date'].isoformat() if updated_requisition.get('l2_approval_date') else None
-            updated_requisition['l3_approval_date'] = updated_requisition['l3_approval_date'].isoformat() if updated_requisition.get('l3_approval_date') else None
-            updated_requisition['created_at'] = updated_requisition['created_at'].isoformat() if updated_requisition.get('created_at') else None
-
-            # Deserialize JSON fields
-            updated_requisition['dataTypes'] = json.loads(updated_requisition['data_types_json']) if updated_requisition.get('data_types_json') else []
-            updated_requisition['slNoData'] = json.loads(updated_requisition['sl_no_data_json']) if updated_requisition.get('sl_no_data_json') else []
-
-            # Map SQL column names to frontend camelCase
-            updated_requisition['projectDistrict'] = updated_requisition.pop('project_district')
-            updated_requisition['preparedBySignature'] = updated_requisition.pop('prepared_by_signature')
-            updated_requisition['preparedByDesignation'] = updated_requisition.pop('prepared_by_designation')
-            updated_requisition['groupCoordinatorSignature'] = updated_requisition.pop('group_coordinator_signature')
-            updated_requisition['groupCoordinatorDesignation'] = updated_requisition.pop('group_coordinator_designation')
-            updated_requisition['requester_user_id'] = updated_requisition.pop('requester_user_id')
-            updated_requisition['current_approval_status'] = updated_requisition.pop('current_approval_status')
-            updated_requisition['l2_approver_id'] = updated_requisition.pop('l2_approver_id')
-            updated_requisition['l2_comments'] = updated_requisition.pop('l2_comments')
-            updated_requisition['l3_approver_id'] = updated_requisition.pop('l3_approver_id')
-            updated_requisition['l3_comments'] = updated_requisition.pop('l3_comments')
-
-            # Remove raw JSON fields
-            updated_requisition.pop('data_types_json', None)
-            updated_requisition.pop('sl_no_data_json', None)
-
             return updated_requisition
         else:
             raise HTTPException(status_code=500, detail="Failed to retrieve updated requisition.")
 
     except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in approve_requisition_l3: %s", err)
         conn.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
     except Exception as e:
+        logger.exception("Unexpected error in approve_requisition_l3")
         conn.rollback()
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
     finally:
@@ -594,49 +704,22 @@ async def decline_requisition_l3(
         values = (user_id, datetime.now(), approval_data.comments, requisition_id)
         cursor.execute(query, values)
         conn.commit()
+        cache.requisitions.invalidate(requisition_id)
 
         # Fetch updated record as a dictionary
-        cursor.execute(
-            "SELECT * FROM requisition_forms WHERE id = %s", (requisition_id,)
-        )
-        updated_requisition = cursor.fetchone()
+        updated_requisition = _fetch_requisition(cursor, requisition_id)
 
         if updated_requisition:
-            # Format datetime objects to ISO strings for JSON serialization
-            updated_requisition['dateOfRequisition'] = updated_requisition['date_of_requisition'].isoformat() if updated_requisition.get('date_of_requisition') else None
-            updated_requisition['l2_approval_date'] = updated_requisition['l2_approval_date'].isoformat() if updated_requisition.get('l2_approval_date') else None
-            updated_requisition['l3_approval_date'] = updated_requisition['l3_approval_date'].isoformat() if updated_requisition.get('l3_approval_date') else None
-            updated_requisition['created_at'] = updated_requisition['created_at'].isoformat() if updated_requisition.get('created_at') else None
-
-            # Deserialize JSON fields
-            updated_requisition['dataTypes'] = json.loads(updated_requisition['data_types_json']) if updated_requisition.get('data_types_json') else []
-            updated_requisition['slNoData'] = json.loads(updated_requisition['sl_no_data_json']) if updated_requisition.get('sl_no_data_json') else []
-
-            # Map SQL column names to frontend camelCase
-            updated_requisition['projectDistrict'] = updated_requisition.pop('project_district')
-            updated_requisition['preparedBySignature'] = updated_requisition.pop('prepared_by_signature')
-            updated_requisition['preparedByDesignation'] = updated_requisition.pop('prepared_by_designation')
-            updated_requisition['groupCoordinatorSignature'] = updated_requisition.pop('group_coordinator_signature')
-            updated_requisition['groupCoordinatorDesignation'] = updated_requisition.pop('group_coordinator_designation')
-            updated_requisition['requester_user_id'] = updated_requisition.pop('requester_user_id')
-            updated_requisition['current_approval_status'] = updated_requisition.pop('current_approval_status')
-            updated_requisition['l2_approver_id'] = updated_requisition.pop('l2_approver_id')
-            updated_requisition['l2_comments'] = updated_requisition.pop('l2_comments')
-            updated_requisition['l3_approver_id'] = updated_requisition.pop('l3_approver_id')
-            updated_requisition['l3_comments'] = updated_requisition.pop('l3_comments')
-
-            # Remove raw JSON fields
-            updated_requisition.pop('data_types_json', None)
-            updated_requisition.pop('sl_no_data_json', None)
-
             return updated_requisition
         else:
             raise HTTPException(status_code=500, detail="Failed to retrieve updated requisition.")
 
     except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in decline_requisition_l3: %s", err)
         conn.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
     except Exception as e:
+        logger.exception("Unexpected error in decline_requisition_l3")
         conn.rollback()
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
     finally:
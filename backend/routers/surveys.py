@@ -1,48 +1,48 @@
-from fastapi import APIRouter, HTTPException
+import logging
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query, status
 import mysql.connector # Ensure mysql.connector is imported
+from pydantic import BaseModel
 from database import get_field_data_conn
+import footprints
+import jobs
+import cache
+import write_engine
+from single_flight import coalesce
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/surveys", tags=["Surveys"])
 
+SURVEY_TABLE = write_engine.register(write_engine.TableDescriptor(
+    "survey_data",
+    get_field_data_conn,
+    [
+        "block_id", "survey_id", "survey_lib_no", "survey_name", "survey_environ",
+        "survey_area", "survey_area_km", "sig_no", "company", "type_of_data",
+        "year_of_acquisition", "survey_type", "multi_block", "multi_block_details",
+        "remarks",
+    ],
+))
+
 @router.post("")
 def create_block(data: dict):
-
     try:
-        conn = get_field_data_conn()
-        cursor = conn.cursor()
-
-        query = """
-            INSERT INTO survey_data (
-                block_id, survey_id, survey_lib_no, survey_name, survey_environ,
-                survey_area, survey_area_km, sig_no, company, type_of_data,
-                year_of_acquisition, survey_type, multi_block, multi_block_details, remarks
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-
-        values = (
-            data["block_id"], data["survey_id"], data["survey_lib_no"], data["survey_name"],
-            data["survey_environ"], data["survey_area"], data["survey_area_km"],
-            data["sig_no"], data["company"], data["type_of_data"], data["year_of_acquisition"],
-            data["survey_type"], data["multi_block"], data["multi_block_details"], data["remarks"]
-        )
-
-        cursor.execute(query, values)
-        conn.commit()
+        write_engine.insert_one(SURVEY_TABLE, data)
+        if data.get("survey_id") is not None:
+            cache.surveys.invalidate(str(data["survey_id"]))
         return {"message": "Survey data inserted successfully"}
-
+    except write_engine.PayloadError as err:
+        raise HTTPException(status_code=422, detail=err.errors)
     except mysql.connector.Error as err: # Catch specific MySQL errors
-        print(f"MySQL Database Error in create_survey: {err}")
+        logger.error("MySQL Database Error in create_survey: %s", err)
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
     except Exception as e:
-        print(f"Unexpected error in create_survey: {e}")
+        logger.exception("Unexpected error in create_survey")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 @router.get("/count")
+@coalesce
 def get_survey_count():
     try:
         conn = get_field_data_conn()
@@ -51,10 +51,10 @@ def get_survey_count():
         count = cursor.fetchone()[0]
         return {"count": count}
     except mysql.connector.Error as err: # Catch specific MySQL errors
-        print(f"MySQL Database Error in get_survey_count: {err}")
+        logger.error("MySQL Database Error in get_survey_count: %s", err)
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
     except Exception as e:
-        print(f"Unexpected error in get_survey_count: {e}")
+        logger.exception("Unexpected error in get_survey_count")
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         if cursor:
@@ -63,6 +63,7 @@ def get_survey_count():
             conn.close()
 
 @router.get("/ids")
+@coalesce
 def get_survey_ids():
     """
     Fetches a list of all existing survey_ids from the survey_data table.
@@ -78,13 +79,95 @@ def get_survey_ids():
         survey_ids = [row[0] for row in cursor.fetchall()]
         return {"survey_ids": survey_ids}
     except mysql.connector.Error as err:
-        print(f"MySQL Database Error in get_survey_ids: {err}")
+        logger.error("MySQL Database Error in get_survey_ids: %s", err)
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
     except Exception as e:
-        print(f"Unexpected error in get_survey_ids: {e}")
+        logger.exception("Unexpected error in get_survey_ids")
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         if cursor:
             cursor.close()
         if conn:
             conn.close()
+
+class FootprintRequest(BaseModel):
+    survey_ids: Optional[List[str]] = None # Defaults to every survey
+    submitted_by: Optional[str] = None
+
+def _parse_bbox(bbox):
+    try:
+        min_x, min_y, max_x, max_y = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be min_x,min_y,max_x,max_y")
+    if min_x > max_x or min_y > max_y:
+        raise HTTPException(status_code=400, detail="bbox minimums must not exceed its maximums")
+    return min_x, min_y, max_x, max_y
+
+@router.get("/spatial")
+def get_surveys_in_bbox(
+    bbox: str = Query(..., description="min_x,min_y,max_x,max_y in the surveys' projected CRS"),
+    kind: Optional[str] = Query(None, description="survey or processing"),
+    include_hull: bool = False,
+    limit: int = Query(1000, ge=1, le=10000),
+):
+    """
+    Lists the survey and processing-volume footprints that intersect a
+    bounding box. Footprints are built from trace-header coordinates by the
+    build_footprints job (POST /surveys/footprints).
+    """
+    if kind is not None and kind not in footprints.KINDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid kind. Allowed kinds: {', '.join(footprints.KINDS)}"
+        )
+    try:
+        return {"footprints": footprints.intersecting(*_parse_bbox(bbox), kind, include_hull, limit)}
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in get_surveys_in_bbox: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+
+@router.post("/footprints", status_code=status.HTTP_202_ACCEPTED)
+def build_footprints(request: FootprintRequest):
+    """Queues a rebuild of survey footprints. Track it with GET /jobs/{job_id}."""
+    try:
+        job_id = jobs.submit("build_footprints", {"survey_ids": request.survey_ids}, request.submitted_by)
+        return {"job_id": job_id, "status": "queued"}
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in build_footprints: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+
+def _load_survey(survey_id):
+    conn = get_field_data_conn()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT * FROM survey_data WHERE survey_id = %s", (survey_id,))
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+
+def warm_cache():
+    """Preloads the survey cache (start-up warm-up); returns the number of records."""
+    conn = get_field_data_conn()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT * FROM survey_data LIMIT %s", (cache.surveys.max_entries,))
+        return cache.surveys.preload((str(row["survey_id"]), row) for row in cursor.fetchall())
+    finally:
+        cursor.close()
+        conn.close()
+
+# Declared last so the fixed paths above take precedence.
+@router.get("/{survey_id}")
+def get_survey(survey_id: str):
+    """
+    Fetches a single survey record, served from the read-through cache.
+    """
+    try:
+        record = cache.surveys.get(survey_id, lambda: _load_survey(survey_id))
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in get_survey: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+    if record is None:
+        raise HTTPException(status_code=404, detail="Survey not found.")
+    return record
@@ -0,0 +1,43 @@
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+import mysql.connector
+
+import sync
+from config import DB_BACKEND
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/sync", tags=["Sync"])
+
+@router.post("/push")
+async def push(request: Request, x_sync_token: Optional[str] = Header(None)):
+    """
+    Central end of the field-office sync: merges one gzip-compressed batch of
+    rows catalogued offline and returns the result of every row (see sync.py).
+    """
+    if not sync.authorized(x_sync_token):
+        raise HTTPException(status_code=403, detail="Invalid sync token.")
+    try:
+        payload = sync.decode_body(await request.body(), request.headers.get("content-encoding"))
+    except (ValueError, OSError) as err:
+        raise HTTPException(status_code=400, detail=f"Unreadable push: {err}")
+    try:
+        return await run_in_threadpool(sync.apply_push, payload)
+    except ValueError as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    except mysql.connector.Error as err:
+        logger.error("MySQL Database Error in sync push: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+
+@router.get("/status")
+def get_sync_status():
+    """Entries per status in this field install's outboxes."""
+    if DB_BACKEND != "sqlite":
+        raise HTTPException(status_code=404, detail="Not running in embedded SQLite mode.")
+    try:
+        return {"outbox": sync.outbox_status(), "agent": sync.agent_status()}
+    except mysql.connector.Error as err:
+        logger.error("Error in /sync/status: %s", err)
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
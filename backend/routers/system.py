@@ -0,0 +1,89 @@
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import JSONResponse
+
+import admission
+import cache
+import lifecycle
+import profiling
+from single_flight import flights
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/system", tags=["System"])
+# Probe paths sit at the root where hosting platforms expect them.
+probes = APIRouter(tags=["System"])
+
+@probes.get("/healthz")
+def healthz():
+    """
+    Liveness: answers while the process is serving, without touching MySQL.
+    Includes the most recent database check, if any.
+    """
+    return {"status": "ok", "warm": lifecycle.is_warm(), "databases": lifecycle.last_database_check()}
+
+@probes.get("/readyz")
+async def readyz():
+    """Readiness: warm-up finished, no migration pending and every database answers a trivial query."""
+    databases = await lifecycle.check_databases()
+    pending = await lifecycle.check_migrations()
+    ready = lifecycle.is_warm() and pending == [] and all(result["ok"] for result in databases.values())
+    return JSONResponse(
+        {
+            "status": "ready" if ready else "not ready",
+            "warm": lifecycle.is_warm(),
+            "warmup_failures": lifecycle.warmup_failures(),
+            "pending_migrations": None if pending is None else [f"{migration_id}@{database}" for migration_id, database in pending],
+            "databases": databases,
+        },
+        status_code=200 if ready else 503,
+    )
+
+@router.get("/startup")
+def get_startup_report():
+    """Where this worker's cold start went: import, assembly and warm-up timings."""
+    return lifecycle.startup.as_dict()
+
+@router.get("/cache")
+def get_cache_stats():
+    """Hit/miss statistics of this worker process's read-through caches."""
+    return cache.stats()
+
+@router.post("/cache/clear")
+def clear_caches():
+    """Drops every cached entry in this worker process."""
+    for entries in cache.CACHES.values():
+        entries.clear()
+    logger.info("Cleared %d caches on request", len(cache.CACHES))
+    return {"message": f"Cleared {len(cache.CACHES)} caches."}
+
+@router.get("/admission")
+def get_admission_stats():
+    """Concurrency, queue depth and shed counts per route class (this worker)."""
+    return admission.stats()
+
+@router.get("/coalescing")
+def get_coalescing_stats():
+    """How many identical concurrent reads shared an in-flight query (this worker)."""
+    return flights.stats()
+
+def _require_profiling_token(token):
+    if not profiling.authorized(token):
+        logger.warning("Profile access refused: missing or invalid X-Profile token")
+        raise HTTPException(status_code=403, detail="A valid X-Profile token is required.")
+
+@router.get("/profiles")
+def list_profiles(x_profile: Optional[str] = Header(None)):
+    """Stored request profiles, newest first (send the profiling token as X-Profile)."""
+    _require_profiling_token(x_profile)
+    return profiling.list_profiles()
+
+@router.get("/profiles/{profile_id}")
+def get_profile(profile_id: str, x_profile: Optional[str] = Header(None)):
+    """One profile report: phase timings, sampled phases, call tree and collapsed stacks."""
+    _require_profiling_token(x_profile)
+    report = profiling.load(profile_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    return report
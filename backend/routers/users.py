@@ -1,8 +1,10 @@
+import logging
 from fastapi import APIRouter, HTTPException, status
 from passlib.context import CryptContext
 import mysql.connector
 from database import get_field_data_conn # Assuming users table is in field_data
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/users", tags=["Users"])
 
 # Password hashing context
@@ -15,7 +17,7 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 @router.post("/signup", status_code=status.HTTP_201_CREATED)
-async def signup_user(user_data: dict):
+def signup_user(user_data: dict):
     """
     Registers a new user with name, ID (CPF No.), password, and user type.
     Hashes the password before storing.
@@ -66,10 +68,10 @@ async def signup_user(user_data: dict):
         return {"message": "User registered successfully!"}
 
     except mysql.connector.Error as err:
-        print(f"MySQL Database Error in signup_user: {err}")
+        logger.error("MySQL Database Error in signup_user: %s", err)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Database error: {err}")
     except Exception as e:
-        print(f"Unexpected error in signup_user: {e}")
+        logger.exception("Unexpected error in signup_user")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Internal server error: {e}")
     finally:
         if cursor:
@@ -78,7 +80,7 @@ async def signup_user(user_data: dict):
             conn.close()
 
 @router.post("/login")
-async def login_user(user_data: dict):
+def login_user(user_data: dict):
     """
     Authenticates a user based on ID (CPF No.) and password.
     Returns user type, name, and ID (CPF No.) on successful login.
@@ -122,10 +124,10 @@ async def login_user(user_data: dict):
         }
 
     except mysql.connector.Error as err:
-        print(f"MySQL Database Error in login_user: {err}")
+        logger.error("MySQL Database Error in login_user: %s", err)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Database error: {err}")
     except Exception as e:
-        print(f"Unexpected error in login_user: {e}")
+        logger.exception("Unexpected error in login_user")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Internal server error: {e}")
     finally:
         if cursor:
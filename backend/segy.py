@@ -0,0 +1,389 @@
+"""
+SEG-Y reading through memory-mapped, structured NumPy views.
+
+The file is mapped once as an array of fixed-size trace records
+(240-byte header + samples), so any trace-header word for every trace is a
+strided view and scanning headers never reads the sample data into memory.
+Both byte orders and all common sample formats (IBM and IEEE floats,
+integers) are supported; IBM floats are converted with vectorised bit
+arithmetic.
+"""
+import os
+
+import numpy as np
+
+TEXT_HEADER_SIZE = 3200
+BINARY_HEADER_SIZE = 400
+TRACE_HEADER_SIZE = 240
+DATA_START = TEXT_HEADER_SIZE + BINARY_HEADER_SIZE
+
+# format code -> (name, numpy type without byte order, bytes per sample)
+SAMPLE_FORMATS = {
+    1: ("ibm_float32", "u4", 4),
+    2: ("int32", "i4", 4),
+    3: ("int16", "i2", 2),
+    5: ("ieee_float32", "f4", 4),
+    6: ("ieee_float64", "f8", 8),
+    8: ("int8", "i1", 1),
+    9: ("int64", "i8", 8),
+    10: ("uint32", "u4", 4),
+    11: ("uint16", "u2", 2),
+    12: ("uint64", "u8", 8),
+    16: ("uint8", "u1", 1),
+}
+
+# name -> (byte offset within the 400-byte binary header, type)
+BINARY_HEADER_FIELDS = {
+    "job_id": (0, "i4"),
+    "line_number": (4, "i4"),
+    "reel_number": (8, "i4"),
+    "traces_per_ensemble": (12, "i2"),
+    "aux_traces_per_ensemble": (14, "i2"),
+    "sample_interval": (16, "u2"),
+    "orig_sample_interval": (18, "u2"),
+    "samples_per_trace": (20, "u2"),
+    "orig_samples_per_trace": (22, "u2"),
+    "format_code": (24, "i2"),
+    "ensemble_fold": (26, "i2"),
+    "sorting_code": (28, "i2"),
+    "measurement_system": (54, "i2"),
+    "byte_order_constant": (96, "u4"),
+    "revision": (300, "u2"),
+    "fixed_length_flag": (302, "i2"),
+    "extended_text_headers": (304, "i2"),
+}
+
+# name -> (byte offset within the 240-byte trace header, type); SEG-Y rev1
+# standard positions.
+TRACE_HEADER_FIELDS = {
+    "tracl": (0, "i4"),
+    "tracr": (4, "i4"),
+    "fldr": (8, "i4"),
+    "tracf": (12, "i4"),
+    "ep": (16, "i4"),
+    "cdp": (20, "i4"),
+    "cdpt": (24, "i4"),
+    "trid": (28, "i2"),
+    "nvs": (30, "i2"),
+    "nhs": (32, "i2"),
+    "offset": (36, "i4"),
+    "gelev": (40, "i4"),
+    "selev": (44, "i4"),
+    "scalel": (68, "i2"),
+    "scalco": (70, "i2"),
+    "sx": (72, "i4"),
+    "sy": (76, "i4"),
+    "gx": (80, "i4"),
+    "gy": (84, "i4"),
+    "counit": (88, "i2"),
+    "ns": (114, "u2"),
+    "dt": (116, "u2"),
+    "cdpx": (180, "i4"),
+    "cdpy": (184, "i4"),
+    "iline": (188, "i4"),
+    "xline": (192, "i4"),
+    "sp": (196, "i4"),
+    "scalsp": (200, "i2"),
+}
+
+BYTE_ORDER_CONSTANT = 0x01020304
+
+
+class SegyError(ValueError):
+    """Raised for files that are not readable fixed-length SEG-Y."""
+
+
+def _struct_dtype(fields, itemsize, endian):
+    names = list(fields)
+    return np.dtype({
+        "names": names,
+        "formats": [endian + fields[name][1] for name in names],
+        "offsets": [fields[name][0] for name in names],
+        "itemsize": itemsize,
+    })
+
+
+def _decode_text_header(raw):
+    """EBCDIC (cp037) or ASCII, split into the conventional 80-column cards."""
+    data = np.frombuffer(raw, dtype=np.uint8)
+    # EBCDIC headers start with "C" (0xC3) and are dominated by bytes >= 0x80;
+    # ASCII headers have almost none.
+    ebcdic = data[0] == 0xC3 or np.count_nonzero(data >= 0x80) > len(data) // 4
+    text = raw.decode("cp037" if ebcdic else "ascii", errors="replace")
+    text = "".join(ch if ch.isprintable() else " " for ch in text)
+    return "\n".join(text[i:i + 80].rstrip() for i in range(0, len(text), 80)).rstrip()
+
+
+def _detect_endian(raw_binary):
+    for endian in (">", "<"):
+        header = np.frombuffer(raw_binary, dtype=_struct_dtype(BINARY_HEADER_FIELDS, BINARY_HEADER_SIZE, endian))[0]
+        if int(header["byte_order_constant"]) == BYTE_ORDER_CONSTANT:
+            return endian, header
+    for endian in (">", "<"):
+        header = np.frombuffer(raw_binary, dtype=_struct_dtype(BINARY_HEADER_FIELDS, BINARY_HEADER_SIZE, endian))[0]
+        if int(header["format_code"]) in SAMPLE_FORMATS:
+            return endian, header
+    raise SegyError("Unrecognised binary header (sample format code out of range in both byte orders)")
+
+
+def apply_scalar(values, scalar):
+    """
+    Applies a SEG-Y coordinate/elevation scalar: positive multiplies,
+    negative divides, zero leaves values unchanged.
+    """
+    scalar = np.broadcast_to(np.asarray(scalar, dtype=np.float64), np.shape(values))
+    factor = np.ones(np.shape(values))
+    np.divide(-1.0, scalar, out=factor, where=scalar < 0)
+    np.copyto(factor, scalar, where=scalar > 0)
+    return values * factor
+
+
+def ibm_to_float(raw):
+    """Converts IBM System/360 floats, given as native uint32, to float32."""
+    raw = np.asarray(raw, dtype=np.uint32)
+    sign = np.where(raw >> 31, -1.0, 1.0)
+    exponent = ((raw >> 24) & 0x7F).astype(np.int32)
+    mantissa = (raw & 0x00FFFFFF).astype(np.float64)
+    # value = 0.mantissa (base 16) * 16 ** (exponent - 64)
+    return (sign * np.ldexp(mantissa, 4 * (exponent - 64) - 24)).astype(np.float32)
+
+
+class SegyFile:
+    """
+    A fixed-length-trace SEG-Y file mapped read-only.
+
+    `traces` is a memmap of structured records with a "header" and a raw
+    "samples" field; header words are exposed through header() as strided
+    views, and samples are decoded to float32 on demand per trace range.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file_size = os.path.getsize(path)
+        if self.file_size < DATA_START:
+            raise SegyError("File is smaller than the SEG-Y file headers")
+
+        with open(path, "rb") as f:
+            raw_text = f.read(TEXT_HEADER_SIZE)
+            raw_binary = f.read(BINARY_HEADER_SIZE)
+        self.text_header = _decode_text_header(raw_text)
+        self.endian, self.binary_header = _detect_endian(raw_binary)
+
+        extended = int(self.binary_header["extended_text_headers"])
+        if extended < 0:
+            raise SegyError("Variable number of extended textual headers is not supported")
+        self.data_offset = DATA_START + extended * TEXT_HEADER_SIZE
+
+        self.format_code = int(self.binary_header["format_code"])
+        self.sample_format, sample_type, self.bytes_per_sample = SAMPLE_FORMATS[self.format_code]
+        self.sample_dtype = np.dtype(self.endian + sample_type)
+        self.header_dtype = _struct_dtype(TRACE_HEADER_FIELDS, TRACE_HEADER_SIZE, self.endian)
+
+        samples = int(self.binary_header["samples_per_trace"])
+        interval = int(self.binary_header["sample_interval"])
+        if self.file_size >= self.data_offset + TRACE_HEADER_SIZE:
+            # Fall back to (or cross-check with) the first trace header.
+            first = np.fromfile(path, dtype=self.header_dtype, count=1, offset=self.data_offset)[0]
+            samples = samples or int(first["ns"])
+            interval = interval or int(first["dt"])
+        if samples <= 0:
+            raise SegyError("Number of samples per trace is not set")
+        self.samples_per_trace = samples
+        self.sample_interval_us = interval
+
+        self.trace_size = TRACE_HEADER_SIZE + samples * self.bytes_per_sample
+        data_bytes = self.file_size - self.data_offset
+        if data_bytes % self.trace_size:
+            raise SegyError(
+                f"File size does not divide into {self.trace_size}-byte traces; "
+                "variable-length traces are not supported"
+            )
+        self.trace_count = data_bytes // self.trace_size
+        self.trace_dtype = np.dtype([
+            ("header", self.header_dtype),
+            ("samples", self.sample_dtype, (samples,)),
+        ])
+        self.traces = (
+            np.memmap(path, dtype=self.trace_dtype, mode="r", offset=self.data_offset, shape=(self.trace_count,))
+            if self.trace_count else np.empty(0, dtype=self.trace_dtype)
+        )
+
+    def close(self):
+        mm = getattr(self.traces, "_mmap", None)
+        self.traces = None
+        if mm is not None:
+            mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def record_length_ms(self):
+        return (self.samples_per_trace - 1) * self.sample_interval_us / 1000.0
+
+    def header(self, name):
+        """Strided view of one standard trace-header word across all traces."""
+        return self.traces["header"][name]
+
+    def header_word(self, byte, fmt="i4"):
+        """
+        Reads a non-standard header word for every trace, given its 1-based
+        byte position within the trace header (e.g. 9 or 189).
+        """
+        dtype = np.dtype({"names": ["word"], "formats": [self.endian + fmt],
+                          "offsets": [byte - 1], "itemsize": self.trace_size})
+        return self.traces.view(dtype)["word"]
+
+    def trace_offsets(self):
+        """Absolute byte offset of every trace record in the file."""
+        return self.data_offset + np.arange(self.trace_count, dtype=np.int64) * self.trace_size
+
+    def samples(self, start=0, stop=None):
+        """Decoded float32 samples for traces [start, stop)."""
+        raw = self.traces["samples"][start:stop]
+        if self.format_code == 1:
+            return ibm_to_float(raw.astype(np.uint32))
+        return raw.astype(np.float32)
+
+
+def _range(values):
+    if values is None or len(values) == 0:
+        return None
+    low, high = int(values.min()), int(values.max())
+    return None if low == 0 and high == 0 else [low, high]
+
+
+def _max_group_size(values):
+    if len(values) == 0:
+        return 0
+    return int(np.unique(values, return_counts=True)[1].max())
+
+
+def _bin_spacing(line, other, x, y):
+    """
+    Median trace spacing along `other` within the same `line`, from adjacent
+    traces whose `other` number changes.
+    """
+    if len(line) < 2:
+        return None
+    order = np.lexsort((other, line))
+    line, other, x, y = line[order], other[order], x[order], y[order]
+    same_line = line[1:] == line[:-1]
+    step = (other[1:] - other[:-1]).astype(np.float64)
+    mask = same_line & (step != 0)
+    if not mask.any():
+        return None
+    distance = np.hypot(np.diff(x)[mask], np.diff(y)[mask]) / np.abs(step[mask])
+    distance = distance[distance > 0]
+    return round(float(np.median(distance)), 3) if len(distance) else None
+
+
+def scan(path, inline_byte=None, xline_byte=None):
+    """
+    Summarises a SEG-Y file from its textual, binary and trace headers.
+    `inline_byte`/`xline_byte` override the rev1 positions (189/193) for
+    files that store line numbers elsewhere.
+    """
+    with SegyFile(path) as segy:
+        n = segy.trace_count
+        inline = segy.header_word(inline_byte) if inline_byte else segy.header("iline")
+        xline = segy.header_word(xline_byte) if xline_byte else segy.header("xline")
+        # Copy the handful of words we need out of the map in one pass each.
+        inline, xline = np.array(inline), np.array(xline)
+        fldr = np.array(segy.header("fldr"))
+        cdp = np.array(segy.header("cdp"))
+        shotpoint = np.array(segy.header("ep"))
+        if not shotpoint.any():
+            shotpoint = np.array(segy.header("sp"))
+        nhs = np.array(segy.header("nhs"))
+        scalco = np.array(segy.header("scalco"))
+        cdpx = apply_scalar(np.array(segy.header("cdpx")), scalco)
+        cdpy = apply_scalar(np.array(segy.header("cdpy")), scalco)
+
+        fold = _max_group_size(cdp) if cdp.any() else 0
+        if fold <= 1 and n:
+            # Stacked data: fold is recorded as the number of summed traces.
+            fold = int(nhs.max()) if nhs.max() > 1 else int(segy.binary_header["ensemble_fold"])
+
+        bin_size = None
+        if inline.any() and xline.any() and (cdpx.any() or cdpy.any()):
+            bin_size = [_bin_spacing(inline, xline, cdpx, cdpy), _bin_spacing(xline, inline, cdpx, cdpy)]
+
+        return {
+            "file_name": os.path.basename(path),
+            "file_size": segy.file_size,
+            "endian": "big" if segy.endian == ">" else "little",
+            "revision": int(segy.binary_header["revision"]) >> 8,
+            "format_code": segy.format_code,
+            "sample_format": segy.sample_format,
+            "sample_interval_us": segy.sample_interval_us,
+            "samples_per_trace": segy.samples_per_trace,
+            "record_length_ms": segy.record_length_ms,
+            "trace_count": n,
+            "channels": _max_group_size(fldr) if fldr.any() else int(segy.binary_header["traces_per_ensemble"]),
+            "ensembles": int(len(np.unique(fldr))) if fldr.any() else 0,
+            "inline_range": _range(inline),
+            "xline_range": _range(xline),
+            "shotpoint_range": _range(shotpoint),
+            "cdp_range": _range(cdp),
+            "fold": fold,
+            "bin_size": bin_size,
+            "textual_header": segy.text_header,
+        }
+
+
+def _ms(value):
+    return int(value) if float(value).is_integer() else value
+
+
+def _bin_size_text(bin_size):
+    values = [value for value in (bin_size or []) if value]
+    if not values:
+        return None
+    return " x ".join(f"{_ms(value)}" for value in dict.fromkeys(values))
+
+
+def acquisition_fields(summary, file_name=None):
+    """acquisition_data columns derived from a scan."""
+    return {
+        "record_length": _ms(summary["record_length_ms"]),
+        "samp_rate": _ms(summary["sample_interval_us"] / 1000.0),
+        "no_of_channel": summary["channels"] or None,
+        "file_name": file_name or summary["file_name"],
+        "file_size": summary["file_size"],
+        "file_type": "SEG-Y",
+        "file_content": f"{summary['trace_count']} traces, {summary['ensembles']} records, {summary['sample_format']}",
+    }
+
+
+def processing_fields(summary):
+    """processing_data columns derived from a scan."""
+    return {
+        "sampling_interval": _ms(summary["sample_interval_us"] / 1000.0),
+        "record_length": _ms(summary["record_length_ms"]),
+        "fold": summary["fold"] or None,
+        "bin_size": _bin_size_text(summary["bin_size"]),
+    }
+
+
+def acquisition_media_fields(summary):
+    """acquisition_media_data columns derived from a scan."""
+    shotpoint = summary["shotpoint_range"] or [None, None]
+    return {"fsp": shotpoint[0], "lsp": shotpoint[1]}
+
+
+def processing_media_fields(summary):
+    """processing_media_data columns derived from a scan."""
+    inline = summary["inline_range"] or [None, None]
+    xline = summary["xline_range"] or [None, None]
+    shotpoint = summary["shotpoint_range"] or [None, None]
+    cdp = summary["cdp_range"] or [None, None]
+    return {
+        "first_inline": inline[0], "last_inline": inline[1],
+        "first_xline": xline[0], "last_xline": xline[1],
+        "fsp": shotpoint[0], "lsp": shotpoint[1],
+        "fcdp": cdp[0], "lcdp": cdp[1],
+    }
@@ -0,0 +1,136 @@
+"""
+Persistent trace-key indexes for stored SEG-Y files.
+
+An index maps (inline, xline) or (shot, channel) to trace numbers, sorted by
+key so a window lookup is two binary searches plus a mask. Traces in a
+SEG-Y file have a fixed size, so a trace number is all that is needed to
+compute its byte offset; storing uint32 trace numbers keeps the index at
+12 bytes per trace. Indexes are saved as .npz files keyed by the file's path,
+size and mtime, and rebuilt automatically when the file changes.
+
+Extraction writes the original file headers followed by the selected trace
+records, served as zero-copy memoryview slices of a read-only mmap.
+"""
+import hashlib
+import mmap
+import os
+
+import numpy as np
+
+import segy
+from config import VAR_DIR
+
+INDEX_DIR = os.path.join(VAR_DIR, "segy_index")
+# Trace header words (1-based byte, type) for each index kind.
+INDEX_KINDS = {
+    "inline_xline": ((189, "i4"), (193, "i4")),
+    "shot_channel": ((9, "i4"), (13, "i4")),
+}
+STREAM_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def _index_path(path, kind):
+    digest = hashlib.sha1(os.path.realpath(path).encode()).hexdigest()[:20]
+    return os.path.join(INDEX_DIR, f"{digest}-{kind}.npz")
+
+
+def build_index(path, kind="inline_xline", key_bytes=None):
+    """
+    Scans the trace headers once and persists the sorted key index.
+    `key_bytes` overrides the header positions, e.g. ((9, "i4"), (21, "i4")).
+    """
+    (byte1, fmt1), (byte2, fmt2) = key_bytes or INDEX_KINDS[kind]
+    stat = os.stat(path)
+    with segy.SegyFile(path) as f:
+        key1 = np.array(f.header_word(byte1, fmt1), dtype=np.int32)
+        key2 = np.array(f.header_word(byte2, fmt2), dtype=np.int32)
+        order = np.lexsort((key2, key1)).astype(np.uint32)
+        index = {
+            "key1": key1[order],
+            "key2": key2[order],
+            "trace": order,
+            "meta": np.array(
+                [stat.st_size, stat.st_mtime_ns, f.data_offset, f.trace_size, f.trace_count],
+                dtype=np.int64,
+            ),
+        }
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    target = _index_path(path, kind)
+    partial = target + ".part.npz"
+    np.savez(partial, **index)
+    os.replace(partial, target)
+    return index
+
+
+def load_index(path, kind="inline_xline", key_bytes=None):
+    """Loads the index for `path`, (re)building it if missing or stale."""
+    stat = os.stat(path)
+    target = _index_path(path, kind)
+    if os.path.exists(target):
+        with np.load(target) as data:
+            index = {name: data[name] for name in data.files}
+        size, mtime_ns = index["meta"][:2]
+        if size == stat.st_size and mtime_ns == stat.st_mtime_ns:
+            return index
+    return build_index(path, kind, key_bytes)
+
+
+def index_stats(index):
+    meta = index["meta"]
+    return {
+        "trace_count": int(meta[4]),
+        "key1_range": [int(index["key1"].min()), int(index["key1"].max())] if len(index["key1"]) else None,
+        "key2_range": [int(index["key2"].min()), int(index["key2"].max())] if len(index["key2"]) else None,
+    }
+
+
+def select_traces(index, key1_range=None, key2_range=None):
+    """
+    Trace numbers whose keys fall inside the inclusive ranges, in file order
+    so extraction reads the file sequentially.
+    """
+    key1, key2, trace = index["key1"], index["key2"], index["trace"]
+    start, stop = 0, len(key1)
+    if key1_range is not None:
+        start = np.searchsorted(key1, key1_range[0], side="left")
+        stop = np.searchsorted(key1, key1_range[1], side="right")
+    selected = trace[start:stop]
+    if key2_range is not None:
+        window = key2[start:stop]
+        selected = selected[(window >= key2_range[0]) & (window <= key2_range[1])]
+    return np.sort(selected)
+
+
+def _runs(traces):
+    """Splits sorted trace numbers into [first, last] runs of consecutive traces."""
+    if len(traces) == 0:
+        return np.empty((0, 2), dtype=np.int64)
+    breaks = np.flatnonzero(np.diff(traces) != 1)
+    starts = np.concatenate(([traces[0]], traces[breaks + 1]))
+    ends = np.concatenate((traces[breaks], [traces[-1]]))
+    return np.stack([starts, ends], axis=1).astype(np.int64)
+
+
+def extracted_size(index, traces):
+    data_offset, trace_size = int(index["meta"][2]), int(index["meta"][3])
+    return data_offset + len(traces) * trace_size
+
+
+def stream_extract(path, index, traces):
+    """
+    Yields a valid SEG-Y made of the file's textual/binary headers and the
+    selected traces. Chunks are memoryviews into the mapped file, so trace
+    data is never copied in Python.
+    """
+    data_offset, trace_size = int(index["meta"][2]), int(index["meta"][3])
+    with open(path, "rb") as f:
+        # The map outlives the file object and is released once the last
+        # yielded view has been sent.
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    yield view[:data_offset]
+    per_chunk = max(1, STREAM_CHUNK_SIZE // trace_size)
+    for first, last in _runs(traces):
+        for start in range(first, last + 1, per_chunk):
+            stop = min(start + per_chunk, last + 1)
+            yield view[data_offset + start * trace_size:data_offset + stop * trace_size]
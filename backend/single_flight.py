@@ -0,0 +1,75 @@
+"""
+Coalescing of identical concurrent reads ("single flight").
+
+When a read is already in flight for a key, later callers with the same key
+await that call's result instead of issuing their own query, so a burst of
+users opening the same page costs one round trip to MySQL per worker.
+Nothing is cached: once the call finishes the next caller starts a new one.
+Results are shared between requests and must be treated as read-only.
+"""
+import asyncio
+import functools
+
+from fastapi.concurrency import run_in_threadpool
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self.started = 0
+        self.shared = 0
+
+    async def do(self, key, func):
+        """
+        Runs the blocking `func()` on the threadpool, or joins the identical
+        call already running for `key`. A caller that is cancelled (client
+        disconnect) does not cancel the shared call.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(run_in_threadpool(func))
+            self._calls[key] = task
+            self.started += 1
+            task.add_done_callback(functools.partial(self._done, key))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here in case every caller went away
+
+    def stats(self):
+        calls = self.started + self.shared
+        return {
+            "in_flight": len(self._calls),
+            "queries_started": self.started,
+            "requests_coalesced": self.shared,
+            "coalesced_ratio": round(self.shared / calls, 4) if calls else None,
+        }
+
+
+flights = SingleFlight()
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+def coalesce(func):
+    """
+    Turns a blocking read endpoint into an async one whose identical
+    concurrent calls (same function and arguments) share one execution.
+    FastAPI still sees the original signature.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        key = (func.__module__, func.__qualname__, _freeze(args), _freeze(kwargs))
+        return await flights.do(key, functools.partial(func, *args, **kwargs))
+    return wrapper
@@ -0,0 +1,518 @@
+"""
+Embedded SQLite storage for field offices and offline cataloguing.
+
+With DB_BACKEND=sqlite every database connection the routers open is a local
+SQLite file per MySQL database (SQLITE_DIR/<database>.db, WAL mode, so reads
+never wait for the cataloguing writes). Connections speak enough of the
+mysql.connector API for the catalog endpoints to run unchanged: `%s`
+placeholders, dictionary cursors, commit/rollback, and SQLite errors raised
+as mysql.connector errors. translate() rewrites the MySQL-only syntax the
+shared code uses (INSERT IGNORE, ON DUPLICATE KEY UPDATE, IF, GREATEST,
+<=>, NOW() and NOW() - INTERVAL n SECOND, FOR UPDATE [SKIP LOCKED], DO);
+NOW() becomes UTC, like SQLite's CURRENT_TIMESTAMP. GET_LOCK/RELEASE_LOCK
+are held per process: a field install runs one.
+
+The tables are created from a schema snapshot exported from the central
+server (`python sqlite_backend.py export-schema`), so column types, nullability
+and unique keys match MySQL, and the snapshot's column metadata is what
+write_engine compiles its typed models from. Without a snapshot the registered
+catalog tables are created with untyped columns.
+
+Every insert into a synced table is also captured in the database's
+sync_outbox by a trigger (BLOB values as {"$hex": ...}, which JSON cannot
+hold); sync.py pushes those rows to the central server. Server-side
+features (spatial footprints, partitioning, the requisition archive) need
+MySQL and are not available in this mode.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from datetime import date, datetime, time
+from decimal import Decimal
+from functools import lru_cache
+
+from mysql.connector import errors
+
+from config import SQLITE_BUSY_TIMEOUT_MS, SQLITE_DIR, SQLITE_SCHEMA_PATH
+
+logger = logging.getLogger(__name__)
+
+# Central tables whose local inserts are pushed by sync.py, with the natural
+# key that identifies a row across sites: a pushed row whose key already
+# exists centrally is a duplicate if identical and a conflict otherwise.
+SYNCED_TABLES = {
+    "field_data": {
+        "block_data": ("block_id",),
+        "survey_data": ("survey_id",),
+        "acquisition_data": ("acquisition_id",),
+        "acquisition_media_data": ("acquisition_id", "acquisition_media_id"),
+    },
+    "processing_data": {
+        "processing_data": ("processing_id",),
+        "processing_media_data": ("processing_id", "processing_media_id"),
+    },
+    "interpretation_data": {
+        "interpretation_data": ("myindex",),
+        "interpretation_media_data": ("integ_media_id",),
+    },
+}
+
+OUTBOX_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS sync_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        row_json TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        detail TEXT NULL,
+        created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        pushed_at TEXT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_sync_outbox_status ON sync_outbox (status, id)",
+    # The MySQL column metadata write_engine introspects (see column_metadata()).
+    """
+    CREATE TABLE IF NOT EXISTS schema_columns (
+        table_name TEXT NOT NULL,
+        column_name TEXT NOT NULL,
+        data_type TEXT NOT NULL,
+        is_nullable TEXT NOT NULL,
+        max_length INTEGER NULL,
+        extra TEXT NOT NULL DEFAULT '',
+        PRIMARY KEY (table_name, column_name)
+    )
+    """,
+]
+
+_INTEGER_TYPES = {"tinyint", "smallint", "mediumint", "int", "integer", "bigint", "year", "bit"}
+_REAL_TYPES = {"float", "double", "real"}
+_BLOB_TYPES = {"binary", "varbinary", "tinyblob", "blob", "mediumblob", "longblob", "geometry", "point", "polygon"}
+
+# Python values the sqlite3 module does not store natively.
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_adapter(time, time.isoformat)
+
+_prepared = set()
+_prepare_lock = threading.Lock()
+
+# MySQL-only syntax -> SQLite, applied in order after the placeholders.
+_DIALECT = [
+    (re.compile(r"^\s*INSERT\s+IGNORE\s+INTO\b", re.IGNORECASE), "INSERT OR IGNORE INTO"),
+    (re.compile(r"^\s*DO\s+", re.IGNORECASE), "SELECT "),
+    (
+        re.compile(r"\bNOW\(\)\s*-\s*INTERVAL\s+(\?|\d+)\s+SECOND\b", re.IGNORECASE),
+        r"datetime('now', '-' || \1 || ' seconds')",
+    ),
+    (re.compile(r"\bNOW\(\)", re.IGNORECASE), "datetime('now')"),
+    (re.compile(r"\bIF\s*\(", re.IGNORECASE), "iif("),
+    (re.compile(r"\bGREATEST\s*\(", re.IGNORECASE), "max("),
+    (re.compile(r"<=>"), " IS "),
+    (re.compile(r"\s+FOR\s+UPDATE(\s+SKIP\s+LOCKED)?\b", re.IGNORECASE), ""),
+]
+_ON_DUPLICATE = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.IGNORECASE)
+_VALUES_REF = re.compile(r"\bVALUES\((\w+)\)", re.IGNORECASE)
+
+# GET_LOCK names -> (owning connection id, lock); see Connection.
+_named_locks = {}
+_named_locks_guard = threading.Lock()
+
+
+def database_path(database):
+    return os.path.join(SQLITE_DIR, f"{database}.db")
+
+
+@lru_cache(maxsize=1024)
+def translate(sql):
+    """MySQL-dialect SQL as the routers write it, in SQLite's dialect."""
+    sql = sql.replace("%s", "?").replace("%%", "%")
+    for pattern, replacement in _DIALECT:
+        sql = pattern.sub(replacement, sql)
+    parts = _ON_DUPLICATE.split(sql, 1)
+    if len(parts) == 2:
+        # SQLite's upsert reads the proposed row as excluded.<column>.
+        sql = parts[0] + "ON CONFLICT DO UPDATE SET" + _VALUES_REF.sub(r"excluded.\1", parts[1])
+    return sql
+
+
+def _mysql_error(err):
+    if isinstance(err, sqlite3.IntegrityError):
+        # 1062 is MySQL's duplicate-key error, which callers may check for.
+        return errors.IntegrityError(msg=str(err), errno=1062 if "UNIQUE" in str(err) else None)
+    if isinstance(err, sqlite3.OperationalError) and "locked" in str(err):
+        return errors.OperationalError(msg=str(err))
+    return errors.DatabaseError(msg=str(err))
+
+
+def _get_lock(owner, name, timeout):
+    """MySQL's GET_LOCK within this process: 1 once `owner` holds `name`, 0 on timeout."""
+    with _named_locks_guard:
+        entry = _named_locks.setdefault(name, [None, threading.Lock()])
+        if entry[0] == owner:
+            return 1
+    timeout = -1 if timeout is None or timeout < 0 else timeout
+    if not entry[1].acquire(timeout != 0, timeout if timeout > 0 else -1):
+        return 0
+    entry[0] = owner
+    return 1
+
+
+def _release_lock(owner, name):
+    """MySQL's RELEASE_LOCK: 1 if released, 0 if held by another connection, NULL if never taken."""
+    entry = _named_locks.get(name)
+    if entry is None:
+        return None
+    if entry[0] != owner:
+        return 0
+    entry[0] = None
+    entry[1].release()
+    return 1
+
+
+class Cursor:
+    def __init__(self, connection, dictionary=False):
+        self._connection = connection
+        self._cursor = connection._raw.cursor()
+        self._dictionary = dictionary
+
+    def execute(self, sql, params=()):
+        try:
+            self._cursor.execute(translate(sql), tuple(params or ()))
+        except sqlite3.Error as err:
+            raise _mysql_error(err) from err
+
+    def executemany(self, sql, seq_params):
+        try:
+            self._cursor.executemany(translate(sql), [tuple(params) for params in seq_params])
+        except sqlite3.Error as err:
+            raise _mysql_error(err) from err
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip(self.column_names, row))
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return (self._row(row) for row in self._cursor)
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def column_names(self):
+        return tuple(column[0] for column in self._cursor.description or ())
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def close(self):
+        self._cursor.close()
+
+
+class Connection:
+    """One SQLite connection behind the subset of MySQLConnection the app uses."""
+
+    def __init__(self, database):
+        self.database = database
+        self._raw = sqlite3.connect(
+            database_path(database), timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, check_same_thread=False
+        )
+        # WAL is durable across a crash with NORMAL; only the last commits
+        # before a power loss can be lost, never consistency.
+        self._raw.execute("PRAGMA synchronous = NORMAL")
+        owner = id(self)
+        self._raw.create_function("GET_LOCK", 2, lambda name, timeout: _get_lock(owner, name, timeout))
+        self._raw.create_function("RELEASE_LOCK", 1, lambda name: _release_lock(owner, name))
+
+    @property
+    def connection_id(self):
+        return id(self._raw)
+
+    @property
+    def in_transaction(self):
+        return self._raw.in_transaction
+
+    @property
+    def autocommit(self):
+        return self._raw.isolation_level is None
+
+    @autocommit.setter
+    def autocommit(self, value):
+        self._raw.isolation_level = None if value else ""
+
+    def cursor(self, dictionary=False, prepared=False, buffered=None):
+        # SQLite caches compiled statements per connection by itself.
+        return Cursor(self, dictionary)
+
+    def start_transaction(self):
+        # Takes the write lock up front: the stand-in for SELECT ... FOR
+        # UPDATE, which translate() drops.
+        self._raw.execute("BEGIN IMMEDIATE")
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def close(self):
+        # Like a MySQL session, a closed connection gives up its named locks.
+        for name, entry in list(_named_locks.items()):
+            if entry[0] == id(self):
+                _release_lock(id(self), name)
+        self._raw.close()
+
+    def column_metadata(self, table):
+        """(column, data_type, is_nullable, max_length, extra) rows, as information_schema gives them."""
+        return self._raw.execute(
+            "SELECT column_name, data_type, is_nullable, max_length, extra FROM schema_columns WHERE table_name = ?",
+            (table,),
+        ).fetchall()
+
+
+def connect(database):
+    _prepare(database)
+    return Connection(database)
+
+
+# ===== Schema =====
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _affinity(data_type):
+    if data_type in _INTEGER_TYPES:
+        return "INTEGER"
+    if data_type in _REAL_TYPES:
+        return "REAL"
+    if data_type in ("decimal", "numeric"):
+        return "NUMERIC"
+    if data_type in _BLOB_TYPES:
+        return "BLOB"
+    return "TEXT"
+
+
+def _default(value):
+    if value is None:
+        return ""
+    if value.upper().startswith("CURRENT_TIMESTAMP"):
+        return " DEFAULT CURRENT_TIMESTAMP"
+    return " DEFAULT '" + value.replace("'", "''") + "'"
+
+
+def create_table_sql(table, spec):
+    """CREATE TABLE for one table of the snapshot; an auto-increment key becomes SQLite's rowid alias."""
+    primary = spec["unique"].get("PRIMARY", [])
+    lines = []
+    for column in spec["columns"]:
+        if "auto_increment" in column["extra"] and primary == [column["name"]]:
+            lines.append(f"{_quote(column['name'])} INTEGER PRIMARY KEY AUTOINCREMENT")
+            primary = []
+            continue
+        not_null = " NOT NULL" if column["nullable"] == "NO" else ""
+        lines.append(f"{_quote(column['name'])} {_affinity(column['data_type'])}{not_null}{_default(column['default'])}")
+    if primary:
+        lines.append(f"PRIMARY KEY ({', '.join(map(_quote, primary))})")
+    return f"CREATE TABLE IF NOT EXISTS {_quote(table)} (\n    " + ",\n    ".join(lines) + "\n)"
+
+
+def _untyped_schema(database):
+    """The registered catalog tables of `database` with nullable untyped columns, for use without a snapshot."""
+    import database as db
+    import write_engine
+
+    connect = getattr(db, f"get_{database}_conn")
+    return {
+        descriptor.table: {
+            "columns": [
+                {"name": column, "data_type": "text", "nullable": "YES", "max_length": None, "extra": "", "default": None}
+                for column in descriptor.columns
+            ],
+            "unique": {},
+            "indexes": {},
+        }
+        for descriptor in write_engine.DESCRIPTORS.values()
+        if descriptor.connect is connect
+    }
+
+
+def _load_snapshot(database):
+    try:
+        with open(SQLITE_SCHEMA_PATH) as f:
+            return json.load(f)["databases"][database]
+    except FileNotFoundError:
+        logger.warning("No schema snapshot at %s; creating untyped catalog tables for %s", SQLITE_SCHEMA_PATH, database)
+        return _untyped_schema(database)
+
+
+def _outbox_value(column):
+    # json_object() refuses BLOBs; they travel hex-encoded (sync decodes them).
+    value = f"NEW.{_quote(column)}"
+    return f"CASE WHEN typeof({value}) = 'blob' THEN json_object('$hex', hex({value})) ELSE {value} END"
+
+
+def _outbox_trigger_sql(table, columns):
+    pairs = ", ".join(f"'{column}', {_outbox_value(column)}" for column in columns)
+    return (
+        f"CREATE TRIGGER {_quote('sync_outbox_' + table)} AFTER INSERT ON {_quote(table)} BEGIN "
+        f"INSERT INTO sync_outbox (table_name, row_json) VALUES ('{table}', json_object({pairs})); END"
+    )
+
+
+def ensure_schema(raw, database, schema):
+    """
+    Creates missing tables, columns and indexes of `schema` and (re)creates the
+    outbox triggers; safe to run on every start.
+    """
+    for statement in OUTBOX_DDL:
+        raw.execute(statement)
+    for table, spec in schema.items():
+        raw.execute(create_table_sql(table, spec))
+        existing = {row[1] for row in raw.execute(f"PRAGMA table_info({_quote(table)})")}
+        for column in spec["columns"]:
+            if column["name"] not in existing:
+                raw.execute(
+                    f"ALTER TABLE {_quote(table)} ADD COLUMN {_quote(column['name'])} {_affinity(column['data_type'])}"
+                )
+        for kind, indexes in (("UNIQUE INDEX", spec["unique"]), ("INDEX", spec["indexes"])):
+            for name, columns in indexes.items():
+                if name != "PRIMARY":
+                    raw.execute(
+                        f"CREATE {kind} IF NOT EXISTS {_quote(table + '__' + name)} "
+                        f"ON {_quote(table)} ({', '.join(map(_quote, columns))})"
+                    )
+        raw.execute("DELETE FROM schema_columns WHERE table_name = ?", (table,))
+        raw.executemany(
+            "INSERT INTO schema_columns VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (table, column["name"], column["data_type"], column["nullable"], column["max_length"], column["extra"])
+                for column in spec["columns"]
+            ],
+        )
+        raw.execute(f"DROP TRIGGER IF EXISTS {_quote('sync_outbox_' + table)}")
+        if table in SYNCED_TABLES.get(database, {}):
+            # Central assigns its own auto-increment ids; the local ones are not pushed.
+            pushed = [column["name"] for column in spec["columns"] if "auto_increment" not in column["extra"]]
+            raw.execute(_outbox_trigger_sql(table, pushed))
+
+
+def _prepare(database):
+    """Creates the file and brings its schema up to date, once per process."""
+    if database in _prepared:
+        return
+    with _prepare_lock:
+        if database in _prepared:
+            return
+        os.makedirs(SQLITE_DIR, exist_ok=True)
+        raw = sqlite3.connect(database_path(database), timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+        try:
+            raw.execute("PRAGMA journal_mode = WAL")
+            with raw:
+                ensure_schema(raw, database, _load_snapshot(database))
+        except sqlite3.Error as err:
+            raise _mysql_error(err) from err
+        finally:
+            raw.close()
+        _prepared.add(database)
+
+
+# ===== Snapshot export (run against the central MySQL server) =====
+
+def export_schema(path=SQLITE_SCHEMA_PATH):
+    """Writes the column and key metadata of every table of the three databases to `path`."""
+    import mysql.connector
+
+    from database import DATABASES, DB_CONFIG
+
+    snapshot = {"exported_at": datetime.now().isoformat(timespec="seconds"), "databases": {}}
+    conn = mysql.connector.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+    try:
+        for database in DATABASES:
+            tables = snapshot["databases"][database] = {}
+            cursor.execute(
+                """
+                SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, IS_NULLABLE, CHARACTER_MAXIMUM_LENGTH, EXTRA, COLUMN_DEFAULT
+                FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s ORDER BY TABLE_NAME, ORDINAL_POSITION
+                """,
+                (database,),
+            )
+            for row in cursor.fetchall():
+                table, column, data_type, nullable, max_length, extra, default = (
+                    value.decode() if isinstance(value, (bytes, bytearray)) else value for value in row
+                )
+                spec = tables.setdefault(table, {"columns": [], "unique": {}, "indexes": {}})
+                spec["columns"].append({
+                    "name": column, "data_type": data_type.lower(), "nullable": nullable,
+                    "max_length": max_length, "extra": (extra or "").lower(), "default": default,
+                })
+            cursor.execute(
+                """
+                SELECT TABLE_NAME, INDEX_NAME, NON_UNIQUE, COLUMN_NAME FROM information_schema.STATISTICS
+                WHERE TABLE_SCHEMA = %s ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX
+                """,
+                (database,),
+            )
+            for row in cursor.fetchall():
+                table, index, non_unique, column = (
+                    value.decode() if isinstance(value, (bytes, bytearray)) else value for value in row
+                )
+                if table in tables:
+                    kind = "indexes" if non_unique else "unique"
+                    tables[table][kind].setdefault(index, []).append(column)
+    finally:
+        cursor.close()
+        conn.close()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(snapshot, f, indent=1, default=str)
+    return snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedded SQLite backend")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export-schema", help="Snapshot the central MySQL schema for field installs")
+    export.add_argument("--output", default=SQLITE_SCHEMA_PATH)
+    commands.add_parser("init", help="Create or update the local databases from the snapshot")
+    args = parser.parse_args()
+    if args.command == "export-schema":
+        snapshot = export_schema(args.output)
+        for database, tables in snapshot["databases"].items():
+            print(f"{database}: {len(tables)} tables")
+        print(f"Wrote {args.output}")
+    else:
+        from database import DATABASES
+        # Registers the catalog descriptors, used when there is no snapshot.
+        from routers import acquisition, acquisition_media, blocks, surveys  # noqa: F401
+        from routers import interpretation, interpretation_media, processing, processing_media  # noqa: F401
+
+        for database in DATABASES:
+            _prepare(database)
+            print(f"{database}: {database_path(database)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import hashlib
+import mimetypes
+import os
+
+from fastapi import Request
+from fastapi.responses import FileResponse, JSONResponse, Response
+
+# CRA puts content-hashed bundles under static/, so their URLs change whenever
+# their bytes do and browsers may keep them forever. Everything else
+# (index.html, logo.png, asset-manifest.json) keeps a stable URL and must be
+# revalidated.
+HASHED_PREFIX = "static/"
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+# Precompressed siblings written by precompress_build.py, in preference order.
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+mimetypes.add_type("application/json", ".map")
+mimetypes.add_type("text/javascript", ".js")
+
+
+class _Asset:
+    __slots__ = ("path", "media_type", "etag", "cache_control", "variants")
+
+    def __init__(self, path, media_type, etag, cache_control, variants):
+        self.path = path
+        self.media_type = media_type
+        self.etag = etag
+        self.cache_control = cache_control
+        self.variants = variants
+
+
+def _accepted_encodings(request: Request):
+    """
+    Returns the content codings the client accepts (q > 0), lower-cased.
+    """
+    accepted = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _variant_etag(etag: str, coding):
+    """
+    A strong validator must differ per representation, so each content coding
+    gets its own ETag (the identity body keeps the asset's).
+    """
+    return f'{etag[:-1]}-{coding}"' if coding else etag
+
+
+def _etag_matches(request: Request, etag: str):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in header.split(",")]
+    return etag in tags or f"W/{etag}" in tags
+
+
+class FrontendBuild:
+    """
+    Serves a React production build straight from disk.
+
+    The build directory is scanned once at startup into an in-memory manifest,
+    so a request never touches the filesystem with a user-supplied path:
+    unknown paths either 404 (they look like a file) or fall back to
+    index.html for client-side routing. index.html itself is kept in memory
+    together with its precompressed variants.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = os.path.abspath(directory)
+        self.assets = {}
+        self.index = None
+        self.index_bodies = {}
+        if os.path.isdir(self.directory):
+            self._scan()
+
+    def _scan(self):
+        compressed_suffixes = tuple(suffix for _, suffix in ENCODINGS)
+        for root, _dirs, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(compressed_suffixes):
+                    continue
+                path = os.path.join(root, name)
+                rel_path = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                self.assets[rel_path] = self._describe(rel_path, path)
+
+        self.index = self.assets.get("index.html")
+        if self.index:
+            with open(self.index.path, "rb") as f:
+                self.index_bodies[None] = f.read()
+            for coding, variant_path in self.index.variants.items():
+                with open(variant_path, "rb") as f:
+                    self.index_bodies[coding] = f.read()
+
+    def _describe(self, rel_path: str, path: str):
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        variants = {
+            coding: path + suffix
+            for coding, suffix in ENCODINGS
+            if os.path.isfile(path + suffix)
+        }
+        stat = os.stat(path)
+        if rel_path.startswith(HASHED_PREFIX):
+            # The URL already carries the content hash; size + mtime is enough.
+            etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+            cache_control = IMMUTABLE_CACHE
+        else:
+            with open(path, "rb") as f:
+                etag = '"%s"' % hashlib.sha1(f.read()).hexdigest()
+            cache_control = REVALIDATE_CACHE
+        return _Asset(path, media_type, etag, cache_control, variants)
+
+    def response(self, full_path: str, request: Request) -> Response:
+        if not self.assets:
+            return JSONResponse({"detail": "Frontend build not found"}, status_code=404)
+
+        rel_path = full_path.strip("/") or "index.html"
+        asset = self.assets.get(rel_path)
+        if asset is None:
+            # Missing files (e.g. a stale chunk) must 404 instead of returning
+            # HTML with a 200; anything else is a client-side route.
+            if "." in rel_path.rsplit("/", 1)[-1] or self.index is None:
+                return JSONResponse({"detail": "Not Found"}, status_code=404)
+            asset = self.index
+
+        accepted = _accepted_encodings(request) if asset.variants else ()
+        coding = next((c for c, _ in ENCODINGS if c in asset.variants and c in accepted), None)
+        etag = _variant_etag(asset.etag, coding)
+        headers = {"ETag": etag, "Cache-Control": asset.cache_control}
+        if asset.variants:
+            headers["Vary"] = "Accept-Encoding"
+        if _etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        if coding:
+            headers["Content-Encoding"] = coding
+
+        if asset is self.index:
+            return Response(self.index_bodies[coding], media_type=asset.media_type, headers=headers)
+        path = asset.variants[coding] if coding else asset.path
+        return FileResponse(path, media_type=asset.media_type, headers=headers)
@@ -0,0 +1,57 @@
+import os
+
+from config import SEISMIC_DATA_ROOT
+
+
+class StoragePathError(ValueError):
+    """Raised when a catalogued path escapes the data root."""
+
+
+def resolve(relative_path):
+    """
+    Resolves a file name recorded in the catalog to an absolute path under
+    SEISMIC_DATA_ROOT, refusing anything that would escape the root.
+    """
+    if not relative_path:
+        raise StoragePathError("Empty file path")
+    root = os.path.realpath(SEISMIC_DATA_ROOT)
+    path = os.path.realpath(os.path.join(root, str(relative_path).lstrip("/\\")))
+    if path != root and not path.startswith(root + os.sep):
+        raise StoragePathError(f"Path escapes the data root: {relative_path}")
+    return path
+
+
+def relative(path):
+    """Inverse of resolve(): the catalog-relative form of an absolute path."""
+    return os.path.relpath(os.path.realpath(path), os.path.realpath(SEISMIC_DATA_ROOT)).replace(os.sep, "/")
+
+
+# Files backing a media row are stored as
+#   <SEISMIC_DATA_ROOT>/media/<acquisition_id|processing_id>/<media_id>.<ext>
+# (POST /ingest/segy puts uploads for a media row there).
+MEDIA_DIR = "media"
+SEGY_EXTENSIONS = (".sgy", ".segy", ".SGY", ".SEGY")
+
+
+def media_path(parent_id, media_id, extension=SEGY_EXTENSIONS[0]):
+    """Catalog-relative path for the SEG-Y file of a media row; ids must be single path components."""
+    for part in (parent_id, media_id):
+        part = str(part or "")
+        if part in ("", ".", "..") or "/" in part or "\\" in part:
+            raise StoragePathError(f"Not usable as a directory or file name: {part!r}")
+    return f"{MEDIA_DIR}/{parent_id}/{media_id}{extension}"
+
+
+def media_file(parent_id, media_id):
+    """
+    Catalog-relative path of the SEG-Y file stored for a media row, or None
+    when no such file exists.
+    """
+    for extension in SEGY_EXTENSIONS:
+        try:
+            candidate = media_path(parent_id, media_id, extension)
+            if os.path.isfile(resolve(candidate)):
+                return candidate
+        except StoragePathError:
+            return None
+    return None
@@ -0,0 +1,387 @@
+"""
+Push of rows catalogued offline (embedded SQLite mode) to the central server.
+
+Local inserts into the synced tables land in each SQLite database's
+sync_outbox (see sqlite_backend). The client sends pending entries in batches
+of SYNC_BATCH_ROWS, grouped by table, as one gzip-compressed JSON POST to
+the central /sync/push. The server validates every row with the table's
+write_engine model, looks up the natural keys of the whole batch in one
+query per table and answers per entry:
+
+- inserted: the key was new (or the table has no key) and the row is written,
+- duplicate: an identical row already exists, e.g. a batch re-sent after a
+  lost response, so pushes are idempotent,
+- conflict: another site (or the central UI) catalogued the key with different
+  values; the central row is returned and the entry is kept locally for review,
+- rejected: the row does not validate against the central schema.
+
+The client marks entries from the answer in one local transaction. A failed
+POST leaves them pending; the background agent retries with exponential
+backoff, so cataloguing never waits on the link.
+"""
+import argparse
+import gzip
+import hmac
+import json
+import logging
+import threading
+import urllib.error
+import urllib.request
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+
+import dedup
+import sqlite_backend
+import versions
+import write_engine
+from config import (
+    SITE_ID, SYNC_BATCH_ROWS, SYNC_INTERVAL_SECONDS, SYNC_MAX_BODY_MB, SYNC_SERVER_URL, SYNC_TIMEOUT_SECONDS,
+    SYNC_TOKEN,
+)
+from database import DATABASES
+
+logger = logging.getLogger(__name__)
+
+# Natural keys looked up per query on the server.
+KEY_LOOKUP_CHUNK = 500
+# The background agent waits at most this many intervals between failed attempts.
+MAX_BACKOFF_FACTOR = 16
+
+
+class SyncError(RuntimeError):
+    """Raised when the central server cannot be reached or refuses a push."""
+
+
+# ===== Server side =====
+
+def authorized(token):
+    return bool(SYNC_TOKEN) and token is not None and hmac.compare_digest(token, SYNC_TOKEN)
+
+
+def decode_body(body, encoding):
+    """The JSON payload of a push, gunzipped if needed; ValueError if too large or malformed."""
+    limit = int(SYNC_MAX_BODY_MB * 1024 * 1024)
+    if encoding == "gzip":
+        inflater = zlib.decompressobj(wbits=31)
+        body = inflater.decompress(body, limit)
+        if inflater.unconsumed_tail:
+            raise ValueError(f"Push exceeds {SYNC_MAX_BODY_MB} MB uncompressed")
+    elif len(body) > limit:
+        raise ValueError(f"Push exceeds {SYNC_MAX_BODY_MB} MB")
+    return json.loads(body)
+
+
+def _normalise(value):
+    """Comparable form of a column value, whether validated from JSON or read from MySQL."""
+    if value is None:
+        return None
+    if isinstance(value, Decimal):
+        return format(value.normalize(), "f")
+    if isinstance(value, float):
+        return format(Decimal(repr(value)).normalize(), "f")
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(" ") if isinstance(value, datetime) else value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode(errors="replace")
+    return str(value)
+
+
+def _existing_rows(cursor, descriptor, key_columns, keys):
+    """{normalised key: row values in column order} for the keys already stored centrally."""
+    existing = {}
+    keys = list(keys)
+    key_tuple = "(" + ", ".join(key_columns) + ")"
+    placeholder = "(" + ", ".join(["%s"] * len(key_columns)) + ")"
+    for start in range(0, len(keys), KEY_LOOKUP_CHUNK):
+        chunk = keys[start:start + KEY_LOOKUP_CHUNK]
+        cursor.execute(
+            f"SELECT {', '.join(descriptor.columns)} FROM {descriptor.table} "
+            f"WHERE {key_tuple} IN ({', '.join([placeholder] * len(chunk))})",
+            [value for key in chunk for value in key],
+        )
+        for row in cursor.fetchall():
+            values = dict(zip(descriptor.columns, row))
+            existing[tuple(_normalise(values[column]) for column in key_columns)] = row
+    return existing
+
+
+def _decode_value(value):
+    """A pushed column value; the outbox trigger sends BLOBs as {"$hex": ...}."""
+    if isinstance(value, dict) and set(value) == {"$hex"}:
+        try:
+            return bytes.fromhex(value["$hex"])
+        except (TypeError, ValueError):
+            return value
+    return value
+
+
+def _as_payload(descriptor, row):
+    """
+    An outbox row (keyed by column, as the trigger captured it) keyed by API
+    field, as descriptor.validate expects; aliased columns would be dropped otherwise.
+    """
+    if not isinstance(row, dict):
+        return row
+    return {
+        field: _decode_value(row[column])
+        for column, field in zip(descriptor.columns, descriptor.fields) if column in row
+    }
+
+
+def _merge_table(descriptor, key_columns, entries):
+    """Validates, classifies and inserts one table's entries in one transaction; returns {entry id: result}."""
+    results = {}
+    conn = descriptor.connect()
+    cursor = conn.cursor()
+    try:
+        write_engine._ensure_introspected(descriptor, conn)
+        valid = []
+        lookup = {}  # normalised key -> key values as validated
+        for entry in entries:
+            try:
+                values = descriptor.validate(_as_payload(descriptor, entry.get("row")))
+            except write_engine.PayloadError as err:
+                results[entry.get("id")] = {"status": "rejected", "errors": err.errors}
+                continue
+            row = dict(zip(descriptor.columns, values))
+            key = tuple(_normalise(row[column]) for column in key_columns) if key_columns else None
+            if key is not None and None in key:
+                key = None  # rows without a complete key cannot be matched; always inserted
+            if key is not None:
+                lookup[key] = [row[column] for column in key_columns]
+            # Only the columns the site sent are compared: it leaves out the
+            # auto-increment ids central assigns itself.
+            sent = [i for i, column in enumerate(descriptor.columns) if column in entry["row"]]
+            valid.append((entry.get("id"), values, key, sent))
+
+        existing = _existing_rows(cursor, descriptor, key_columns, lookup.values()) if lookup else {}
+        new = []
+        for entry_id, values, key, sent in valid:
+            current = existing.get(key) if key is not None else None
+            if current is None:
+                new.append(values)
+                if key is not None:
+                    # A key repeated within the batch compares against its first row.
+                    existing[key] = values
+                results[entry_id] = {"status": "inserted"}
+            elif all(_normalise(current[i]) == _normalise(values[i]) for i in sent):
+                results[entry_id] = {"status": "duplicate"}
+            else:
+                results[entry_id] = {
+                    "status": "conflict",
+                    "central": {
+                        field: _normalise(value) for field, value in zip(descriptor.fields, current)
+                    },
+                }
+        if new:
+            write_engine.execute_batches(descriptor, conn, new, ignore_duplicates=True)
+        conn.commit()
+        if new and descriptor.table in dedup.SOURCE_BY_TABLE:
+            dedup.register(dedup.SOURCE_BY_TABLE[descriptor.table], [dict(zip(descriptor.columns, row)) for row in new])
+        if new and descriptor.table in versions.TARGET_BY_TABLE:
+            versions.note_inserted(
+                versions.TARGET_BY_TABLE[descriptor.table], [dict(zip(descriptor.columns, row)) for row in new]
+            )
+        return results
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def apply_push(payload):
+    """
+    Merges one pushed batch into the central tables. `payload` is
+    {"site", "database", "tables": {table: [{"id", "row"}]}}; returns the
+    result of every entry and counts per status.
+    """
+    database = payload.get("database")
+    synced = sqlite_backend.SYNCED_TABLES.get(database)
+    if synced is None:
+        raise ValueError(f"Unknown database: {database!r}")
+    results = {}
+    for table, entries in (payload.get("tables") or {}).items():
+        descriptor = write_engine.DESCRIPTORS.get(table)
+        if table not in synced or descriptor is None:
+            results.update({entry.get("id"): {"status": "rejected", "errors": [
+                {"field": None, "message": f"{table} is not a synced table of {database}"}
+            ]} for entry in entries})
+            continue
+        results.update(_merge_table(descriptor, synced[table], entries))
+    summary = {}
+    for result in results.values():
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    logger.info("Merged push from site %s", payload.get("site") or "?", extra={"database": database, **summary})
+    return {"database": database, "summary": summary, "results": results}
+
+
+# ===== Client side =====
+
+def _post(payload):
+    body = gzip.compress(json.dumps(payload, default=str).encode())
+    request = urllib.request.Request(
+        f"{SYNC_SERVER_URL}/sync/push",
+        data=body,
+        method="POST",
+        headers={"Content-Type": "application/json", "Content-Encoding": "gzip", "X-Sync-Token": SYNC_TOKEN},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=SYNC_TIMEOUT_SECONDS) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as err:
+        raise SyncError(f"Central server answered {err.code}: {err.read()[:500].decode(errors='replace')}") from err
+    except (urllib.error.URLError, OSError) as err:
+        raise SyncError(f"Central server unreachable: {err}") from err
+
+
+def push_database(database, batch_rows=SYNC_BATCH_ROWS, post=_post):
+    """Pushes every pending outbox entry of one local database; returns counts per status."""
+    if not SYNC_SERVER_URL and post is _post:
+        raise SyncError("SYNC_SERVER_URL is not set")
+    totals = {}
+    conn = sqlite_backend.connect(database)
+    cursor = conn.cursor()
+    try:
+        last_id = 0
+        while True:
+            cursor.execute(
+                "SELECT id, table_name, row_json FROM sync_outbox WHERE status = 'pending' AND id > %s "
+                "ORDER BY id LIMIT %s",
+                (last_id, batch_rows),
+            )
+            entries = cursor.fetchall()
+            if not entries:
+                return totals
+            last_id = entries[-1][0]
+            tables = {}
+            for entry_id, table, row_json in entries:
+                tables.setdefault(table, []).append({"id": entry_id, "row": json.loads(row_json)})
+            response = post({"site": SITE_ID, "database": database, "tables": tables})
+
+            updates = []
+            for entry_id, _, _ in entries:
+                result = response["results"].get(str(entry_id)) or {"status": "pending"}
+                status = {"inserted": "pushed", "duplicate": "pushed"}.get(result["status"], result["status"])
+                detail = json.dumps(result.get("central") or result.get("errors")) if status != "pushed" else None
+                updates.append((status, detail, status, entry_id))
+                totals[result["status"]] = totals.get(result["status"], 0) + 1
+            cursor.executemany(
+                "UPDATE sync_outbox SET status = %s, detail = %s, attempts = attempts + 1, "
+                "pushed_at = CASE WHEN %s = 'pushed' THEN CURRENT_TIMESTAMP END WHERE id = %s",
+                updates,
+            )
+            conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def push_all(batch_rows=SYNC_BATCH_ROWS):
+    """Pushes every local database; returns {database: counts per status}."""
+    return {database: push_database(database, batch_rows) for database in DATABASES}
+
+
+def outbox_status():
+    """{database: {status: entries}} of the local outboxes."""
+    status = {}
+    for database in DATABASES:
+        conn = sqlite_backend.connect(database)
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT status, COUNT(*) FROM sync_outbox GROUP BY status")
+            status[database] = dict(cursor.fetchall())
+        finally:
+            cursor.close()
+            conn.close()
+    return status
+
+
+def requeue(status="conflict"):
+    """Puts entries in `status` (after they were reviewed centrally) back in the queue; returns how many."""
+    requeued = 0
+    for database in DATABASES:
+        conn = sqlite_backend.connect(database)
+        cursor = conn.cursor()
+        try:
+            cursor.execute("UPDATE sync_outbox SET status = 'pending' WHERE status = %s", (status,))
+            requeued += cursor.rowcount
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+    return requeued
+
+
+class SyncAgent:
+    """Background thread pushing the outboxes every SYNC_INTERVAL_SECONDS, backing off while offline."""
+
+    def __init__(self, interval=SYNC_INTERVAL_SECONDS):
+        self.interval = interval
+        self.last_result = None
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sync-agent", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                self.last_result = push_all()
+                self.last_error = None
+                backoff = 1
+            except SyncError as err:
+                self.last_error = str(err)
+                backoff = min(backoff * 2, MAX_BACKOFF_FACTOR)
+                logger.warning("Sync push failed, retrying in %.0fs: %s", self.interval * backoff, err)
+            except Exception:
+                self.last_error = "unexpected error"
+                logger.exception("Sync push failed")
+            self._stop.wait(self.interval * backoff)
+
+
+_agent = None
+
+
+def start_agent():
+    global _agent
+    _agent = SyncAgent()
+    _agent.start()
+
+
+def stop_agent():
+    if _agent is not None:
+        _agent.stop()
+
+
+def agent_status():
+    if _agent is None:
+        return None
+    return {"interval_seconds": _agent.interval, "last_result": _agent.last_result, "last_error": _agent.last_error}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Push rows catalogued offline to the central server")
+    parser.add_argument("--status", action="store_true", help="Only show the local outbox counts")
+    parser.add_argument("--requeue", metavar="STATUS", help="Queue entries in STATUS (e.g. conflict) again")
+    parser.add_argument("--batch-rows", type=int, default=SYNC_BATCH_ROWS)
+    args = parser.parse_args()
+    if args.requeue:
+        print(f"Requeued {requeue(args.requeue)} entries")
+    elif not args.status:
+        for database, counts in push_all(args.batch_rows).items():
+            print(f"{database}: {counts or 'nothing pending'}")
+    print(json.dumps(outbox_status(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The backend modules import each other as top-level modules, and the tests
+# run against the embedded SQLite backend (no MySQL server needed).
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DB_BACKEND", "sqlite")
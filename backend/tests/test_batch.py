@@ -0,0 +1,34 @@
+from fastapi import FastAPI
+
+import batch
+
+app = FastAPI()
+
+
+@app.post("/media")
+def create_media():
+    return {}
+
+
+@app.get("/media")
+def list_media():
+    return []
+
+
+def _check(path):
+    return batch.check_route(app, {"type": "http", "method": "GET", "path": path, "root_path": "", "headers": []})
+
+
+def test_get_route_after_post_on_same_path_is_batchable():
+    assert _check("/media") is None
+
+
+def test_unknown_path_is_404():
+    assert _check("/nope")["status"] == 404
+
+
+def test_post_only_path_is_405():
+    post_only = FastAPI()
+    post_only.post("/media")(create_media)
+    scope = {"type": "http", "method": "GET", "path": "/media", "root_path": "", "headers": []}
+    assert batch.check_route(post_only, scope)["status"] == 405
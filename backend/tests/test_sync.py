@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+import sqlite_backend
+import sync
+from database import get_interpretation_data_conn
+# Registers the interpretation_data descriptor (SubmittedBy is aliased to submittedBy).
+from routers import interpretation  # noqa: F401
+
+
+@pytest.fixture
+def sites(tmp_path, monkeypatch):
+    """Switches the SQLite backend between a field site's and the central server's files."""
+    monkeypatch.setattr(sqlite_backend, "SQLITE_SCHEMA_PATH", str(tmp_path / "missing-schema.json"))
+
+    def use(name):
+        monkeypatch.setattr(sqlite_backend, "SQLITE_DIR", str(tmp_path / name))
+        sqlite_backend._prepared.clear()
+
+    use("site")
+    return use
+
+
+def _post_to(sites):
+    """A `post` for push_database delivering to the central files, through JSON as over the wire."""
+    def post(payload):
+        sites("central")
+        try:
+            return json.loads(json.dumps(sync.apply_push(json.loads(json.dumps(payload, default=str)))))
+        finally:
+            sites("site")
+    return post
+
+
+def _insert(row):
+    conn = get_interpretation_data_conn()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"INSERT INTO interpretation_data ({', '.join(row)}) VALUES ({', '.join(['%s'] * len(row))})",
+            list(row.values()),
+        )
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _central_row(myindex):
+    conn = get_interpretation_data_conn()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT * FROM interpretation_data WHERE myindex = %s", (myindex,))
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def test_push_round_trips_aliased_columns(sites):
+    row = {"myindex": "IX-1", "version": "2", "survey_id": "S1", "SubmittedBy": "field office"}
+    _insert(row)
+
+
+    assert sync.push_database("interpretation_data", post=_post_to(sites)) == {"inserted": 1}
+
+    sites("central")
+    assert _central_row("IX-1")["SubmittedBy"] == "field office"
+
+    # Pushed again, the same row is a duplicate: the aliased column is compared too.
+    sites("site")
+    assert sync.requeue("pushed") == 1
+    assert sync.push_database("interpretation_data", post=_post_to(sites)) == {"duplicate": 1}
+
+
+def test_aliased_column_difference_is_a_conflict(sites):
+    _insert({"myindex": "IX-2", "survey_id": "S1", "SubmittedBy": "site A"})
+    sites("central")
+    _insert({"myindex": "IX-2", "survey_id": "S1", "SubmittedBy": "site B"})
+    sites("site")
+
+
+    assert sync.push_database("interpretation_data", post=_post_to(sites)) == {"conflict": 1}
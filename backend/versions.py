@@ -0,0 +1,251 @@
+"""
+Latest-version index of processing and interpretation records.
+
+processing_data and interpretation_data keep every version of a record;
+screens almost always want only the newest. Rather than a groupwise-max over
+the whole table on every read, processing_latest (per survey and
+processing_id) and interpretation_latest (per survey) hold the current
+version of each group, and /processing/latest and /interpretation/latest
+read them with one indexed join for a list of surveys.
+
+Versions are free text ("2", "v10", "2.1"), so each is ranked by a sort key
+in which digit runs are zero-padded: v2 < v10 and 2 < 2.1. For processing
+records a version with reprocessing_done set outranks the same version
+without it. The POST endpoints, sync pushes and legacy loads raise the
+summary row atomically (INSERT ... ON DUPLICATE KEY UPDATE keeps the
+greater sort key); the rebuild_latest_versions job, scheduled every
+LATEST_VERSIONS_INTERVAL_HOURS, recomputes the tables from scratch and so
+catches rows written any other way.
+"""
+import logging
+import re
+
+import mysql.connector
+
+from database import get_interpretation_data_conn, get_processing_data_conn
+
+logger = logging.getLogger(__name__)
+
+VERSION_DIGITS = 10
+MAX_SORT_KEY_LENGTH = 255
+MAX_SURVEYS = 500
+FETCH_ROWS = 5000
+INSERT_BATCH_ROWS = 1000
+REPROCESSED_VALUES = {"yes", "y", "true", "1", "done"}
+
+# target -> (connection getter, table, group columns, summary table, reprocessing column or None)
+TARGETS = {
+    "processing": (
+        get_processing_data_conn, "processing_data", ("survey_id", "processing_id"), "processing_latest",
+        "reprocessing_done",
+    ),
+    "interpretation": (
+        get_interpretation_data_conn, "interpretation_data", ("survey_id",), "interpretation_latest", None,
+    ),
+}
+
+TARGET_BY_TABLE = {table: target for target, (_, table, *_) in TARGETS.items()}
+
+# Among records tied on the latest version, latest() returns the one with
+# the highest value of this column (the most recently entered), or, for
+# tables without such a column, the greatest row compared column by column
+# as text: arbitrary, but the same on every read.
+TIE_BREAK_COLUMNS = {"interpretation": "myindex"}
+
+_DIGITS = re.compile(r"\d+")
+_SEPARATORS = re.compile(r"[^0-9a-z]+")
+
+
+def sort_key(version, reprocessed=None):
+    """A string that orders versions naturally under both Python and MySQL collation."""
+    text = _SEPARATORS.sub(".", str(version).strip().lower()) if version is not None else ""
+    text = _DIGITS.sub(lambda digits: digits.group().lstrip("0").rjust(VERSION_DIGITS, "0"), text)
+    if reprocessed is not None:
+        # A space sorts below every character a key can contain, so a
+        # longer version still wins over this suffix.
+        text += " 1" if str(reprocessed).strip().lower() in REPROCESSED_VALUES else " 0"
+    return text[:MAX_SORT_KEY_LENGTH]
+
+
+def _summary_row(target, row):
+    """(group values..., version, sort key) for one record, or None if it has no complete group."""
+    _, _, group_columns, _, reprocessing_column = TARGETS[target]
+    group = [row.get(column) for column in group_columns]
+    if any(value is None or value == "" for value in group):
+        return None
+    reprocessed = row.get(reprocessing_column) if reprocessing_column else None
+    version = row.get("version")
+    return (
+        *(str(value) for value in group),
+        None if version is None else str(version),
+        sort_key(version, reprocessed if reprocessing_column else None),
+    )
+
+
+def _upsert_sql(target):
+    _, _, group_columns, summary, _ = TARGETS[target]
+    columns = [*group_columns, "version", "version_sort"]
+    # Assignments run left to right: version is decided before version_sort moves.
+    return (
+        f"INSERT INTO {summary} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+        "ON DUPLICATE KEY UPDATE "
+        "version = IF(VALUES(version_sort) >= version_sort, VALUES(version), version), "
+        "version_sort = GREATEST(version_sort, VALUES(version_sort))"
+    )
+
+
+def note_inserted(target, rows):
+    """
+    Raises the summary rows for newly inserted records ({column: value});
+    failures only log (the scheduled rebuild job heals them).
+    """
+    summary_rows = [entry for entry in (_summary_row(target, row) for row in rows) if entry]
+    if not summary_rows:
+        return
+    try:
+        conn = TARGETS[target][0]()
+    except mysql.connector.Error as err:
+        logger.warning("Could not update latest %s versions: %s", target, err)
+        return
+    cursor = conn.cursor()
+    try:
+        cursor.executemany(_upsert_sql(target), summary_rows)
+        conn.commit()
+    except mysql.connector.Error as err:
+        conn.rollback()
+        logger.warning("Could not update latest %s versions: %s", target, err)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def rebuild(target, conn=None):
+    """
+    Recomputes the summary table of `target` in one pass over the records,
+    replacing its content in one transaction. Uses `conn` (without
+    committing) when given, as migrations do. Returns the number of groups.
+    """
+    connect, table, group_columns, summary, reprocessing_column = TARGETS[target]
+    own_conn = conn is None
+    conn = conn or connect()
+    read = conn.cursor(dictionary=True)
+    latest = {}
+    try:
+        columns = [*group_columns, "version", *([reprocessing_column] if reprocessing_column else [])]
+        read.execute(f"SELECT {', '.join(columns)} FROM {table}")
+        while True:
+            rows = read.fetchmany(FETCH_ROWS)
+            if not rows:
+                break
+            for row in rows:
+                entry = _summary_row(target, row)
+                if entry is None:
+                    continue
+                group = entry[:-2]
+                current = latest.get(group)
+                if current is None or entry[-1] >= current[-1]:
+                    latest[group] = entry
+    finally:
+        read.close()
+
+    write = conn.cursor()
+    try:
+        write.execute(f"DELETE FROM {summary}")
+        values = list(latest.values())
+        insert_sql = (
+            f"INSERT INTO {summary} ({', '.join([*group_columns, 'version', 'version_sort'])}) "
+            f"VALUES ({', '.join(['%s'] * (len(group_columns) + 2))})"
+        )
+        for start in range(0, len(values), INSERT_BATCH_ROWS):
+            write.executemany(insert_sql, values[start:start + INSERT_BATCH_ROWS])
+        if own_conn:
+            conn.commit()
+        return len(values)
+    except Exception:
+        if own_conn:
+            conn.rollback()
+        raise
+    finally:
+        write.close()
+        if own_conn:
+            conn.close()
+
+
+def _has_index(cursor, table, columns):
+    cursor.execute(
+        "SELECT INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY INDEX_NAME, SEQ_IN_INDEX",
+        (table,),
+    )
+    indexes = {}
+    for name, column in cursor.fetchall():
+        indexes.setdefault(name, []).append(column)
+    return any(index[:len(columns)] == list(columns) for index in indexes.values())
+
+
+def migration(target):
+    """A migration `run` callable indexing the records for the latest-version join and filling the summary."""
+    _, table, group_columns, _, _ = TARGETS[target]
+
+    def run(conn):
+        cursor = conn.cursor()
+        try:
+            columns = [*group_columns, "version"]
+            if not _has_index(cursor, table, columns):
+                cursor.execute(
+                    f"ALTER TABLE {table} ADD INDEX idx_{table}_latest ({', '.join(columns)})"
+                )
+        finally:
+            cursor.close()
+        rebuild(target, conn)
+    return run
+
+
+def _tie_break(target, row):
+    column = TIE_BREAK_COLUMNS.get(target)
+    if column is not None:
+        value = row.get(column)
+        return (0,) if value is None else (1, value)
+    return tuple("" if value is None else str(value) for value in row.values())
+
+
+def latest(target, survey_ids):
+    """
+    {survey_id: [latest record of each group]} for the given surveys, in one
+    indexed join. The join matches the summary's version text; rows that
+    share it but rank lower (a processing version without reprocessing_done
+    next to one with it) are dropped by their sort key, and remaining ties
+    are settled by _tie_break, so each group yields exactly one record.
+    """
+    connect, table, group_columns, summary, _ = TARGETS[target]
+    survey_ids = sorted(set(survey_ids))
+    result = {survey_id: [] for survey_id in survey_ids}
+    if not survey_ids:
+        return result
+    join = " AND ".join(f"r.{column} = l.{column}" for column in group_columns)
+    conn = connect()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            f"SELECT r.*, l.version_sort AS latest_version_sort FROM {summary} l "
+            f"JOIN {table} r ON {join} AND r.version <=> l.version "
+            f"WHERE l.survey_id IN ({', '.join(['%s'] * len(survey_ids))}) "
+            f"ORDER BY {', '.join(f'l.{column}' for column in group_columns)}",
+            survey_ids,
+        )
+        chosen = {}
+        for row in cursor.fetchall():
+            version_sort = row.pop("latest_version_sort")
+            entry = _summary_row(target, row)
+            if entry is None or entry[-1] != version_sort:
+                continue
+            group = entry[:-2]
+            current = chosen.get(group)
+            if current is None or _tie_break(target, row) > _tie_break(target, current):
+                chosen[group] = row
+        for row in chosen.values():
+            result.setdefault(str(row["survey_id"]), []).append(row)
+        return result
+    finally:
+        cursor.close()
+        conn.close()
@@ -0,0 +1,434 @@
+"""
+Table-descriptor driven INSERTs (and bulk UPDATEs) for the catalog tables.
+
+Each router registers a TableDescriptor naming its table, connection getter
+and column list. At startup load_descriptors() reads the column metadata from
+information_schema once and compiles a typed pydantic model per table, so
+payloads are validated and coerced before they reach MySQL. Statements are
+executed through server-side prepared statements cached per pooled
+connection, so MySQL parses each INSERT once per connection rather than on
+every request.
+"""
+import logging
+import weakref
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Annotated, Any, Optional
+
+import mysql.connector
+from pydantic import ConfigDict, Field, StringConstraints, ValidationError, create_model
+
+logger = logging.getLogger(__name__)
+
+# MySQL caps a prepared statement at 65535 placeholders.
+MAX_PLACEHOLDERS = 65535
+DEFAULT_BATCH_SIZE = 500
+# Prepared statements kept per connection (each holds server memory).
+STATEMENT_CACHE_SIZE = 32
+
+_INT_TYPES = {"tinyint", "smallint", "mediumint", "int", "integer", "bigint", "year"}
+_FLOAT_TYPES = {"float", "double", "real"}
+_DECIMAL_TYPES = {"decimal", "numeric"}
+_TEXT_TYPES = {"char", "varchar", "tinytext", "text", "mediumtext", "longtext", "enum", "set"}
+_DATETIME_TYPES = {"datetime", "timestamp"}
+
+_MODEL_CONFIG = ConfigDict(extra="ignore", coerce_numbers_to_str=True)
+
+DESCRIPTORS = {}
+
+
+def _text(value):
+    # information_schema columns come back as bytes on some server versions.
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode()
+    return value or ""
+
+
+class PayloadError(ValueError):
+    """Raised when a payload does not match the table's compiled model."""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid field(s)")
+        self.errors = errors
+
+
+class TableDescriptor:
+    """
+    Describes one catalog table: where it lives, which columns an insert
+    writes, and (optionally) which payload key feeds a column when the two
+    names differ.
+    """
+
+    def __init__(self, table, connect, columns, aliases=None):
+        aliases = aliases or {}
+        self.table = table
+        self.connect = connect
+        self.columns = list(columns)
+        self.fields = [aliases.get(column, column) for column in self.columns]
+        self.insert_sql = self._values_sql(1)
+        self.introspected = False
+        # Non-text columns where the forms' empty strings mean NULL.
+        self.blank_to_none = frozenset()
+        self.column_types = {column: (Any, ...) for column in self.columns}
+        self.model = self._compile(self.column_types)
+        self._batch_sql = {}
+        self._change_models = {}
+
+    def _values_sql(self, rows, ignore=False):
+        row = "(" + ", ".join(["%s"] * len(self.columns)) + ")"
+        return "INSERT %sINTO %s (%s) VALUES %s" % (
+            "IGNORE " if ignore else "", self.table, ", ".join(self.columns), ", ".join([row] * rows)
+        )
+
+    def batch_sql(self, rows, ignore=False):
+        """
+        Returns the (cached) multi-row INSERT for exactly `rows` rows;
+        `ignore` skips rows that would duplicate a unique key.
+        """
+        sql = self._batch_sql.get((rows, ignore))
+        if sql is None:
+            sql = self._batch_sql[(rows, ignore)] = self._values_sql(rows, ignore)
+        return sql
+
+    @property
+    def max_batch_rows(self):
+        return max(1, MAX_PLACEHOLDERS // len(self.columns))
+
+    def _compile(self, column_types):
+        fields = {}
+        for i, (column, key) in enumerate(zip(self.columns, self.fields)):
+            annotation, default = column_types[column]
+            # Positional field names keep columns such as "copy" or "schema"
+            # from clashing with BaseModel attributes; the alias is the key.
+            fields[f"f{i}"] = (annotation, Field(default, alias=key))
+        name = "".join(part.title() for part in self.table.split("_")) + "Insert"
+        return create_model(name, __config__=_MODEL_CONFIG, **fields)
+
+    def _column_metadata(self, conn):
+        # Embedded SQLite connections keep the MySQL metadata in their
+        # schema snapshot (see sqlite_backend).
+        if hasattr(conn, "column_metadata"):
+            return conn.column_metadata(self.table)
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                """
+                SELECT COLUMN_NAME, DATA_TYPE, IS_NULLABLE, CHARACTER_MAXIMUM_LENGTH, EXTRA
+                FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+                """,
+                (self.table,),
+            )
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def introspect(self, conn):
+        metadata = {
+            _text(row[0]).lower(): (_text(row[1]).lower(), _text(row[2]), row[3], _text(row[4]))
+            for row in self._column_metadata(conn)
+        }
+        if not metadata:
+            raise LookupError(f"Table {self.table} not found")
+
+        column_types = {}
+        blank_to_none = set()
+        for column, key in zip(self.columns, self.fields):
+            data_type, is_nullable, max_length, extra = metadata.get(
+                column.lower(), ("", "YES", None, "")
+            )
+            optional = is_nullable == "YES" or "auto_increment" in extra
+            if data_type in _INT_TYPES:
+                py_type = int
+            elif data_type in _FLOAT_TYPES:
+                py_type = float
+            elif data_type in _DECIMAL_TYPES:
+                py_type = Decimal
+            elif data_type == "date":
+                py_type = date
+            elif data_type in _DATETIME_TYPES:
+                py_type = datetime
+            elif data_type in _TEXT_TYPES:
+                py_type = Annotated[str, StringConstraints(max_length=max_length)] if max_length else str
+            else:
+                py_type = Any
+            if data_type not in _TEXT_TYPES:
+                blank_to_none.add(key)
+            column_types[column] = (Optional[py_type], None) if optional else (py_type, ...)
+
+        self.column_types = column_types
+        self.model = self._compile(column_types)
+        self._change_models = {}
+        self.blank_to_none = frozenset(blank_to_none)
+        self.introspected = True
+
+    def validate(self, data):
+        """
+        Validates one payload and returns its values in column order.
+        Raises PayloadError listing every offending field.
+        """
+        if not isinstance(data, dict):
+            raise PayloadError([{"field": None, "message": "Payload must be a JSON object"}])
+        if self.blank_to_none:
+            data = {
+                key: (None if value == "" and key in self.blank_to_none else value)
+                for key, value in data.items()
+            }
+        try:
+            row = self.model.model_validate(data)
+        except ValidationError as err:
+            raise PayloadError([
+                {"field": ".".join(str(part) for part in error["loc"]), "message": error["msg"]}
+                for error in err.errors()
+            ])
+        values = row.__dict__
+        return tuple(values[f"f{i}"] for i in range(len(self.columns)))
+
+    def _change_model(self, keys):
+        model = self._change_models.get(keys)
+        if model is None:
+            fields = {
+                # Every given field must validate; nullability follows the column.
+                f"f{i}": (self.column_types[column][0], Field(..., alias=key))
+                for i, (column, key) in enumerate(zip(self.columns, self.fields))
+                if key in keys
+            }
+            name = "".join(part.title() for part in self.table.split("_")) + "Changes"
+            model = self._change_models[keys] = create_model(name, __config__=_MODEL_CONFIG, **fields)
+        return model
+
+    def validate_changes(self, data, allowed=None):
+        """
+        Validates a partial payload, as for an UPDATE, and returns
+        {column: value} for the fields it gives. `allowed` limits which
+        fields may be changed. Raises PayloadError listing every offending field.
+        """
+        if not isinstance(data, dict) or not data:
+            raise PayloadError([{"field": None, "message": "Changes must be a non-empty JSON object"}])
+        allowed = set(self.fields if allowed is None else allowed) & set(self.fields)
+        refused = [key for key in data if key not in allowed]
+        if refused:
+            raise PayloadError([{"field": key, "message": "Field cannot be changed here"} for key in refused])
+        data = {
+            key: (None if value == "" and key in self.blank_to_none else value)
+            for key, value in data.items()
+        }
+        try:
+            row = self._change_model(frozenset(data)).model_validate(data)
+        except ValidationError as err:
+            raise PayloadError([
+                {"field": ".".join(str(part) for part in error["loc"]), "message": error["msg"]}
+                for error in err.errors()
+            ])
+        values = row.__dict__
+        return {column: values[f"f{i}"] for i, column in enumerate(self.columns) if f"f{i}" in values}
+
+
+def register(descriptor):
+    DESCRIPTORS[descriptor.table] = descriptor
+    return descriptor
+
+
+def load_descriptors():
+    """
+    Introspects every registered table, one connection per database.
+    Tables that cannot be introspected keep their untyped model and are
+    retried lazily on their first insert.
+    """
+    by_connect = {}
+    for descriptor in DESCRIPTORS.values():
+        by_connect.setdefault(descriptor.connect, []).append(descriptor)
+    for connect, descriptors in by_connect.items():
+        try:
+            conn = connect()
+        except mysql.connector.Error as err:
+            logger.warning("Skipping column introspection, cannot connect: %s", err)
+            continue
+        try:
+            for descriptor in descriptors:
+                try:
+                    descriptor.introspect(conn)
+                except (mysql.connector.Error, LookupError) as err:
+                    logger.warning("Could not introspect %s: %s", descriptor.table, err)
+        finally:
+            conn.close()
+
+
+# ===== Prepared statement cache =====
+# Keyed weakly on the physical connection so entries disappear with it; the
+# server connection id detects reconnects, which drop all prepared statements.
+_statement_cache = weakref.WeakKeyDictionary()
+
+
+def prepared_cursor(conn, sql):
+    """
+    Returns a prepared cursor for `sql` on `conn`, preparing it on first use.
+    The same `sql` object must be passed to execute() for MySQL to reuse the
+    prepared statement instead of re-preparing it.
+    """
+    raw = getattr(conn, "_cnx", None) or conn  # unwrap PooledMySQLConnection
+    entry = _statement_cache.get(raw)
+    if entry is None or entry[0] != raw.connection_id:
+        entry = (raw.connection_id, OrderedDict())
+        _statement_cache[raw] = entry
+    cursors = entry[1]
+    cursor = cursors.get(sql)
+    if cursor is None:
+        cursor = raw.cursor(prepared=True)
+        cursors[sql] = cursor
+        if len(cursors) > STATEMENT_CACHE_SIZE:
+            _, evicted = cursors.popitem(last=False)
+            evicted.close()
+    else:
+        cursors.move_to_end(sql)
+    return cursor
+
+
+def _ensure_introspected(descriptor, conn):
+    if not descriptor.introspected:
+        try:
+            descriptor.introspect(conn)
+        except (mysql.connector.Error, LookupError) as err:
+            logger.warning("Could not introspect %s: %s", descriptor.table, err)
+
+
+def insert_one(descriptor, data):
+    """
+    Validates and inserts a single row. Returns the stored row as
+    {column: value}, i.e. after validation and coercion.
+    """
+    conn = descriptor.connect()
+    try:
+        _ensure_introspected(descriptor, conn)
+        values = descriptor.validate(data)
+        cursor = prepared_cursor(conn, descriptor.insert_sql)
+        cursor.execute(descriptor.insert_sql, values)
+        conn.commit()
+        return dict(zip(descriptor.columns, values))
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def validate_many(descriptor, rows):
+    """
+    Validates every row, returning (values, errors) where errors maps the
+    row index to its PayloadError details.
+    """
+    values, errors = [], {}
+    for index, data in enumerate(rows):
+        try:
+            values.append(descriptor.validate(data))
+        except PayloadError as err:
+            errors[index] = err.errors
+    return values, errors
+
+
+def execute_batches(descriptor, conn, values, batch_size=DEFAULT_BATCH_SIZE, ignore_duplicates=False):
+    """
+    Inserts already-validated value tuples on `conn` with multi-row prepared
+    INSERTs, without committing. Returns the number of rows written, which
+    is lower than len(values) when `ignore_duplicates` skipped some.
+    """
+    batch_size = max(1, min(batch_size, descriptor.max_batch_rows))
+    written = 0
+    for start in range(0, len(values), batch_size):
+        chunk = values[start:start + batch_size]
+        sql = descriptor.batch_sql(len(chunk), ignore_duplicates)
+        params = [value for row in chunk for value in row]
+        cursor = prepared_cursor(conn, sql)
+        cursor.execute(sql, params)
+        written += cursor.rowcount
+    return written
+
+
+def insert_many(descriptor, rows, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Validates all rows up front, then inserts them in one transaction.
+    Raises PayloadError (with the row index in each field path) if any row
+    is invalid, in which case nothing is written.
+    """
+    conn = descriptor.connect()
+    try:
+        _ensure_introspected(descriptor, conn)
+        values, errors = validate_many(descriptor, rows)
+        if errors:
+            raise PayloadError([
+                dict(error, field=f"{index}.{error['field']}")
+                for index, row_errors in errors.items()
+                for error in row_errors
+            ])
+        written = execute_batches(descriptor, conn, values, batch_size)
+        conn.commit()
+        return written
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def update_many(descriptor, data, condition, params, key_column, allowed=None, chunk_rows=DEFAULT_BATCH_SIZE,
+                dry_run=False):
+    """
+    Validates the partial payload `data` (see validate_changes) and applies
+    it to every row matching `condition`, as one set-based UPDATE per chunk
+    of about `chunk_rows` rows. Chunks are consecutive ranges of
+    `key_column` (larger when the boundary key repeats) and commit on their
+    own, so row locks are held briefly; a failure leaves earlier chunks
+    applied (the same request can simply be re-run). Returns the rows
+    matched, the rows actually changed and the number of chunks.
+    """
+    conn = descriptor.connect()
+    cursor = conn.cursor()
+    try:
+        _ensure_introspected(descriptor, conn)
+        changes = descriptor.validate_changes(data, allowed)
+        assignments = ", ".join(f"{column} = %s" for column in changes)
+        # Chunks are ranges of the key, which NULL keys fall outside of.
+        condition = f"({condition}) AND {key_column} IS NOT NULL"
+        if dry_run:
+            cursor.execute(f"SELECT COUNT(*) FROM {descriptor.table} WHERE {condition}", params)
+            return {"matched": cursor.fetchone()[0], "changed": 0, "chunks": 0}
+        matched = changed = chunks = 0
+        last_key = None
+        while True:
+            lower, lower_params = ("", []) if last_key is None else (f" AND {key_column} > %s", [last_key])
+            cursor.execute(
+                f"SELECT COUNT(*), MAX({key_column}) FROM ("
+                f"SELECT {key_column} FROM {descriptor.table} WHERE ({condition}){lower} "
+                f"ORDER BY {key_column} LIMIT %s) chunk",
+                [*params, *lower_params, chunk_rows],
+            )
+            count, upper = cursor.fetchone()
+            if not count:
+                break
+            # Rows sharing the boundary key all fall in this chunk, so none is
+            # skipped or updated twice; they are counted the same way, as
+            # the LIMIT may have cut through them.
+            cursor.execute(
+                f"SELECT COUNT(*) FROM {descriptor.table} WHERE ({condition}){lower} AND {key_column} <= %s",
+                [*params, *lower_params, upper],
+            )
+            matched += cursor.fetchone()[0]
+            cursor.execute(
+                f"UPDATE {descriptor.table} SET {assignments} "
+                f"WHERE ({condition}){lower} AND {key_column} <= %s",
+                [*changes.values(), *params, *lower_params, upper],
+            )
+            changed += cursor.rowcount
+            conn.commit()
+            chunks += 1
+            last_key = upper
+            if count < chunk_rows:
+                break
+        return {"matched": matched, "changed": changed, "chunks": chunks}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
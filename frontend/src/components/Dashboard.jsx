@@ -36,41 +36,35 @@ const Dashboard = () => {
   const [aboutIndex, setAboutIndex] = useState(0);
 
   useEffect(() => {
-    axios.get(`${API_BASE}/blocks/count`)
-      .then(res => setBlockCount(res.data.count))
-      .catch(() => setBlockCount(0));
-
-    axios.get(`${API_BASE}/surveys/count`)
-      .then(res => setSurveyCount(res.data.count))
-      .catch(() => setSurveyCount(0));
-
-    axios.get(`${API_BASE}/processing-media/count`)
+    // One round trip for every stat; each count succeeds or fails on its own.
+    axios.post(`${API_BASE}/batch`, {
+      requests: [
+        { id: "blocks", path: "/blocks/count" },
+        { id: "surveys", path: "/surveys/count" },
+        { id: "processingMedia", path: "/processing-media/count" },
+        { id: "processing", path: "/processing/count" },
+        { id: "interpretation", path: "/interpretation/count" },
+        { id: "acquisition", path: "/acquisition/count" },
+      ],
+    })
       .then(res => {
-        const mediaCount = res.data.count;
-        const volume = (mediaCount * 0.5).toFixed(1);
-        setDataVolume(`${volume} TB`);
+        const counts = {};
+        res.data.responses.forEach(item => {
+          if (item.status === 200) {
+            counts[item.id] = item.body.count;
+          } else {
+            console.error(`Error fetching ${item.id} count:`, item.body);
+          }
+        });
+        setBlockCount(counts.blocks ?? 0);
+        setSurveyCount(counts.surveys ?? 0);
+        setDataVolume(`${((counts.processingMedia ?? 0) * 0.5).toFixed(1)} TB`);
+        setProcessedDataCount(counts.processing ?? 0);
+        setInterpretationCount(counts.interpretation ?? 0);
+        setAcquisitionCount(counts.acquisition ?? 0);
       })
-      .catch(() => setDataVolume('0 TB'));
-
-    axios.get(`${API_BASE}/processing/count`)
-      .then(res => setProcessedDataCount(res.data.count))
-      .catch(error => {
-        console.error("Error fetching processed data count:", error);
-        setProcessedDataCount(0);
-      });
-
-    axios.get(`${API_BASE}/interpretation/count`)
-      .then(res => setInterpretationCount(res.data.count))
-      .catch(error => {
-        console.error("Error fetching interpretation count:", error);
-        setInterpretationCount(0);
-      });
-
-    axios.get(`${API_BASE}/acquisition/count`)
-      .then(res => setAcquisitionCount(res.data.count))
       .catch(error => {
-        console.error("Error fetching acquisition count:", error);
-        setAcquisitionCount(0);
+        console.error("Error fetching dashboard stats:", error);
       });
   }, []);
 